@@ -1,6 +1,7 @@
 from azure.mgmt.compute import ComputeManagementClient
 
 from pdchaosazure import load_secrets, load_subscription_id, auth
+from pdchaosazure.common import throttling
 
 
 def init() -> ComputeManagementClient:
@@ -10,6 +11,7 @@ def init() -> ComputeManagementClient:
 
     with auth(secrets) as credentials:
         client = ComputeManagementClient(
-            credential=credentials, subscription_id=subscription_id, base_url=base_url)
+            credential=credentials, subscription_id=subscription_id, base_url=base_url,
+            per_retry_policies=[throttling.policy(subscription_id)])
 
         return client
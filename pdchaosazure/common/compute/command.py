@@ -1,15 +1,72 @@
-import os
+"""
+Run the bundled fault scripts on virtual machines and VMSS instances.
+
+The bundled scripts are loaded once from the package resources into a registry keyed by script and OS
+type. The parameters of a run command are prepared once per script, OS type and arguments, so that the
+preparation for further targets of an activity is a dictionary lookup.
+
+Scripts are run by the legacy action ``runCommand`` by default. The managed run commands are child resources
+of a machine instead, which may execute asynchronously and write their output to blobs. Refer to
+``config.load_run_command``.
+"""
+import functools
+import json
+import pkgutil
+import shlex
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
 
 from azure.core.exceptions import HttpResponseError
 from azure.mgmt.compute import ComputeManagementClient
 from chaoslib.exceptions import FailedActivity, InterruptExecution
+from chaoslib.types import Configuration
 from logzero import logger
 
+from pdchaosazure.common import config, polling
+from pdchaosazure.common.compute import output
+from pdchaosazure.common.deadline import Deadline
 from pdchaosazure.vm.constants import OS_LINUX, OS_WINDOWS, RES_TYPE_VM
 from pdchaosazure.vmss.constants import RES_TYPE_VMSS_VM
 
+SCRIPT_IDS = ('burn_io', 'fill_disk', 'network_latency', 'stress_cpu', 'stress_memory')
 UNSUPPORTED_WINDOWS_SCRIPTS = ['network_latency']
 
+# Faults of a timeline with the defaults of their actions
+TIMELINE_DEFAULTS = {
+    'burn_io': {'duration': 60, 'path': None, 'read_percentage': 0, 'block_size': 4, 'queue_depth': 16, 'iops': None,
+                'bandwidth': None, 'size': 1024},
+    'fill_disk': {'duration': 120, 'size': 1000, 'path': None, 'percentage': None, 'space': 'free', 'mode': None},
+    'network_latency': {'duration': 60, 'delay': 200, 'jitter': 50, 'network_interface': 'eth0'},
+    'stress_cpu': {'duration': 120, 'load': 100, 'cores': None, 'affinity': None, 'ramp': 0},
+    'stress_memory': {'duration': 120, 'size': None, 'percentage': 80, 'rate': 0},
+}
+
+# Spaces a percentage of fill_disk refers to and the ways to create its file
+FILL_SPACES = ('free', 'total')
+FILL_MODES = ('preallocate', 'write')
+
+# Percentages of the faults with their minimum and the arguments with a fixed set of choices
+FAULT_PERCENTAGES = {
+    'burn_io': {'read_percentage': 0},
+    'fill_disk': {'percentage': 1},
+    'stress_cpu': {'load': 1},
+    'stress_memory': {'percentage': 1},
+}
+FAULT_CHOICES = {
+    'fill_disk': {'space': FILL_SPACES, 'mode': FILL_MODES},
+}
+# Counts of the faults that must be at least the minimum
+FAULT_MINIMUMS = {
+    'burn_io': {'block_size': 1, 'queue_depth': 1},
+}
+
+# Managed run commands are named with this prefix and a random suffix
+MANAGED_PREFIX = "pdchaosazure-"
+
+COMMAND_IDS = {OS_LINUX: 'RunShellScript', OS_WINDOWS: 'RunPowerShellScript'}
+EXTENSIONS = {OS_LINUX: 'sh', OS_WINDOWS: 'ps1'}
+
 
 def prepare_path(machine: dict, path: str):
     os_type = __get_os_type(machine)
@@ -27,35 +84,44 @@ def prepare(compute: dict, script_id: str):
     :param script_id: The script's filename without the filename ending. Is named after the activity name.
     :return: A tuple of the Command Id and the script content
     """
-    os_type = __get_os_type(compute)
+    return __script(script_id, __get_os_type(compute))
 
-    if os_type == OS_LINUX:
-        command_id = 'RunShellScript'
-        script_name = "{}.sh".format(script_id)
-    else:
-        if script_id in UNSUPPORTED_WINDOWS_SCRIPTS:
-            raise InterruptExecution("'{}' is not supported for os '{}'"
-                                     .format(script_id, OS_WINDOWS))
-        command_id = 'RunPowerShellScript'
-        script_name = "{}.ps1".format(script_id)
 
-    file_path = os.path.join(os.path.dirname(__file__), "../scripts", script_name)
-    with open(file_path) as file_path:
-        script_content = file_path.read()
-        return command_id, script_content
+def prepare_parameters(compute: dict, script_id: str, **kwargs) -> dict:
+    """Prepare the parameters of the run command that executes the script with the given arguments.
+
+    The parameters are cached per script, OS type and arguments and must not be changed. Arguments that are
+    ``None`` are left out, so that the script falls back to its default.
+    """
+    if 'path' in kwargs:
+        kwargs['path'] = prepare_path(compute, kwargs['path'])
 
+    return __prepared_parameters(script_id, __get_os_type(compute), __arguments(kwargs))
 
-def run(resource_group: str, compute: dict, parameters: dict, client: ComputeManagementClient):
+
+def run(resource_group: str, compute: dict, parameters: dict, client: ComputeManagementClient,
+        configuration: Configuration = None, deadline: Deadline = None) -> dict:
+    """Run the command on the compute and return its result as a record, refer to ``output.record``."""
     compute_type = compute.get('type').lower()
+    if deadline:
+        deadline.check('run_command')
+
+    settings = config.load_run_command(configuration)
+    if settings.get('managed'):
+        return __run_managed(resource_group, compute, parameters, client, settings, configuration, deadline)
+
+    polling_method = polling.create(
+        'run_command', configuration, deadline, lro_options={'final-state-via': 'location'})
+    submitted_at = datetime.now(timezone.utc)
 
     try:
         if compute_type == RES_TYPE_VMSS_VM.lower():
             poller = client.virtual_machine_scale_set_vms.begin_run_command(
-                resource_group, compute['scale_set'], compute['instance_id'], parameters)
+                resource_group, compute['scale_set'], compute['instance_id'], parameters, polling=polling_method)
 
         elif compute_type == RES_TYPE_VM.lower():
             poller = client.virtual_machines.begin_run_command(
-                resource_group, compute['name'], parameters)
+                resource_group, compute['name'], parameters, polling=polling_method)
 
         else:
             msg = "Running a command for the unknown resource type '{}'".format(compute.get('type'))
@@ -64,14 +130,102 @@ def run(resource_group: str, compute: dict, parameters: dict, client: ComputeMan
     except HttpResponseError as e:
         raise FailedActivity(e.message)
 
-    result = poller.result()  # Blocking till executed
-    if result and result.value:
-        logger.debug(result.value[0].message)  # stdout/stderr
+    # Blocking till executed, timed out or cancelled
+    result = deadline.wait(poller, 'run_command') if deadline else poller.result()
+    if poller.done() and result and result.value:
+        captured = output.from_legacy(result, submitted_at, datetime.now(timezone.utc))
+        logger.debug(captured['stdout'])
+
+        if captured['execution_state'] == output.STATE_FAILED:
+            error = FailedActivity("Run command on '{}' ended with the exit code '{}': {}".format(
+                compute['name'], captured['exit_code'], captured['stderr']))
+            error.run_command = captured
+            raise error
+
+        return captured
     else:
         raise FailedActivity("Operation did not finish properly."
                              " You may consider to increase the timeout in the experiment configuration.")
 
 
+def delete_managed(resource_group: str, compute: dict, client: ComputeManagementClient,
+                   deadline: Deadline = None) -> List[str]:
+    """Delete the managed run commands created by this extension on the compute and return their names.
+
+    Asynchronous run commands keep running once they are created, so their resources are left on the compute
+    until they are deleted by this, e.g. in the rollbacks of the experiment.
+    """
+    if deadline:
+        deadline.check('delete_run_commands')
+
+    try:
+        operations, target, _, list_run_commands = __managed_operations(resource_group, compute, client)
+
+        result = [run_command.name for run_command in list_run_commands(*target)
+                  if run_command.name.startswith(MANAGED_PREFIX)]
+        for name in result:
+            operations.begin_delete(*target, name, polling=False)
+
+    except HttpResponseError as e:
+        raise FailedActivity(e.message)
+
+    return result
+
+
+def prepare_timeline(compute: dict, timeline: List[dict]) -> dict:
+    """Prepare the parameters of one run command that executes all faults of the timeline.
+
+    Every fault of the timeline starts at its ``start`` offset in seconds or, if omitted, once the previous
+    fault ended. Faults may overlap. A fault that writes a file without a path is given its own default path
+    suffixed by its index in the timeline, e.g. ``/root/burn_1``, so that overlapping faults do not clobber
+    each other's file. The parameters are cached per OS type and timeline and must not be changed.
+    """
+    faults = []
+    for index, (script_id, start, arguments) in enumerate(__schedule(timeline)):
+        if 'path' in arguments:
+            default = arguments['path'] is None
+            arguments['path'] = prepare_path(compute, arguments['path'])
+            if default:
+                arguments['path'] = "{}_{}".format(arguments['path'], index)
+        faults.append((script_id, start, __arguments(arguments)))
+
+    return __prepared_timeline(__get_os_type(compute), tuple(faults))
+
+
+def timeline_duration(timeline: List[dict]) -> int:
+    """Return the seconds until the last fault of the timeline ends. Raises for an invalid timeline."""
+    return max([start + arguments['duration'] for _, start, arguments in __schedule(timeline)] or [0])
+
+
+def check_fault(script_id: str, **arguments):
+    """Raise an ``InterruptExecution`` if an argument of the fault is not a valid percentage, count or choice."""
+    for name, minimum in FAULT_PERCENTAGES.get(script_id, {}).items():
+        check_percentage(name, arguments.get(name), minimum)
+    for name, minimum in FAULT_MINIMUMS.get(script_id, {}).items():
+        check_minimum(name, arguments.get(name), minimum)
+    for name, choices in FAULT_CHOICES.get(script_id, {}).items():
+        check_choice(name, arguments.get(name), choices)
+
+
+def check_percentage(name: str, value, minimum: int = 1):
+    """Raise an ``InterruptExecution`` unless the value is a percentage from the minimum up to 100."""
+    if value is not None and not minimum <= value <= 100:
+        raise InterruptExecution("'{}' must be a percentage from {} up to 100, but is '{}'.".format(
+            name, minimum, value))
+
+
+def check_minimum(name: str, value, minimum: int = 1):
+    """Raise an ``InterruptExecution`` unless the value is omitted or at least the minimum."""
+    if value is not None and value < minimum:
+        raise InterruptExecution("'{}' must be at least {}, but is '{}'.".format(name, minimum, value))
+
+
+def check_choice(name: str, value, choices: Tuple):
+    """Raise an ``InterruptExecution`` unless the value is omitted or one of the choices."""
+    if value is not None and value not in choices:
+        raise InterruptExecution("'{}' must be one of '{}', but is '{}'.".format(name, "', '".join(choices), value))
+
+
 def fill_parameters(command_id, script_content, **kwargs) -> dict:
     input_parameters = []
 
@@ -90,6 +244,201 @@ def fill_parameters(command_id, script_content, **kwargs) -> dict:
 #####################
 # HELPER FUNCTIONS
 ####################
+@functools.lru_cache(maxsize=None)
+def _scripts() -> Dict[Tuple[str, str], str]:
+    """Load and validate all bundled scripts once."""
+    result = {}
+
+    for script_id in SCRIPT_IDS:
+        for os_type, extension in EXTENSIONS.items():
+            if os_type == OS_WINDOWS and script_id in UNSUPPORTED_WINDOWS_SCRIPTS:
+                continue
+
+            resource = "common/scripts/{}.{}".format(script_id, extension)
+            try:
+                content = pkgutil.get_data('pdchaosazure', resource)
+            except OSError:
+                content = None
+
+            if not content:
+                raise InterruptExecution("The bundled script '{}' is missing or empty.".format(resource))
+
+            result[(script_id, os_type)] = content.decode('utf-8')
+
+    return result
+
+
+def __run_managed(resource_group, compute, parameters, client, settings, configuration, deadline):
+    name = "{}{}".format(MANAGED_PREFIX, uuid.uuid4().hex[:12])
+    run_command = __managed_run_command(compute, parameters, name, settings)
+    polling_method = polling.create('run_command', configuration, deadline)
+    submitted_at = datetime.now(timezone.utc)
+
+    try:
+        operations, target, get, _ = __managed_operations(resource_group, compute, client)
+
+        poller = operations.begin_create_or_update(*target, name, run_command, polling=polling_method)
+        result = deadline.wait(poller, 'run_command') if deadline else poller.result()
+
+        if not result or result.provisioning_state == 'Failed':
+            raise FailedActivity("Run command '{}' on '{}' could not be created.".format(name, compute['name']))
+
+        if run_command.get('async_execution'):
+            # the script keeps running on the machine, the run command resource tells about its state until
+            # it is deleted by 'delete_managed'
+            logger.info("Run command '{}' executes asynchronously on '{}'.".format(name, compute['name']))
+            return output.from_instance_view(name, result.instance_view, submitted_at, datetime.now(timezone.utc))
+
+        view = get(*target, name, expand='instanceView').instance_view
+        captured = output.from_instance_view(name, view, submitted_at, datetime.now(timezone.utc))
+        logger.debug(captured['stdout'])
+
+        # the result is recorded, so the run command resource is not needed anymore
+        if not settings.get('keep'):
+            operations.begin_delete(*target, name, polling=False)
+
+        if view and view.execution_state in ('Failed', 'TimedOut'):
+            error = FailedActivity("Run command '{}' on '{}' ended with the state '{}' and exit code '{}': {}".format(
+                name, compute['name'], view.execution_state, view.exit_code, view.error or view.execution_message))
+            # the record of the failed command is kept with its target, refer to 'fanout.run'
+            error.run_command = captured
+            raise error
+
+        return captured
+
+    except HttpResponseError as e:
+        raise FailedActivity(e.message)
+
+
+def __managed_operations(resource_group, compute, client):
+    # the operations of the managed run commands of the compute with the arguments addressing the compute,
+    # and the operations to get one and to list all of its run commands
+    compute_type = compute.get('type').lower()
+    if compute_type == RES_TYPE_VMSS_VM.lower():
+        operations = client.virtual_machine_scale_set_vm_run_commands
+        target = (resource_group, compute['scale_set'], compute['instance_id'])
+        return operations, target, operations.get, operations.list
+
+    elif compute_type == RES_TYPE_VM.lower():
+        operations = client.virtual_machine_run_commands
+        target = (resource_group, compute['name'])
+        return operations, target, operations.get_by_virtual_machine, operations.list_by_virtual_machine
+
+    else:
+        msg = "Running a command for the unknown resource type '{}'".format(compute.get('type'))
+        raise InterruptExecution(msg)
+
+
+def __managed_run_command(compute, parameters, name, settings) -> dict:
+    uris = {key: settings[key].format(name=compute['name'], run_command=name)
+            for key in ('output_blob_uri', 'error_blob_uri') if settings.get(key)}
+
+    result = {
+        'location': compute['location'],
+        'source': {'script': "\n".join(parameters['script'])},
+        'parameters': parameters['parameters'],
+        'async_execution': settings.get('async_execution', False),
+        'timeout_in_seconds': settings.get('timeout'),
+    }
+    result.update(uris)
+
+    return {k: v for k, v in result.items() if v is not None}
+
+
+def __schedule(timeline: List[dict]) -> List[Tuple[str, int, dict]]:
+    if not timeline:
+        raise InterruptExecution("The timeline has no faults.")
+
+    result = []
+    offset = 0
+    paths = set()
+    for entry in timeline:
+        entry = dict(entry)
+        script_id = entry.pop('fault', None)
+        if script_id not in TIMELINE_DEFAULTS:
+            raise InterruptExecution("Unknown fault '{}'. Please select one of '{}'.".format(
+                script_id, ", ".join(sorted(TIMELINE_DEFAULTS))))
+
+        start = entry.pop('start', offset)
+        arguments = dict(TIMELINE_DEFAULTS[script_id], **entry)
+        check_fault(script_id, **arguments)
+        if arguments.get('path') is not None:
+            if arguments['path'] in paths:
+                raise InterruptExecution("The path '{}' is used by several faults of the timeline.".format(
+                    arguments['path']))
+            paths.add(arguments['path'])
+
+        offset = start + arguments['duration']
+        result.append((script_id, start, arguments))
+
+    return result
+
+
+@functools.lru_cache(maxsize=128)
+def __prepared_timeline(os_type: str, faults: Tuple) -> dict:
+    render = __render_linux_fault if os_type == OS_LINUX else __render_windows_fault
+    lines = []
+
+    for script_id, start, arguments in faults:
+        _, script_content = __script(script_id, os_type)
+        lines.append(render(script_id, start, dict(arguments), script_content))
+
+    if os_type == OS_LINUX:
+        script = "#!/bin/bash\n\n{}\nwait\n".format("\n".join(lines))
+    else:
+        script = "$jobs = @()\n\n{}\n$jobs | Wait-Job | Receive-Job\n$jobs | Remove-Job -Force\n".format(
+            "\n".join(lines))
+
+    return fill_parameters(COMMAND_IDS[os_type], script)
+
+
+def __render_linux_fault(script_id, start, arguments, script_content) -> str:
+    # every fault runs in a subshell in the background, the bundled scripts read their 'input_*' variables
+    variables = "".join("input_{}={}\n".format(k, shlex.quote(str(v))) for k, v in sorted(arguments.items()))
+    return "# {} at {} seconds\n(\nsleep {}\n{}{}\n) &\n".format(
+        script_id, start, start, variables, script_content)
+
+
+def __render_windows_fault(script_id, start, arguments, script_content) -> str:
+    # every fault runs as a job, the bundled scripts take their 'input_*' parameters
+    values = "; ".join("input_{}={}".format(k, __powershell_literal(v)) for k, v in sorted(arguments.items()))
+    return ("# {} at {} seconds\n"
+            "$jobs += Start-Job -ArgumentList {}, @{{{}}} -ScriptBlock {{\n"
+            "    param ($delay, $arguments)\n"
+            "    Start-Sleep -s $delay\n"
+            "    & ([scriptblock]::Create(@'\n{}\n'@)) @arguments\n"
+            "}}\n").format(script_id, start, start, values, script_content)
+
+
+def __powershell_literal(value) -> str:
+    if isinstance(value, bool):
+        return '$true' if value else '$false'
+    if isinstance(value, (int, float)):
+        return json.dumps(value)
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+def __script(script_id: str, os_type: str) -> Tuple[str, str]:
+    if os_type == OS_WINDOWS and script_id in UNSUPPORTED_WINDOWS_SCRIPTS:
+        raise InterruptExecution("'{}' is not supported for os '{}'".format(script_id, OS_WINDOWS))
+
+    script_content = _scripts().get((script_id, os_type))
+    if script_content is None:
+        raise InterruptExecution("There is no bundled script '{}' for os '{}'".format(script_id, os_type))
+
+    return COMMAND_IDS[os_type], script_content
+
+
+def __arguments(kwargs: dict) -> Tuple:
+    return tuple(sorted((k, v) for k, v in kwargs.items() if v is not None))
+
+
+@functools.lru_cache(maxsize=1024)
+def __prepared_parameters(script_id: str, os_type: str, arguments: Tuple) -> dict:
+    command_id, script_content = __script(script_id, os_type)
+    return fill_parameters(command_id, script_content, **dict(arguments))
+
+
 def __get_os_type(compute):
     compute_type = compute['type'].lower()
 
@@ -0,0 +1,93 @@
+"""
+Capture the results of run commands as structured records.
+
+A run command reports its outcome differently depending on its kind. The legacy run command returns the
+truncated output as status messages, i.e. one message of ``[stdout]`` and ``[stderr]`` sections on Linux and
+one message per stream on Windows. A managed run command reports the exit code, the streams and the times
+of execution in its instance view. Both are turned into one shape of record that is attached to the target.
+
+Scripts report metrics, e.g. the achieved CPU load or the bytes written, by printing lines such as
+``##metric bytes_written=1048576`` to the standard output.
+"""
+import re
+from datetime import datetime
+from typing import Optional
+
+METRIC_PATTERN = re.compile(r'^##metric\s+([\w.\-]+)=([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)\s*$', re.MULTILINE)
+EXIT_STATUS_PATTERN = re.compile(r'exit status=(\d+)')
+
+STATE_SUCCEEDED = "Succeeded"
+STATE_FAILED = "Failed"
+STATE_RUNNING = "Running"
+
+
+def from_legacy(result, submitted_at: datetime, finished_at: datetime) -> dict:
+    """Create the record of a legacy run command from its ``RunCommandResult``."""
+    stdout, stderr, exit_code = "", "", None
+
+    for status in result.value or []:
+        code, message = status.code or "", status.message or ""
+        if 'StdOut' in code:
+            stdout = message
+        elif 'StdErr' in code:
+            stderr = message
+        else:
+            # e.g. 'Enable succeeded: \n[stdout]\n...\n[stderr]\n...' on Linux
+            stdout, stderr = __split_streams(message)
+            exit_status = EXIT_STATUS_PATTERN.search(message)
+            exit_code = int(exit_status.group(1)) if exit_status else (0 if 'succeeded' in message[:64] else None)
+
+    failed = exit_code not in (None, 0)
+    return record(STATE_FAILED if failed else STATE_SUCCEEDED, exit_code, stdout, stderr,
+                  submitted_at, None, None, finished_at)
+
+
+def from_instance_view(name: str, view, submitted_at: datetime, finished_at: datetime) -> dict:
+    """Create the record of a managed run command from its instance view."""
+    if view is None:
+        return dict(record(STATE_RUNNING, None, "", "", submitted_at, None, None, finished_at), name=name)
+
+    return dict(record(view.execution_state, view.exit_code, view.output or "", view.error or "",
+                       submitted_at, view.start_time, view.end_time, finished_at), name=name)
+
+
+def record(execution_state: str, exit_code: Optional[int], stdout: str, stderr: str, submitted_at: datetime,
+           started_at: Optional[datetime], ended_at: Optional[datetime], finished_at: datetime) -> dict:
+    return {
+        'execution_state': execution_state,
+        'exit_code': exit_code,
+        'stdout': stdout,
+        'stderr': stderr,
+        # seconds the command waited for a slot on the machine and ran, if reported by Azure
+        'queue_time': __seconds(submitted_at, started_at),
+        'execution_time': __seconds(started_at, ended_at),
+        # seconds from the submission until the result was received
+        'duration': __seconds(submitted_at, finished_at),
+        'metrics': metrics(stdout),
+    }
+
+
+def metrics(stdout: str) -> dict:
+    """Collect the metrics reported by a script, the last value of a metric wins."""
+    return {name: float(value) for name, value in METRIC_PATTERN.findall(stdout or "")}
+
+
+###########################
+#  PRIVATE HELPER FUNCTIONS
+###########################
+def __split_streams(message: str):
+    match = re.search(r'\[stdout\]\n?(.*?)(?:\n?\[stderr\]\n?(.*))?$', message, re.DOTALL)
+    if not match:
+        return message, ""
+
+    return match.group(1).strip('\n'), (match.group(2) or "").strip('\n')
+
+
+def __seconds(start: Optional[datetime], end: Optional[datetime]) -> Optional[float]:
+    if not start or not end:
+        return None
+
+    if (start.tzinfo is None) != (end.tzinfo is None):
+        start, end = start.replace(tzinfo=None), end.replace(tzinfo=None)
+
+    return round(max(0.0, (end - start).total_seconds()), 3)
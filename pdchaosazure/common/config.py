@@ -6,6 +6,11 @@ from chaoslib.types import Configuration
 from logzero import logger
 from msrestazure import azure_cloud
 
+DEFAULT_MAX_WORKERS = 1000
+
+FAILURE_MODE_FAIL_FAST = "fail_fast"
+FAILURE_MODE_COLLECT_ALL = "collect_all"
+
 
 def load_secrets():
     """Load secrets from experiments or azure credential file.
@@ -80,6 +85,235 @@ def load_timeout(experiment_configuration: Configuration) -> int:
     return result
 
 
+def load_failure_mode(experiment_configuration: Configuration) -> str:
+    """ Defaults to 'fail_fast' if no failure mode is given.
+
+    In the 'fail_fast' mode an action fails as soon as the operation on one of its targets fails. In the
+    'collect_all' mode an action runs the operation on all targets to completion and records the success
+    or failure of every target.
+    """
+    result = FAILURE_MODE_FAIL_FAST
+
+    if experiment_configuration:
+        result = experiment_configuration.get("failure_mode", result)
+
+    return result
+
+
+def load_max_workers(experiment_configuration: Configuration) -> int:
+    """ Defaults to 1000 if no maximum number of concurrent operations per action is given. """
+    result = DEFAULT_MAX_WORKERS
+
+    if experiment_configuration:
+        result = experiment_configuration.get("max_workers", result)
+
+    return result
+
+
+def load_resource_graph_cache(experiment_configuration: Configuration) -> dict:
+    """ Load the settings of the Resource Graph query cache. Defaults to an empty dict, i.e. no caching.
+
+    The settings may look as follows, the time to live is given in seconds. The resources of the pairs of
+    type and filter to prefetch are fetched with a single query once any of them is fetched:
+    ```json
+    {
+        "resource_graph_cache": {
+            "ttl": 30,
+            "max_size": 128,
+            "prefetch": [
+                {"type": "Microsoft.Compute/virtualMachines", "filter": "where resourceGroup=='rg'"},
+                {"type": "Microsoft.Web/sites", "filter": "where resourceGroup=='rg'"}
+            ]
+        }
+    }
+    ```
+    """
+    result = {}
+
+    if experiment_configuration:
+        result = experiment_configuration.get("resource_graph_cache", result)
+
+    return result
+
+
+def load_instance_cache(experiment_configuration: Configuration) -> dict:
+    """ Load the settings of the VMSS instance cache. Defaults to an empty dict, i.e. no caching.
+
+    The instances of a scale set are reused as long as the scale set did not change and they are not older
+    than the time to live in seconds:
+    ```json
+    {
+        "instance_cache": {
+            "ttl": 120,
+            "max_size": 32
+        }
+    }
+    ```
+    """
+    result = {}
+
+    if experiment_configuration:
+        result = experiment_configuration.get("instance_cache", result)
+
+    return result
+
+
+def load_inventory(experiment_configuration: Configuration) -> dict:
+    """ Load the settings of the local resource inventory. Defaults to an empty dict, i.e. no inventory.
+
+    Targets are selected from a SQLite database at the given path instead of the Resource Graph:
+    ```json
+    {
+        "inventory": {
+            "path": "/var/lib/chaos/inventory.sqlite"
+        }
+    }
+    ```
+    """
+    result = {}
+
+    if experiment_configuration:
+        result = experiment_configuration.get("inventory", result)
+
+    return result
+
+
+def load_snapshot(experiment_configuration: Configuration) -> dict:
+    """ Load the settings of the offline snapshot. Defaults to an empty dict, i.e. no snapshot.
+
+    Resources and VMSS instances are read from a recorded file of JSON lines instead of Azure:
+    ```json
+    {
+        "snapshot": {
+            "path": "/var/lib/chaos/snapshot.jsonl"
+        }
+    }
+    ```
+
+    To record the snapshot run the experiment against Azure with ``record`` set. The resources and the
+    completely listed VMSS instances it fetches are appended to the file, resources recorded already are skipped:
+    ```json
+    {
+        "snapshot": {
+            "path": "/var/lib/chaos/snapshot.jsonl",
+            "record": true
+        }
+    }
+    ```
+    """
+    result = {}
+
+    if experiment_configuration:
+        result = experiment_configuration.get("snapshot", result)
+
+    return result
+
+
+def load_dry_run(experiment_configuration: Configuration) -> bool:
+    """ Defaults to False if the dry run is not switched on.
+
+    In a dry run actions resolve their targets and report a plan instead of running any operation.
+    """
+    result = False
+
+    if experiment_configuration:
+        result = experiment_configuration.get("dry_run", result)
+
+    return result
+
+
+def load_timings(experiment_configuration: Configuration) -> dict:
+    """ Load the settings of the recorded operation timings. Defaults to an empty dict, i.e. no recording.
+
+    The latencies of succeeded operations are kept in a JSON file and estimate the duration of dry runs:
+    ```json
+    {
+        "timings": {
+            "path": "/var/lib/chaos/timings.json"
+        }
+    }
+    ```
+    """
+    result = {}
+
+    if experiment_configuration:
+        result = experiment_configuration.get("timings", result)
+
+    return result
+
+
+def load_raw_listing(experiment_configuration: Configuration) -> bool:
+    """ Defaults to False if the raw listing of VMSS instances is not switched on.
+
+    The raw listing decodes the pages of instances straight into dictionaries instead of
+    deserializing them into SDK models first. It pays off for large scale sets.
+    """
+    result = False
+
+    if experiment_configuration:
+        result = experiment_configuration.get("raw_listing", result)
+
+    return result
+
+
+def load_run_command(experiment_configuration: Configuration) -> dict:
+    """ Load the settings of run commands. Defaults to an empty dict, i.e. the legacy run commands.
+
+    Managed run commands may execute asynchronously, time out on the machine and write their output to blobs.
+    The blob URIs may contain the placeholders ``{name}`` of the machine and ``{run_command}``:
+    ```json
+    {
+        "run_command": {
+            "managed": true,
+            "async_execution": true,
+            "timeout": 3600,
+            "output_blob_uri": "https://account.blob.core.windows.net/faults/{name}/{run_command}.out?<sas>",
+            "error_blob_uri": "https://account.blob.core.windows.net/faults/{name}/{run_command}.err?<sas>",
+            "keep": false
+        }
+    }
+    ```
+
+    A run command is deleted once its result is recorded, unless it is kept. An asynchronous run command is
+    still running at that time, so it is left on the machine until the ``delete_run_commands`` action of the
+    machine or scale set deletes it, e.g. in the rollbacks of the experiment.
+    """
+    result = {}
+
+    if experiment_configuration:
+        result = experiment_configuration.get("run_command", result)
+
+    return result
+
+
+def load_polling(experiment_configuration: Configuration) -> dict:
+    """ Load the polling policy of long running operations. Defaults to an empty policy.
+
+    The policy may look as follows:
+    ```json
+    {
+        "polling": {
+            "initial_delay": 10,
+            "interval": 5,
+            "max_interval": 60,
+            "backoff": 1.5,
+            "jitter": 0.2,
+            "max_rate": 10,
+            "operations": {
+                "delete": {"initial_delay": 30}
+            }
+        }
+    }
+    ```
+    """
+    result = {}
+
+    if experiment_configuration:
+        result = experiment_configuration.get("polling", result)
+
+    return result
+
+
 def load_subscription_id() -> str:
     # lookup in Azure auth file
     credentials = _load_credentials_from_auth_file()
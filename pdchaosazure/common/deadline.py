@@ -0,0 +1,88 @@
+"""
+Enforce the timeout of an activity as a whole and cancel its outstanding work.
+
+A deadline is created once at the start of an activity from the configured timeout (refer to
+``config.load_timeout``). It is handed down to the fetching of targets, the submission and polling of
+operations and the execution of commands, which all spend from the same remaining budget.
+
+When the activity is interrupted the deadline is cancelled. Workers wait for their long running operations
+in short intervals only, notice the cancellation within about a second and hand off the continuation token
+of their unfinished operation instead of waiting for it to finish.
+"""
+import threading
+import time
+
+from azure.core.polling import LROPoller
+from chaoslib.exceptions import ChaosException, FailedActivity, InterruptExecution
+from logzero import logger
+
+WAIT_INTERVAL = 1.0
+
+
+class Deadline:
+    """A point in time after which the activity stops waiting for outstanding work."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def cancel(self):
+        """Cancel all work that waits on this deadline."""
+        self._cancelled.set()
+
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self, operation: str):
+        """Raise an ``InterruptExecution`` if the deadline was cancelled or a ``FailedActivity`` if it expired."""
+        if self.cancelled():
+            raise InterruptExecution("Operation '{}' was cancelled.".format(operation))
+
+        if self.expired():
+            raise self.error(operation)
+
+    def error(self, operation: str) -> FailedActivity:
+        return FailedActivity(
+            "Operation '{}' exceeded the timeout of {} seconds."
+            " You may consider to increase the timeout in the experiment configuration.".format(
+                operation, self.timeout))
+
+    def sleep(self, seconds: float):
+        """Sleep for the given seconds unless the deadline is cancelled in the meantime."""
+        self._cancelled.wait(min(seconds, self.remaining()))
+
+    def wait(self, poller: LROPoller, operation: str):
+        """Wait for the result of a long running operation until it finishes or the deadline ends.
+
+        The continuation token of an unfinished operation is attached to the raised error as
+        ``continuation_token``, so that the operation can be resumed or inspected later.
+        """
+        try:
+            while not poller.done():
+                self.check(operation)
+                poller.wait(min(WAIT_INTERVAL, self.remaining()))
+
+            return poller.result()
+
+        except ChaosException as e:
+            e.continuation_token = _continuation_token(poller)
+            logger.warn("Operation '{}' did not finish. Its continuation token is '{}'.".format(
+                operation, e.continuation_token))
+            raise
+
+
+#####################
+# HELPER FUNCTIONS
+####################
+def _continuation_token(poller):
+    try:
+        return poller.continuation_token()
+    except Exception:
+        return None
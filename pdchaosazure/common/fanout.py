@@ -0,0 +1,197 @@
+"""
+Fan out an operation over the targets of an action.
+
+The targets are handled by a pool of threads that is bounded by the configured maximum number of workers,
+refer to ``config.load_max_workers``. Depending on the failure mode of the experiment configuration
+the first failed target fails the whole action ('fail_fast') or all targets run to completion and every target
+is recorded with its status, error and latency ('collect_all'). Refer to ``config.load_failure_mode``.
+"""
+import concurrent.futures
+import time
+from typing import Any, Callable, Iterable, List
+
+from azure.core.exceptions import HttpResponseError
+from chaoslib.exceptions import FailedActivity, InterruptExecution
+from chaoslib.types import Configuration
+from logzero import logger
+
+from pdchaosazure.common import config, planner
+from pdchaosazure.common.deadline import Deadline
+from pdchaosazure.vmss.records import Records
+
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+STATUS_PLANNED = "planned"
+
+
+def run(activity: str, targets: Iterable[dict], operation: Callable[[dict], dict],
+        cleanse: Callable[[dict], dict], configuration: Configuration, deadline: Deadline = None,
+        planned: planner.Operation = planner.LRO, validate: Callable[[dict], Any] = None) -> Records:
+    """Run the operation for every target and record the affected targets.
+
+    :param activity: The name of the activity, used for logging.
+    :param targets: The targets of the activity, e.g. virtual machines or VMSS instances. May be a stream.
+    :param operation: Runs the operation for one target and returns the affected target.
+    :param cleanse: Frees the affected target from unwanted keys before it is recorded.
+    :param configuration: The experiment configuration.
+    :param deadline: The deadline of the activity. Targets that are outstanding when it expires or when
+        the activity is interrupted are cancelled.
+    :param planned: The kind of operation, used to plan a dry run and to record timings.
+    :param validate: Checks the operation for one target without running it, e.g. prepares the parameters of
+        a run command. A dry run records the targets it raises for as failed and leaves them out of the plan.
+    """
+    if config.load_dry_run(configuration):
+        return __plan(activity, targets, cleanse, planned, configuration, validate)
+
+    collect_all = config.load_failure_mode(configuration) == config.FAILURE_MODE_COLLECT_ALL
+    records = Records()
+
+    # threads are spawned on demand, i.e. never more than there are targets
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.load_max_workers(configuration))
+    futures = {}
+    latencies = []
+    aborted = False
+
+    try:
+        # targets may be streamed, so the first operations start while later targets are still fetched
+        try:
+            for target in targets:
+                futures[executor.submit(__timed, operation, target, deadline)] = target
+
+        except (KeyboardInterrupt, InterruptExecution):
+            raise
+
+        except Exception as e:
+            # fetching the remaining targets failed, the operations of the targets so far are cancelled
+            aborted = True
+            if isinstance(e, FailedActivity):
+                raise
+            raise FailedActivity("Failed to fetch the targets of operation '{}': {}".format(
+                activity, e.message if isinstance(e, HttpResponseError) else e)) from e
+
+        timeout = deadline.remaining() if deadline else None
+        for future in concurrent.futures.as_completed(futures, timeout=timeout):
+            affected, latency, error = future.result()
+
+            if error and not collect_all:
+                aborted = True
+                raise error
+
+            __record(records, affected, cleanse, latency, error, collect_all)
+            if not error:
+                latencies.append(latency)
+
+    except concurrent.futures.TimeoutError:
+        outstanding = [futures[f] for f in futures if not f.done()]
+        logger.warn("Operation '{}' timed out with {} of {} targets outstanding.".format(
+            activity, len(outstanding), len(futures)))
+
+        error = deadline.error(activity)
+        if not collect_all:
+            aborted = True
+            raise error
+
+        for target in outstanding:
+            __record(records, target, cleanse, deadline.timeout, error, collect_all)
+
+    except (KeyboardInterrupt, InterruptExecution):
+        outstanding = [futures[f] for f in futures if not f.done()]
+        logger.warn("Operation '{}' was interrupted with {} of {} targets outstanding. Cancelling them.".format(
+            activity, len(outstanding), len(futures)))
+        aborted = True
+        raise
+
+    finally:
+        # stop submitting queued targets of this fan-out. The deadline is shared by the whole activity, e.g. by
+        # the fan-outs of all scale sets, so it is cancelled only if the activity is aborted. After a timeout
+        # that is collected the running workers give up on their own, as the deadline expired.
+        for future in futures:
+            future.cancel()
+        if aborted and deadline and not all(f.done() for f in futures):
+            deadline.cancel()
+        executor.shutdown(wait=False)
+        planner.observe(activity, planned, latencies, configuration)
+
+    failed = [e for e in records.output() if e.get('status') == STATUS_FAILED]
+    if failed:
+        logger.warn("Operation '{}' failed for {} of {} targets.".format(activity, len(failed), len(futures)))
+
+    return records
+
+
+def gather(function: Callable[[Any], Any], items: Iterable, configuration: Configuration) -> List:
+    """Apply the function to all items concurrently and return the results in the order of the items.
+
+    Unlike ``run`` the first error is raised as is, e.g. to list the instances of many scale sets at once.
+    The pool is bounded by the configured maximum number of workers.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    max_workers = min(len(items), config.load_max_workers(configuration))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(function, items))
+
+
+###########################
+#  PRIVATE HELPER FUNCTIONS
+###########################
+def __plan(activity, targets, cleanse, planned, configuration, validate):
+    targets = list(targets)
+    records = Records()
+    valid = []
+
+    for target in targets:
+        try:
+            if validate:
+                validate(target)
+            target['status'] = STATUS_PLANNED
+            valid.append(target)
+        except (FailedActivity, InterruptExecution) as e:
+            # the operation would fail for this target, e.g. a fault that its OS does not support
+            target['status'] = STATUS_FAILED
+            target['error'] = str(e)
+
+    records.plan = planner.plan(activity, valid, planned, configuration, len(targets) - len(valid))
+    for target in targets:
+        records.add(cleanse(target))
+
+    logger.info("Planned operation '{}' for {} of {} targets, estimated to take {} seconds.".format(
+        activity, len(valid), len(targets), records.plan['estimated_duration']))
+    return records
+
+
+def __record(records, affected, cleanse, latency, error, collect_all):
+    if collect_all:
+        affected['status'] = STATUS_FAILED if error else STATUS_SUCCEEDED
+        affected['latency'] = round(latency, 3)
+        if error:
+            affected['error'] = str(error)
+        if getattr(error, 'continuation_token', None):
+            affected['continuation_token'] = error.continuation_token
+        if getattr(error, 'run_command', None):
+            affected['run_command'] = error.run_command
+
+    records.add(cleanse(affected))
+
+
+def __timed(operation, target, deadline):
+    start = time.monotonic()
+
+    try:
+        affected = operation(target)
+        return affected, time.monotonic() - start, None
+
+    except HttpResponseError as e:
+        return target, time.monotonic() - start, FailedActivity(e.message)
+
+    except FailedActivity as e:
+        return target, time.monotonic() - start, e
+
+    except InterruptExecution as e:
+        # a cancelled deadline interrupts the whole activity, any other interrupt concerns this target only,
+        # e.g. a fault that its OS does not support
+        if deadline and deadline.cancelled():
+            raise
+        return target, time.monotonic() - start, e
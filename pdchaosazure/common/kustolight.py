@@ -9,94 +9,96 @@ Working examples are:
 * ``where instance_id=='0'``
 * ``where instance_id=='0' or instance_id=='1 and/or ...``
 * ``where instance_id=='0' or instance_id=='1' | sample 1``
+* ``where resourceGroup=~'RG' and name contains 'web' and tags.env!='prod'``
 * ``sample 1``
 * Instead of the ``sample`` command you can put the ``take`` or ``top`` command.
 * You may use the pipe operator to pipe and filter outputs
 """
 
+import functools
+import itertools
 import random
 import re
-from typing import List
+from typing import Any, Iterable, Iterator, List, Tuple
 
 import jmespath
 
-operator_pattern = re.compile(r'[=><~]{1,2}')
+# a term compares a key, which may be nested like ``tags.env``, with a quoted string, a number or another key
+KEY = r"[\w.]+"
+OPERATOR = r"==|!=|=~|!~|<=|>=|<|>|!?contains\b"
+VALUE = r"'[^']*'|\"[^\"]*\"|[\w.]+"
 
+term_pattern = re.compile(r"(?:^|[\s]+(and|or)[\s]+)({})[\s]*({})[\s]*({})".format(KEY, OPERATOR, VALUE))
+where_pattern = re.compile(r"where[\s]+{0}(?:[\s]+(?:and|or)[\s]+{0})*".format(
+    r"{}[\s]*(?:{})[\s]*(?:{})".format(KEY, OPERATOR, VALUE)))
 
-def __split_clause(clause, delimiter):
-    split = clause.strip().split(delimiter, 1)
-    lhs = split[0].strip()
-    rhs = split[1].strip()
-    return lhs, rhs
 
+class _Functions(jmespath.functions.Functions):
+    """ The case insensitive comparisons ``=~`` and ``contains`` of Kusto, which JMESPath lacks """
 
-def __and_or_expressions_to_jmespath(where_clause: str) -> str:
-    result = ""
-    expression_pattern = re.compile(r'[\s]+(?:and|or){1}[\s]+[\w]+[\s]*[=><~]{1,2}[\s]*[\']?[\w]*[\']?')
-    expression_clauses = expression_pattern.findall(where_clause)
-
-    for clause in expression_clauses:
-        clause = clause.strip()
-        operator = operator_pattern.findall(clause)[0]
-        if clause.startswith('and'):
-            expression_kustolight = 'and'
-            expression_jmespath = '&&'
-        else:
-            expression_kustolight = 'or'
-            expression_jmespath = '||'
+    @jmespath.functions.signature({'types': []}, {'types': []})
+    def _func_equals_ignore_case(self, value, other):
+        value = self._lower(value)
+        return value is not None and value == self._lower(other)
 
-        lhs, rhs = __split_clause(clause[len(expression_kustolight):], operator)
-        result += " {} {} {} {}".format(expression_jmespath, lhs, operator, rhs)
+    @jmespath.functions.signature({'types': []}, {'types': []})
+    def _func_contains_ignore_case(self, value, other):
+        value, other = self._lower(value), self._lower(other)
+        return value is not None and other is not None and other in value
 
-    return result
+    @staticmethod
+    def _lower(value):
+        if value is None or isinstance(value, (dict, list)):
+            return None
+        return str(value).lower()
 
 
-def __where_clause_to_jmespath(where_clause: str):
-    """ Transforms a Kusto light where clause to JMESPath syntax """
+OPTIONS = jmespath.Options(custom_functions=_Functions())
 
-    # Regex patterns to find operator, where clauses and possible and/or expressions
-    where_pattern = re.compile(r'where[\s]+[\w]+[\s]*[=><~]{1,2}[\s]*[\']?[\w]*[\']?')
 
-    # Only one where clause is allowed - so we return it together with its operator
-    found_where = where_pattern.findall(where_clause)[0]
-    operator = operator_pattern.findall(found_where)[0]
+def __value_to_jmespath(value: str) -> str:
+    if value[0] in ('"', "'"):
+        return "'{}'".format(value[1:-1].replace("'", "\\'"))
 
-    # Get the left hand side (key) and the right hand side (value) of the operator
-    lhs, rhs = __split_clause(found_where[len('where'):], operator)
+    if re.fullmatch(r"-?[\d.]+|true|false", value):
+        return "`{}`".format(value)
 
-    return "[?{} {} {}".format(lhs, operator, rhs) + __and_or_expressions_to_jmespath(where_clause) + "]"
+    return value
 
 
-def __where_clauses_to_jmespath(kustolight_filter: str) -> str:
-    """ Catches where clauses such as ``where instance_id == '0' and name=='i_0' or interval==30`` """
-    result = kustolight_filter
-    where_pattern = re.compile((r'where[\s]+[\w]+[\s]*[=><~]{1,2}[\s]*[\']?[\w]*[\']?'
-                                r'(?:[\s]+(?:and|or){1}[\s]+[\w]+[\s]*[=><~]{2}[\s]*[\']?[\w]*[\']?)*'))
-    where_clauses = where_pattern.findall(kustolight_filter)
-    for kustol_clause in where_clauses:
-        jmse_clause = __where_clause_to_jmespath(kustol_clause)
-        result = result.replace(kustol_clause, jmse_clause, 1)
+def __term_to_jmespath(key: str, operator: str, value: str) -> str:
+    value = __value_to_jmespath(value)
+    negate = "!" if operator.startswith('!') and operator != '!=' else ""
 
-    return result
+    if operator in ('=~', '!~'):
+        return "{}equals_ignore_case({}, {})".format(negate, key, value)
 
+    if operator.endswith('contains'):
+        return "{}contains_ignore_case({}, {})".format(negate, key, value)
 
-def __fetch_rows(resources: List[dict], command: str):
-    command = __normalize_expression(command)
+    return "{} {} {}".format(key, operator, value)
 
-    if command.startswith('sample'):
-        count = int(command[len('sample'):].strip())
-        return random.sample(resources, count)
 
-    elif command.startswith('top'):
-        count = int(command[len('top'):].strip())
-        return resources[:count]
+def __where_clause_to_jmespath(where_clause: str) -> str:
+    """ Transforms a Kusto light where clause to JMESPath syntax """
+    result = ""
+    for match in term_pattern.finditer(where_clause[len('where'):].strip()):
+        connector, key, operator, value = match.groups()
+        if connector:
+            result += " {} ".format('&&' if connector == 'and' else '||')
+        result += __term_to_jmespath(key, operator, value)
 
-    elif command.startswith('take'):
-        count = int(command[len('top'):].strip())
-        return resources[:count]
+    return "[?{}]".format(result)
 
-    else:
-        raise Exception("Unknown command. Please select one of 'sample, take, top'")
+
+def __where_clauses_to_jmespath(kustolight_filter: str) -> str:
+    """ Catches where clauses such as ``where instance_id == '0' and name=~'I_0' or tags.env contains 'prod'`` """
+    result = kustolight_filter
+    for kustol_clause in where_pattern.findall(kustolight_filter):
+        jmse_clause = __where_clause_to_jmespath(kustol_clause)
+        result = result.replace(kustol_clause, jmse_clause, 1)
+
+    return result
 
 
 def __normalize_expression(command):
@@ -106,41 +108,89 @@ def __normalize_expression(command):
         return command.strip()
 
 
-def __filter_resources(resources, kustol_filter: str) -> List[dict]:
-    pattern = re.compile(r'\|{0,1}[\s]*(?:take|top|sample){1}[\s]+[\d]')
+@functools.lru_cache(maxsize=128)
+def __stages(kustol_filter: str) -> Tuple[Tuple[str, Any], ...]:
+    """ Split a Kusto light filter into a pipeline of ``where``, ``take``, ``top`` and ``sample`` stages.
+
+    The stages are cached per filter, so that the translation and compilation of a filter that is applied
+    to several scale sets or in several activities happens only once.
+    """
+    pattern = re.compile(r'\|{0,1}[\s]*(?:take|top|sample){1}[\s]+[\d]+')
     taketopsample_list = pattern.findall(kustol_filter)
 
-    if taketopsample_list:
-        split = pattern.split(kustol_filter, 1)
-        command = taketopsample_list[0]
-        lhs = split[0] if split[0] else None
-        rhs = split[1] if split[1] else None
-
-        if lhs and rhs:
-            jmes_filter = __where_clauses_to_jmespath(lhs)
-            result = jmespath.search(jmes_filter, resources)
-            resources = __fetch_rows(result, command)
-            return __filter_resources(resources, rhs)
-        elif lhs and not rhs:
-            jmes_filter = __where_clauses_to_jmespath(lhs)
-            result = jmespath.search(jmes_filter, resources)
-            resources = __fetch_rows(result, command)
-            return resources
-        elif not lhs and rhs:
-            resources = __fetch_rows(resources, command)
-            return __filter_resources(resources, rhs)
+    if not taketopsample_list:
+        return (__where_stage(kustol_filter),)
+
+    split = pattern.split(kustol_filter, 1)
+    lhs = split[0].strip()
+    rhs = split[1].strip()
+
+    stages = []
+    if lhs:
+        stages.append(__where_stage(lhs))
+
+    command, count = __normalize_expression(taketopsample_list[0]).split()
+    if command not in ('sample', 'take', 'top'):
+        raise Exception("Unknown command. Please select one of 'sample, take, top'")
+    stages.append((command, int(count)))
+
+    if rhs:
+        stages.extend(__stages(rhs))
+
+    return tuple(stages)
+
+
+def __where_stage(kustol_filter: str) -> Tuple[str, Any]:
+    jmes_filter = __where_clauses_to_jmespath(kustol_filter)
+    return 'where', jmespath.compile(jmes_filter)
+
+
+def __where(resources: Iterable[dict], expression) -> Iterator[dict]:
+    for resource in resources:
+        yield from expression.search([resource], options=OPTIONS) or []
+
+
+def __sample(resources: Iterable[dict], count: int) -> Iterator[dict]:
+    """ Reservoir sampling keeps at most ``count`` resources in memory """
+    reservoir = []
+    for index, resource in enumerate(resources):
+        if index < count:
+            reservoir.append(resource)
         else:
-            resources = __fetch_rows(resources, command)
-            return resources
+            slot = random.randint(0, index)
+            if slot < count:
+                reservoir[slot] = resource
 
-    else:
-        jmes_filter = __where_clauses_to_jmespath(kustol_filter)
-        result = jmespath.search(jmes_filter, resources)
-        return result
+    random.shuffle(reservoir)
+    yield from reservoir
+
+
+def __pipe(resources: Iterable[dict], stages: Tuple[Tuple[str, Any], ...]) -> Iterator[dict]:
+    for command, argument in stages:
+        if command == 'where':
+            resources = __where(resources, argument)
+        elif command == 'sample':
+            resources = __sample(resources, argument)
+        else:
+            resources = itertools.islice(resources, argument)
+
+    yield from resources
+
+
+def filter_iter(resources: Iterable[dict], kustol_filter: str) -> Iterator[dict]:
+    """ Filter a stream of resources lazily.
+
+    Resources are pulled from the iterable one by one and flow through the stages of the filter. The ``take``
+    and ``top`` commands stop pulling once they have enough resources. The ``sample`` command drains the
+    stream but keeps only the sampled resources in memory. The filter is parsed right away, so an invalid
+    filter raises before any resource is pulled.
+    """
+    stages = __stages(kustol_filter)
+    return __pipe(resources, stages)
 
 
 def filter_resources(resources: List[dict], kustol_filter: str) -> List[dict]:
     if not resources:
         return resources
 
-    return __filter_resources(resources, kustol_filter)
+    return list(filter_iter(resources, kustol_filter))
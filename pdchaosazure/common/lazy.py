@@ -0,0 +1,31 @@
+"""
+Create Azure management clients on their first use.
+
+Actions resolve their targets before they operate on them. If the targets are read from a snapshot and the
+operations are only planned in a dry run, no client is needed, i.e. neither credentials nor network access.
+"""
+import threading
+from typing import Any, Callable
+
+
+class LazyClient:
+    """Stand in for the client of the factory, which is called once an attribute of the client is accessed.
+
+    The client is created at most once, also if the workers of a fan-out access it concurrently.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the client, create it if it was not used before."""
+        with self._lock:
+            if self._client is None:
+                self._client = self._factory()
+
+            return self._client
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
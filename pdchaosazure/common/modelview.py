@@ -0,0 +1,80 @@
+"""
+Read Azure SDK models as dictionaries without serializing them as a whole.
+
+``Model.as_dict()`` recursively serializes every attribute of a model, e.g. the storage, network and
+OS profiles of a VMSS instance, which are mostly dropped right after by ``cleanse``. A ``ModelView``
+offers the same keys and values as ``as_dict()`` but serializes an attribute only once it is read.
+Keys may be added and deleted like in a dictionary. ``dict(view)`` serializes the retained keys only.
+"""
+import functools
+from collections.abc import MutableMapping
+
+from msrest.serialization import Model, Serializer, attribute_transformer
+
+
+class ModelView(MutableMapping):
+    """A mutable mapping over an SDK model that serializes attributes on first access."""
+
+    def __init__(self, model: Model, **extra):
+        self._model = model
+        self._attributes = model._attribute_map
+        self._values = dict(extra)
+        self._deleted = set()
+
+    def __getitem__(self, key):
+        if key in self._values:
+            return self._values[key]
+
+        if key in self._deleted or key not in self._attributes:
+            raise KeyError(key)
+
+        value = getattr(self._model, key)
+        if value is None:
+            raise KeyError(key)
+
+        self._values[key] = _serializer(type(self._model)).serialize_data(
+            value, self._attributes[key]['type'], key_transformer=attribute_transformer, keep_readonly=True)
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+
+        self._values.pop(key, None)
+        self._deleted.add(key)
+
+    def __contains__(self, key):
+        if key in self._values:
+            return True
+
+        if key in self._deleted or key not in self._attributes:
+            return False
+
+        return getattr(self._model, key) is not None
+
+    def __iter__(self):
+        for key in self._attributes:
+            if key in self:
+                yield key
+
+        for key in self._values:
+            if key not in self._attributes:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, type(self._model).__name__)
+
+
+#####################
+# HELPER FUNCTIONS
+####################
+@functools.lru_cache(maxsize=None)
+def _serializer(model_class) -> Serializer:
+    return Serializer(model_class._infer_class_models())
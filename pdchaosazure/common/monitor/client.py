@@ -1,6 +1,7 @@
 from azure.mgmt.monitor import MonitorManagementClient
 
 from pdchaosazure import auth, load_secrets
+from pdchaosazure.common import throttling
 from pdchaosazure.common.config import load_subscription_id
 
 
@@ -11,6 +12,7 @@ def init() -> MonitorManagementClient:
 
     with auth(secrets) as credentials:
         client = MonitorManagementClient(
-            credential=credentials, subscription_id=subscription_id, base_url=base_url)
+            credential=credentials, subscription_id=subscription_id, base_url=base_url,
+            per_retry_policies=[throttling.policy(subscription_id)])
 
         return client
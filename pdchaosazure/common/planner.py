@@ -0,0 +1,170 @@
+"""
+Plan an action without running it.
+
+In a dry run (refer to ``config.load_dry_run``) an action resolves its targets as usual but does not start
+any operation. Instead every target is recorded with the status 'planned', or 'failed' if the operation
+would fail for it, and the action's output carries a plan: the number of valid and invalid targets and of
+run commands, the requests per subscription measured against the hourly Azure Resource Manager budget, and
+an estimate of the duration.
+
+The duration of an operation is estimated from the latencies of earlier runs of the same activity if
+timings are recorded (refer to ``config.load_timings``), otherwise from defaults per kind of operation.
+"""
+import json
+import math
+import os
+import re
+import statistics
+import threading
+from collections import namedtuple
+from typing import Iterable, List
+
+from chaoslib.types import Configuration
+
+from pdchaosazure.common import config, polling, throttling
+
+KIND_LRO = "long_running_operation"
+KIND_COMMAND = "run_command"
+KIND_WRITE = "write"
+
+# Azure Resource Manager allows these requests per subscription and hour
+HOURLY_READS = 12000
+HOURLY_WRITES = 1200
+
+# Assumed durations in seconds if no timings were recorded
+DEFAULT_DURATIONS = {KIND_LRO: 60, KIND_COMMAND: 45, KIND_WRITE: 5}
+
+# Timings kept per activity
+MAX_TIMINGS = 100
+
+Operation = namedtuple('Operation', ['kind', 'duration'])
+
+LRO = Operation(KIND_LRO, 0)
+WRITE = Operation(KIND_WRITE, 0)
+
+_timings_lock = threading.Lock()
+
+
+def command(duration: float) -> Operation:
+    """A run command that keeps the target busy for the given seconds."""
+    return Operation(KIND_COMMAND, duration or 0)
+
+
+def plan(activity: str, targets: List[dict], operation: Operation, configuration: Configuration,
+         invalid_targets: int = 0) -> dict:
+    """Plan the operation for all targets of an activity, the invalid targets are only counted."""
+    duration = estimate(activity, operation, configuration)
+    polls = 0
+    if operation.kind == KIND_LRO:
+        polls = __polls(activity, duration, configuration)
+    elif operation.kind == KIND_COMMAND:
+        polls = __polls('run_command', duration, configuration)
+
+    requests = {}
+    for target in targets:
+        subscription = requests.setdefault(__subscription(target), {'reads': 0, 'writes': 0})
+        subscription['writes'] += 1
+        subscription['reads'] += polls
+
+    waves = math.ceil(len(targets) / config.load_max_workers(configuration)) if targets else 0
+    writes = max([r['writes'] for r in requests.values()] or [0])
+
+    return {
+        'activity': activity,
+        'operation': operation.kind,
+        'targets': len(targets),
+        'invalid_targets': invalid_targets,
+        'run_commands': len(targets) if operation.kind == KIND_COMMAND else 0,
+        'requests': requests,
+        'budget': __budget(requests),
+        # operations run in waves of the maximum number of workers, the writes are paced by the throttling
+        'estimated_duration': round(max(waves * duration, writes / throttling.DEFAULT_RATE), 1)
+    }
+
+
+def merge(plans: Iterable[dict]) -> dict:
+    """Merge the plans of operations that run one after the other, e.g. scale set by scale set."""
+    result = None
+    for p in plans:
+        if result is None:
+            result = json.loads(json.dumps(p))
+            continue
+
+        result['targets'] += p['targets']
+        result['invalid_targets'] += p['invalid_targets']
+        result['run_commands'] += p['run_commands']
+        result['estimated_duration'] = round(result['estimated_duration'] + p['estimated_duration'], 1)
+        for subscription, requests in p['requests'].items():
+            merged = result['requests'].setdefault(subscription, {'reads': 0, 'writes': 0})
+            merged['reads'] += requests['reads']
+            merged['writes'] += requests['writes']
+        result['budget'] = __budget(result['requests'])
+
+    return result
+
+
+def estimate(activity: str, operation: Operation, configuration: Configuration) -> float:
+    """Estimate the duration of the operation on one target in seconds."""
+    timings = load_timings(configuration).get(__timings_key(activity, operation))
+    if timings:
+        return statistics.median(timings)
+
+    return DEFAULT_DURATIONS[operation.kind] + operation.duration
+
+
+def observe(activity: str, operation: Operation, latencies: List[float], configuration: Configuration):
+    """Record the latencies of succeeded operations for later estimates if timings are configured."""
+    path = config.load_timings(configuration).get('path')
+    if not path or not latencies:
+        return
+
+    with _timings_lock:
+        timings = load_timings(configuration)
+        key = __timings_key(activity, operation)
+        timings[key] = (timings.get(key, []) + [round(latency, 3) for latency in latencies])[-MAX_TIMINGS:]
+
+        with open(path, 'w') as file:
+            json.dump(timings, file)
+
+
+def load_timings(configuration: Configuration) -> dict:
+    path = config.load_timings(configuration).get('path')
+    if not path or not os.path.exists(path):
+        return {}
+
+    with open(path) as file:
+        return json.load(file)
+
+
+###########################
+#  PRIVATE HELPER FUNCTIONS
+###########################
+def __polls(operation: str, duration: float, configuration: Configuration) -> int:
+    # replays the backoff of the adaptive polling, refer to ``polling.AdaptivePolling``
+    policy = polling.load_policy(operation, configuration)
+    elapsed, interval, result = policy['initial_delay'], policy['interval'], 1
+    while elapsed < duration:
+        elapsed += interval
+        interval = min(interval * policy['backoff'], policy['max_interval'])
+        result += 1
+
+    return result
+
+
+def __timings_key(activity: str, operation: Operation) -> str:
+    # e.g. the stop of a web app and of a virtual machine differ by their kind of operation
+    return "{}/{}".format(operation.kind, activity)
+
+
+def __subscription(target: dict) -> str:
+    match = re.match(r'/subscriptions/([^/]+)', target.get('id') or '', re.IGNORECASE)
+    return match.group(1) if match else (config.load_subscription_id() or 'unknown')
+
+
+def __budget(requests: dict) -> dict:
+    return {
+        subscription: {
+            'reads': round(r['reads'] / HOURLY_READS, 4),
+            'writes': round(r['writes'] / HOURLY_WRITES, 4)
+        } for subscription, r in requests.items()
+    }
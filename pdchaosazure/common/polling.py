@@ -0,0 +1,136 @@
+"""
+Poll long running Azure operations in an adaptive way.
+
+The Azure SDK polls every long running operation at a fixed interval. With hundreds of concurrent targets
+this results in a steady storm of status requests against the Azure Resource Manager read quota. The
+polling method offered here waits an initial delay, backs off exponentially with some jitter and hands
+out every status request through a poll scheduler that is shared by all pollers of the process.
+
+The polling policy is configured in the experiment configuration. Refer to ``config.load_polling``.
+"""
+import random
+import threading
+import time
+
+from azure.mgmt.core.polling.arm_polling import ARMPolling
+from chaoslib.types import Configuration
+
+from pdchaosazure.common import config
+from pdchaosazure.common.deadline import Deadline
+
+DEFAULT_POLICY = {
+    "initial_delay": 10,
+    "interval": 5,
+    "max_interval": 60,
+    "backoff": 1.5,
+    "jitter": 0.2,
+    "max_rate": 10
+}
+
+OPERATION_POLICIES = {
+    "deallocate": {"initial_delay": 30},
+    "delete": {"initial_delay": 30},
+    "restart": {"initial_delay": 20},
+    "run_command": {"initial_delay": 30, "interval": 10}
+}
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+class PollScheduler:
+    """Hand out poll slots so that the process does not issue more than ``rate`` polls per second."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class AdaptivePolling(ARMPolling):
+    """ARM polling with an initial delay, exponential backoff, jitter and a shared poll scheduler."""
+
+    def __init__(self, policy: dict, scheduler: PollScheduler, deadline: Deadline = None, **kwargs):
+        super().__init__(timeout=policy['interval'], **kwargs)
+        self._policy = policy
+        self._scheduler = scheduler
+        self._deadline = deadline
+        self._interval = policy['interval']
+
+    def run(self):
+        if not self.finished():
+            self._sleep(_jittered(self._policy['initial_delay'], self._policy['jitter']))
+            self._scheduler.acquire()
+        super().run()
+
+    def _delay(self):
+        super()._delay()
+        self._scheduler.acquire()
+
+    def _sleep(self, delay):
+        if not self._deadline:
+            super()._sleep(delay)
+            return
+
+        # stop polling as soon as the activity is interrupted or out of time
+        self._deadline.sleep(delay)
+        self._deadline.check('polling')
+
+    def _extract_delay(self):
+        delay = _jittered(self._interval, self._policy['jitter'])
+        self._interval = min(self._interval * self._policy['backoff'], self._policy['max_interval'])
+
+        # a server side 'Retry-After' header is a lower bound
+        self._timeout = delay
+        return max(super()._extract_delay(), delay)
+
+
+def create(operation: str, configuration: Configuration, deadline: Deadline = None, **kwargs) -> AdaptivePolling:
+    """Create the polling method for an operation to be handed over to an Azure SDK ``begin_*`` call.
+
+    :param operation: The operation name, e.g. ``delete`` or ``run_command``.
+    :param configuration: The experiment configuration that may carry a polling policy.
+    :param deadline: The deadline of the activity. Polling stops once it is cancelled.
+    :param kwargs: Additional keyword arguments for the ARM polling, e.g. ``lro_options``.
+    """
+    policy = load_policy(operation, configuration)
+    return AdaptivePolling(policy, scheduler(policy['max_rate']), deadline, **kwargs)
+
+
+def load_policy(operation: str, configuration: Configuration) -> dict:
+    polling = config.load_polling(configuration)
+
+    result = dict(DEFAULT_POLICY)
+    result.update(OPERATION_POLICIES.get(operation, {}))
+    result.update({k: v for k, v in polling.items() if k != 'operations'})
+    result.update(polling.get('operations', {}).get(operation, {}))
+
+    return result
+
+
+def scheduler(rate: float) -> PollScheduler:
+    """Return the poll scheduler shared by all pollers with the same rate."""
+    with _schedulers_lock:
+        if rate not in _schedulers:
+            _schedulers[rate] = PollScheduler(rate)
+
+        return _schedulers[rate]
+
+
+#####################
+# HELPER FUNCTIONS
+####################
+def _jittered(delay: float, jitter: float) -> float:
+    return max(0.0, delay * (1 + random.uniform(-jitter, jitter)))
@@ -2,6 +2,7 @@ from azure.mgmt.resourcegraph import ResourceGraphClient
 from chaoslib import Secrets
 
 from pdchaosazure import load_secrets, auth
+from pdchaosazure.common import throttling
 
 
 def init_client(experiment_secrets: Secrets) -> ResourceGraphClient:
@@ -9,5 +10,7 @@ def init_client(experiment_secrets: Secrets) -> ResourceGraphClient:
 
     with auth(secrets) as credential:
         base_url = secrets.get('cloud').endpoints.resource_manager
-        client = ResourceGraphClient(credential=credential, base_url=base_url)
+        client = ResourceGraphClient(
+            credential=credential, base_url=base_url,
+            per_retry_policies=[throttling.policy("resourcegraph/{}".format(secrets.get('client_id')))])
         return client
@@ -0,0 +1,59 @@
+"""
+Cache the results of Resource Graph queries for a short time.
+
+Within one experiment the same query is often issued seconds apart, e.g. by the steady state probe, the
+action and the probe again. The cache keeps the results per prepared query and set of subscriptions for
+a configured time to live and evicts the least recently used results when it is full. Refer to
+``config.load_resource_graph_cache``.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional
+
+
+class QueryCache:
+    """A thread-safe LRU cache whose entries expire after a time to live.
+
+    Results are handed out as copies, since actions change the resources they operate on. The copier
+    defaults to a deep copy and may be replaced by a cheaper one if the consumers copy the results anyway.
+    """
+
+    def __init__(self, copier: Callable[[List], List] = copy.deepcopy):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._copier = copier
+
+    def get(self, key: Hashable, ttl: float) -> Optional[List]:
+        """Return a copy of the cached results or ``None`` if there are none or they are older than ``ttl``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            stored_at, results = entry
+            if time.monotonic() - stored_at > ttl:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+
+        return self._copier(results)
+
+    def put(self, key: Hashable, results: List, max_size: int):
+        results = self._copier(results)
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), results)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
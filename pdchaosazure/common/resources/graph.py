@@ -1,17 +1,102 @@
-from typing import List
+import re
+from typing import List, Tuple
 
 from azure.core.exceptions import HttpResponseError
 from chaoslib.exceptions import InterruptExecution, FailedActivity
 from chaoslib.types import Secrets, Configuration
+from logzero import logger
 
-from pdchaosazure.common.resources import query, init_client
+from pdchaosazure.common import config
+from pdchaosazure.common.deadline import Deadline
+from pdchaosazure.common.resources import init_client, inventory, query, snapshot
+from pdchaosazure.common.resources.cache import QueryCache
+
+DEFAULT_CACHE_MAX_SIZE = 128
+
+_cache = QueryCache()
 
 
 def fetch_resources(user_query: str, resource_type: str,
-                    secrets: Secrets, configuration: Configuration):
+                    secrets: Secrets, configuration: Configuration, deadline: Deadline = None):
+    if deadline:
+        deadline.check('fetch_resources')
+
+    # select from the recorded snapshot, unless it is being recorded
+    snapshot_settings = config.load_snapshot(configuration)
+    if snapshot_settings.get('path') and not snapshot_settings.get('record'):
+        return snapshot.fetch_resources(user_query, resource_type, snapshot_settings)
+
+    results = __fetch(user_query, resource_type, secrets, configuration)
+
+    if snapshot_settings.get('record'):
+        snapshot.record(snapshot_settings['path'], results)
+
+    return results
+
+
+def prefetch(requests: List[Tuple[str, str]], secrets: Secrets, configuration: Configuration) -> List[List[dict]]:
+    """Fetch the resources of several pairs of resource type and user query with as few requests as possible.
+
+    The pairs are united into one Resource Graph query, or a few if there are more pairs than the Resource
+    Graph allows to unite. The rows are split back per pair and returned in the order of the pairs. If the
+    query cache is configured it is primed, so that a later ``fetch_resources`` for a pair is served from it.
+    Refer to ``config.load_resource_graph_cache`` to prefetch pairs on the first fetch of any of them.
+
+    :param requests: Pairs of resource type and user query, e.g. ``("Microsoft.Compute/virtualMachines", None)``.
+    """
+    cache_settings = config.load_resource_graph_cache(configuration)
+    results = []
+
+    for start in range(0, len(requests), query.MAX_UNION_LEGS):
+        chunk = requests[start:start + query.MAX_UNION_LEGS]
+        rows, complete = __query_pages(chunk, secrets, configuration)
+
+        split = [[] for _ in chunk]
+        for row in rows:
+            split[row.pop(query.REQUESTER_COLUMN)].append(row)
+        results.extend(split)
+
+        # rows of a truncated response are missing, so they must not be served as the full result later
+        if complete and cache_settings.get('ttl'):
+            for (resource_type, user_query), resources in zip(chunk, split):
+                query_request = query.create_request(resource_type, user_query, configuration)
+                if resources and __is_deterministic(query_request.query):
+                    _cache.put(__cache_key(query_request), resources,
+                               cache_settings.get('max_size', DEFAULT_CACHE_MAX_SIZE))
+
+    return results
+
+
+def invalidate():
+    """Drop all cached query results, e.g. after an action changed the state of resources."""
+    _cache.invalidate()
+
+
+def __fetch(user_query, resource_type, secrets, configuration) -> List[dict]:
+    # select from the local inventory
+    inventory_settings = config.load_inventory(configuration)
+    if inventory_settings.get('path'):
+        if inventory.supports(user_query):
+            return inventory.fetch_resources(user_query, resource_type, secrets, inventory_settings)
+        logger.info("The inventory does not support the filter '{}', querying the Resource Graph.".format(user_query))
+
     # prepare query
     query_request = query.create_request(resource_type, user_query, configuration)
 
+    # lookup cached results
+    cache_settings = config.load_resource_graph_cache(configuration)
+    cacheable = cache_settings.get('ttl') and __is_deterministic(query_request.query)
+    cache_key = __cache_key(query_request)
+    if cacheable:
+        results = _cache.get(cache_key, cache_settings['ttl'])
+        prefetched = __prefetched(resource_type, user_query, cache_settings)
+        if results is None and prefetched:
+            # discover all configured pairs with one request, later fetches of the other pairs hit the cache
+            prefetch(prefetched, secrets, configuration)
+            results = _cache.get(cache_key, cache_settings['ttl'])
+        if results is not None:
+            return results
+
     # prepare resource graph client
     try:
         client = init_client(secrets)
@@ -25,16 +110,49 @@ def fetch_resources(user_query: str, resource_type: str,
     if not results:
         raise FailedActivity("Could not find resources of type '{}' and filter '{}'".format(resource_type, user_query))
 
+    if cacheable:
+        _cache.put(cache_key, results, cache_settings.get('max_size', DEFAULT_CACHE_MAX_SIZE))
+
     return results
 
 
-def __to_dicts(table) -> List[dict]:
-    results = []
+def __query_pages(requests, secrets, configuration) -> Tuple[List[dict], bool]:
+    # follow the skip tokens of the responses, the rows are complete unless the last page was truncated
+    rows = []
+    skip_token = None
 
-    for row in table['rows']:
-        result = {}
-        for col_index in range(len(table['columns'])):
-            result[table['columns'][col_index]['name']] = row[col_index]
-        results.append(result)
+    try:
+        client = init_client(secrets)
+        while True:
+            response = client.resources(query.create_union_request(requests, configuration, skip_token))
+            rows.extend(__to_dicts(response.data))
 
-    return results
+            skip_token = response.skip_token
+            if not skip_token:
+                return rows, str(response.result_truncated).lower() != 'true'
+    except HttpResponseError as e:
+        raise InterruptExecution(e.message)
+
+
+def __prefetched(resource_type: str, user_query: str, cache_settings: dict) -> List[Tuple[str, str]]:
+    # the configured pairs to prefetch, if the pair of type and user query is one of them
+    requests = [(p['type'], p.get('filter')) for p in cache_settings.get('prefetch', [])]
+    return requests if (resource_type, user_query) in requests else []
+
+
+def __cache_key(query_request) -> tuple:
+    return query_request.query, tuple(sorted(query_request.subscriptions))
+
+
+def __is_deterministic(prepared_query: str) -> bool:
+    # a sampling query is meant to pick other resources every time
+    return not re.search(r'\|\s*sample\b', prepared_query)
+
+
+def __to_dicts(data) -> List[dict]:
+    # an object array is a list of dictionaries already
+    if isinstance(data, list):
+        return data
+
+    names = tuple(column['name'] for column in data['columns'])
+    return [dict(zip(names, row)) for row in data['rows']]
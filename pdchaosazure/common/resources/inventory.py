@@ -0,0 +1,292 @@
+"""
+Keep a local inventory of resources and pick targets from it instead of querying the Resource Graph.
+
+Every activity discovers its targets with a Resource Graph query over the whole subscription. For experiments
+over tens of thousands of resources these queries dominate the time spent on discovery. The inventory is a
+SQLite database that is bootstrapped once per resource type by a full query. Afterwards it is kept fresh by
+querying the ``resourcechanges`` table of the Resource Graph for the resources created, updated or deleted
+since the last sync, and by fetching only the resources that changed.
+
+The user query of an activity is then applied locally as a Kusto light filter (refer to ``kustolight``).
+A user query that is no Kusto light filter is sent to the Resource Graph instead.
+Its first ``where`` clause is turned into an index lookup on the name, resource group, location, zone,
+power state or tags of a resource if it only compares these keys for equality. Refer to ``config.load_inventory``.
+"""
+import contextlib
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import jmespath
+
+from azure.core.exceptions import HttpResponseError
+from azure.mgmt.resourcegraph.models import QueryRequest, QueryRequestOptions, ResultFormat
+from chaoslib.exceptions import FailedActivity, InterruptExecution
+from chaoslib.types import Secrets
+
+from pdchaosazure.common import kustolight
+from pdchaosazure.common.config import load_subscription_id
+from pdchaosazure.common.resources import init_client
+
+# the Resource Graph keeps the change history for 14 days
+CHANGE_RETENTION = timedelta(days=13)
+
+# changes become visible in the change history with a delay, so the sync overlaps the previous one
+SYNC_OVERLAP = timedelta(minutes=5)
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+PAGE_SIZE = 1000
+IDS_PER_QUERY = 200
+
+INDEXED_KEYS = {
+    'name': 'name',
+    'resourceGroup': 'resource_group',
+    'location': 'location',
+    'zone': 'zone',
+    'powerState': 'power_state',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    name TEXT,
+    resource_group TEXT,
+    location TEXT,
+    zone TEXT,
+    power_state TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    id TEXT NOT NULL REFERENCES resources(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS syncs (
+    type TEXT PRIMARY KEY,
+    synced_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS resources_type ON resources(type);
+CREATE INDEX IF NOT EXISTS resources_name ON resources(type, name);
+CREATE INDEX IF NOT EXISTS resources_resource_group ON resources(type, resource_group);
+CREATE INDEX IF NOT EXISTS resources_location ON resources(type, location);
+CREATE INDEX IF NOT EXISTS resources_zone ON resources(type, zone);
+CREATE INDEX IF NOT EXISTS resources_power_state ON resources(type, power_state);
+CREATE INDEX IF NOT EXISTS tags_key_value ON tags(key, value);
+CREATE INDEX IF NOT EXISTS tags_id ON tags(id);
+"""
+
+_lock = threading.Lock()
+
+
+class Inventory:
+    """A SQLite store of resources that is synced with the Resource Graph per resource type."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def sync(self, resource_type: str, secrets: Secrets, now: datetime = None):
+        """Bootstrap the resources of a type or apply the changes since the last sync."""
+        resource_type = resource_type.lower()
+        now = now or datetime.now(timezone.utc)
+        synced_at = self.synced_at(resource_type)
+
+        client = init_client(secrets)
+        if synced_at is None or now - synced_at > CHANGE_RETENTION:
+            resources = _query(client, "Resources | where type=~'{}'".format(resource_type))
+            with self._connect() as connection:
+                connection.execute("DELETE FROM resources WHERE type = ?", (resource_type,))
+                _upsert(connection, resources)
+                _mark_synced(connection, resource_type, now)
+            return
+
+        changes = _query(client, _changes_query(resource_type, synced_at - SYNC_OVERLAP))
+        # a resource may be deleted and recreated since the last sync, only its last change counts
+        last_changes = {}
+        for change in sorted(changes, key=lambda c: c.get('changeTime') or ''):
+            last_changes[change['targetResourceId'].lower()] = change
+        deleted = {c['targetResourceId'] for c in last_changes.values() if c.get('changeType') == 'Delete'}
+        changed = {c['targetResourceId'] for c in last_changes.values()} - deleted
+
+        resources = []
+        changed = sorted(changed)
+        for start in range(0, len(changed), IDS_PER_QUERY):
+            ids = ", ".join("'{}'".format(i) for i in changed[start:start + IDS_PER_QUERY])
+            resources.extend(_query(client, "Resources | where id in~ ({})".format(ids)))
+
+        # a resource that changed and is gone by now was deleted after the queried changes
+        found = {resource['id'].lower() for resource in resources}
+        deleted.update(i for i in changed if i.lower() not in found)
+
+        with self._connect() as connection:
+            connection.executemany("DELETE FROM resources WHERE id = ? COLLATE NOCASE", [(i,) for i in deleted])
+            _upsert(connection, resources)
+            _mark_synced(connection, resource_type, now)
+
+    def synced_at(self, resource_type: str) -> Optional[datetime]:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT synced_at FROM syncs WHERE type = ?", (resource_type.lower(),)).fetchone()
+        return datetime.strptime(row[0], TIME_FORMAT).replace(tzinfo=timezone.utc) if row else None
+
+    def select(self, resource_type: str, user_query: str = None, tags: Dict[str, str] = None) -> List[dict]:
+        """Select the resources of a type that match the Kusto light filter and the tags.
+
+        Equality comparisons of tags in the leading ``where`` clause of the filter, e.g. ``tags.env=='prod'``,
+        are looked up in the tags index like the tags passed in.
+        """
+        indexed, filter_tags, kustol_filter = _split_indexed(user_query or "sample 1")
+        tags = dict(tags or {}, **filter_tags)
+        conditions, parameters = ["type = ?"], [resource_type.lower()]
+
+        for column, value in indexed:
+            conditions.append("{} = ?".format(column))
+            parameters.append(value)
+
+        for key, value in tags.items():
+            conditions.append("id IN (SELECT id FROM tags WHERE key = ? AND value = ?)")
+            parameters.extend([key, value])
+
+        statement = "SELECT data FROM resources WHERE {} ORDER BY id".format(" AND ".join(conditions))
+        with self._connect() as connection:
+            rows = connection.execute(statement, parameters).fetchall()
+
+        resources = (json.loads(data) for data, in rows)
+        if not kustol_filter:
+            return list(resources)
+
+        return list(kustolight.filter_iter(resources, kustol_filter))
+
+    def __len__(self):
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM resources").fetchone()[0]
+
+    @contextlib.contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            connection.execute("PRAGMA foreign_keys = ON")
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+def supports(user_query: str) -> bool:
+    """Return whether the user query is a Kusto light filter, otherwise only the Resource Graph can apply it."""
+    try:
+        kustolight.filter_iter([], user_query or "sample 1")
+        return True
+    except jmespath.exceptions.JMESPathError:
+        return False
+
+
+def fetch_resources(user_query: str, resource_type: str, secrets: Secrets, settings: dict) -> List[dict]:
+    """Sync the inventory at the path of the settings and select the resources from it."""
+    with _lock:
+        store = Inventory(settings['path'])
+        try:
+            store.sync(resource_type, secrets)
+        except HttpResponseError as e:
+            raise InterruptExecution(e.message)
+
+    try:
+        results = store.select(resource_type, user_query)
+    except jmespath.exceptions.ParseError as e:
+        raise InterruptExecution("Invalid filter '{}' for the inventory: {}".format(user_query, e))
+
+    if not results:
+        raise FailedActivity("Could not find resources of type '{}' and filter '{}'".format(resource_type, user_query))
+
+    return results
+
+
+###########################
+#  PRIVATE HELPER FUNCTIONS
+###########################
+def _query(client, prepared_query: str) -> List[dict]:
+    results = []
+    skip_token = None
+
+    while True:
+        options = QueryRequestOptions(result_format=ResultFormat.OBJECT_ARRAY, top=PAGE_SIZE, skip_token=skip_token)
+        response = client.resources(QueryRequest(
+            query=prepared_query, subscriptions=[load_subscription_id()], options=options))
+        results.extend(_rows(response.data))
+
+        skip_token = response.skip_token
+        if not skip_token:
+            return results
+
+
+def _rows(data) -> List[dict]:
+    if isinstance(data, list):
+        return data
+
+    names = tuple(column['name'] for column in data['columns'])
+    return [dict(zip(names, row)) for row in data['rows']]
+
+
+def _changes_query(resource_type: str, since: datetime) -> str:
+    return " | ".join([
+        "resourcechanges",
+        "extend changeTime=todatetime(properties.changeAttributes.timestamp), "
+        "targetResourceId=tostring(properties.targetResourceId), "
+        "targetResourceType=tostring(properties.targetResourceType), "
+        "changeType=tostring(properties.changeType)",
+        "where targetResourceType=~'{}' and changeTime > datetime({})".format(
+            resource_type, since.strftime(TIME_FORMAT)),
+        "project targetResourceId, changeType, changeTime"])
+
+
+def _upsert(connection: sqlite3.Connection, resources: Iterable[dict]):
+    for resource in resources:
+        connection.execute(
+            "INSERT OR REPLACE INTO resources (id, type, name, resource_group, location, zone, power_state, data)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (resource['id'], resource['type'].lower(), resource.get('name'), resource.get('resourceGroup'),
+             resource.get('location'), _zone(resource), _power_state(resource), json.dumps(resource)))
+        connection.execute("DELETE FROM tags WHERE id = ?", (resource['id'],))
+        connection.executemany(
+            "INSERT INTO tags (id, key, value) VALUES (?, ?, ?)",
+            [(resource['id'], key, value) for key, value in (resource.get('tags') or {}).items()])
+
+
+def _mark_synced(connection: sqlite3.Connection, resource_type: str, now: datetime):
+    connection.execute(
+        "INSERT OR REPLACE INTO syncs (type, synced_at) VALUES (?, ?)", (resource_type, now.strftime(TIME_FORMAT)))
+
+
+def _zone(resource: dict) -> Optional[str]:
+    zones = resource.get('zones') or []
+    return zones[0] if zones else None
+
+
+def _power_state(resource: dict) -> Optional[str]:
+    # e.g. 'PowerState/running' of virtual machines or 'Running' of web apps
+    properties = resource.get('properties') or {}
+    code = ((properties.get('extended') or {}).get('instanceView') or {}).get('powerState', {}).get('code')
+    return code or properties.get('state')
+
+
+def _split_indexed(kustol_filter: str) -> Tuple[List[Tuple[str, str]], Dict[str, str], str]:
+    # a leading where clause that solely compares indexed keys or tags for equality is replaced by an index lookup
+    split = kustol_filter.split('|', 1)
+    first, rest = split[0].strip(), split[1].strip() if len(split) > 1 else ""
+    if not first.startswith('where') or re.search(r'\s+or\s+', first):
+        return [], {}, kustol_filter
+
+    terms = re.split(r'\s+and\s+', first[len('where'):].strip())
+    matches = [re.fullmatch(r"((?:tags\.)?\w+)\s*==\s*'([^']*)'", term.strip()) for term in terms]
+    if not all(match and (match.group(1) in INDEXED_KEYS or match.group(1).startswith('tags.')) for match in matches):
+        return [], {}, kustol_filter
+
+    indexed = [(INDEXED_KEYS[match.group(1)], match.group(2)) for match in matches if match.group(1) in INDEXED_KEYS]
+    tags = {match.group(1)[len('tags.'):]: match.group(2) for match in matches if match.group(1) not in INDEXED_KEYS}
+    return indexed, tags, rest
@@ -1,7 +1,14 @@
-from azure.mgmt.resourcegraph.models import QueryRequest
+from typing import List, Tuple
+
+from azure.mgmt.resourcegraph.models import QueryRequest, QueryRequestOptions, ResultFormat
 from chaoslib import Configuration
 from pdchaosazure.common.config import load_subscription_id
 
+REQUESTER_COLUMN = "pdchaosazure_requester"
+
+# the Resource Graph allows three unions per query
+MAX_UNION_LEGS = 4
+
 
 def create_request(
         resource_type: str, user_query: str, experiment_configuration: Configuration) -> QueryRequest:
@@ -11,11 +18,39 @@ def create_request(
 
     result = QueryRequest(
         query=prepared_query,
-        subscriptions=[subscription_id]
+        subscriptions=[subscription_id],
+        options=__options()
+    )
+    return result
+
+
+def create_union_request(
+        requests: List[Tuple[str, str]], experiment_configuration: Configuration,
+        skip_token: str = None) -> QueryRequest:
+    """Create one request for several pairs of resource type and user query.
+
+    Every row of the result carries the index of the pair it belongs to in the ``REQUESTER_COLUMN``.
+    The Resource Graph allows at most ``MAX_UNION_LEGS`` pairs per request. The skip token of a response
+    requests its next page.
+    """
+    legs = ["{} | extend {}={}".format(__prepare(resource_type, user_query), REQUESTER_COLUMN, index)
+            for index, (resource_type, user_query) in enumerate(requests)]
+    prepared_query = legs[0] + "".join(" | union ({})".format(leg) for leg in legs[1:])
+    subscription_id = load_subscription_id()
+
+    result = QueryRequest(
+        query=prepared_query,
+        subscriptions=[subscription_id],
+        options=__options(skip_token)
     )
     return result
 
 
+def __options(skip_token: str = None) -> QueryRequestOptions:
+    # rows are returned as objects, so they need not be zipped with the columns
+    return QueryRequestOptions(result_format=ResultFormat.OBJECT_ARRAY, skip_token=skip_token)
+
+
 def __prepare(resource_type: str, user_query: str) -> str:
     result = ["Resources", "where type=~'{}'".format(resource_type)]
 
@@ -0,0 +1,118 @@
+"""
+Fetch resources from a recorded snapshot instead of the Azure Resource Manager.
+
+A snapshot is a file of JSON lines, one resource per line, as returned by the Resource Graph or, for VMSS
+instances, in the shape of the SDK's ``as_dict()``. Reading from a snapshot needs neither credentials nor
+network access, so target selection can be planned, dry run and load tested at full fleet size.
+
+The file is memory-mapped and indexed once per modification, i.e. the offsets of the lines are kept per
+resource type and per scale set. Later reads decode only the lines of the requested resources.
+A snapshot is recorded by running an experiment against Azure with the snapshot's ``record`` setting, which
+appends the fetched resources and VMSS instances to it. Refer to ``config.load_snapshot``.
+"""
+import functools
+import json
+import mmap
+import os
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+import jmespath
+from chaoslib.exceptions import FailedActivity, InterruptExecution
+
+from pdchaosazure.common import kustolight
+from pdchaosazure.common.compute.raw import loads
+
+VMSS_INSTANCE_TYPE = "microsoft.compute/virtualmachinescalesets/virtualmachines"
+
+
+def fetch_resources(user_query: str, resource_type: str, settings: dict) -> List[dict]:
+    """Select the resources of a type from the snapshot at the path of the settings."""
+    resources = read(settings['path'], resource_type)
+
+    try:
+        results = list(kustolight.filter_iter(resources, user_query or "sample 1"))
+    except jmespath.exceptions.ParseError as e:
+        raise InterruptExecution("Invalid filter '{}' for the snapshot: {}".format(user_query, e))
+
+    if not results:
+        raise FailedActivity("Could not find resources of type '{}' and filter '{}'".format(resource_type, user_query))
+
+    return results
+
+
+def read(path: str, resource_type: str) -> Iterator[dict]:
+    """Read the resources of a type from the snapshot."""
+    return _read(path, 0, resource_type.lower())
+
+
+def read_vmss_instances(path: str, vmss: dict) -> Iterator[dict]:
+    """Read the instances of a scale set from the snapshot."""
+    return _read(path, 1, vmss['id'].lower())
+
+
+def record(path: str, resources: Iterable[dict]):
+    """Append resources to a snapshot, e.g. the results of ``graph.fetch_resources`` or listed instances.
+
+    Resources whose id is recorded already are skipped, so that an experiment that fetches the same resources
+    several times records them once.
+    """
+    recorded = _recorded_ids(path)
+    with open(path, 'a', encoding='utf-8') as file:
+        for resource in resources:
+            resource_id = (resource.get('id') or '').lower()
+            if resource_id and resource_id in recorded:
+                continue
+
+            recorded.add(resource_id)
+            file.write(json.dumps(dict(resource), default=str))
+            file.write('\n')
+
+
+###########################
+#  PRIVATE HELPER FUNCTIONS
+###########################
+def _read(path: str, index: int, key: str) -> Iterator[dict]:
+    stat = os.stat(path)
+    offsets = _index(path, stat.st_mtime_ns, stat.st_size)[index].get(key, [])
+    if not offsets:
+        return
+
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+        for start, end in offsets:
+            yield loads(content[start:end])
+
+
+def _recorded_ids(path: str) -> Set[str]:
+    if not os.path.exists(path):
+        return set()
+
+    with open(path, 'rb') as file:
+        return {(loads(line).get('id') or '').lower() for line in file if line.strip()}
+
+
+@functools.lru_cache(maxsize=8)
+def _index(path: str, mtime: int, size: int) -> Tuple[Dict[str, List], Dict[str, List]]:
+    # the modification time and size are part of the key, so a re-recorded snapshot is indexed again
+    by_type, by_vmss = {}, {}
+    if not size:
+        return by_type, by_vmss
+
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+        start = 0
+        while start < size:
+            end = content.find(b'\n', start)
+            end = size if end < 0 else end
+            line = content[start:end].strip()
+
+            if line:
+                resource = loads(line)
+                resource_type = (resource.get('type') or '').lower()
+                by_type.setdefault(resource_type, []).append((start, end))
+
+                if resource_type == VMSS_INSTANCE_TYPE:
+                    vmss_id = resource['id'].lower().rsplit('/virtualmachines/', 1)[0]
+                    by_vmss.setdefault(vmss_id, []).append((start, end))
+
+            start = end + 1
+
+    return by_type, by_vmss
@@ -1,40 +1,131 @@
 Param
 (
     [parameter(mandatory=$true)] [int]$input_duration,
-    [parameter(mandatory=$true)] [string]$input_path
+    [parameter(mandatory=$true)] [string]$input_path,
+    [int]$input_read_percentage = 0,
+    [int]$input_block_size = 4,
+    [int]$input_queue_depth = 16,
+    [int]$input_iops = 0,
+    [int]$input_bandwidth = 0,
+    [int]$input_size = 1024
 )
 
-"Input configuration: duration='$input_duration' seconds, path='$input_path'"
-
-New-Item -ItemType file $input_path
-
-# Detect the block size of $input_path
-$volume_label = Get-Volume -FilePath $input_path | Select-Object -ExpandProperty FileSystemLabel
-"Volume label '$volume_label'"
-$block_size = Get-CimInstance -ClassName Win32_Volume | Where-Object {$_.Label -eq "OS"} | Select-Object -ExpandProperty BlockSize
-$file_size = $block_size*10000
-"Detected block size='$block_size'"
-
-$code = {
-    # Expect those parameters from the calling job
-    param ($input_path, $file_size)
-    # Fill random data from cryptographic module with the length of $bytes in memory
-    [System.Security.Cryptography.RNGCryptoServiceProvider] $rng = New-Object System.Security.Cryptography.RNGCryptoServiceProvider
-    $random_bytes = New-Object byte[] $file_size
-    # Fill the array
-    $rng.GetBytes($random_bytes)
-    # Write the array content to file on disk. Do it continuously in a while loop and generate high I/O load
-    while ($true) {
-        [System.IO.File]::WriteAllBytes($input_path, $random_bytes)
+"Input configuration: duration='$input_duration' seconds, path='$input_path', read_percentage='$input_read_percentage'%, block_size='$input_block_size' kilobytes, queue_depth='$input_queue_depth', iops='$input_iops', bandwidth='$input_bandwidth' megabytes per second, size='$input_size' megabytes"
+
+$block_size = $input_block_size * 1KB
+$percentiles = 50, 95, 99
+
+# The target IOPS is the lower one of the IOPS and bandwidth
+$targets = @($input_iops, [int]($input_bandwidth * 1MB / $block_size)) | Where-Object { $_ -gt 0 }
+$target_iops = 0
+if ($targets) {
+    $target_iops = ($targets | Measure-Object -Minimum).Minimum
+}
+
+function Write-Metrics($direction, $iops, $bytes_per_second, $latencies) {
+    if ($iops -le 0) {
+        return
+    }
+    "##metric ${direction}_iops=$([math]::Round($iops, 1))"
+    "##metric ${direction}_mbps=$([math]::Round($bytes_per_second / 1MB, 2))"
+    foreach ($p in $percentiles) {
+        "##metric ${direction}_latency_p${p}_ms=$([math]::Round($latencies[$p], 3))"
     }
 }
 
+$diskspd = Get-Command diskspd.exe -ErrorAction SilentlyContinue
+if ($diskspd) {
+    "Burning I/O with diskspd for $input_duration seconds"
+    # -g throttles every thread in bytes per millisecond, -Sh disables the caches and -L measures the latencies
+    $arguments = @("-c$($input_size)M", "-d$input_duration", "-b$($input_block_size)K", "-o$input_queue_depth",
+                   "-t1", "-r", "-w$(100 - $input_read_percentage)", "-Sh", "-L", "-Rxml")
+    if ($target_iops -gt 0) {
+        $arguments += "-g$([math]::Max(1, [int]($target_iops * $block_size / 1000)))"
+    }
+    [xml]$report = & $diskspd.Source @arguments $input_path
+
+    $seconds = [double]$report.Results.TimeSpan.TestTimeSeconds
+    $target = $report.Results.TimeSpan.Thread.Target
+    $buckets = $report.Results.TimeSpan.Latency.Bucket
+    foreach ($direction in 'Read', 'Write') {
+        $latencies = @{}
+        foreach ($p in $percentiles) {
+            $bucket = $buckets | Where-Object { [double]$_.Percentile -ge $p } | Select-Object -First 1
+            $latencies[$p] = [double]$bucket."$($direction)Milliseconds"
+        }
+        Write-Metrics $direction.ToLower() ([double]$target."$($direction)Count" / $seconds) ([double]$target."$($direction)Bytes" / $seconds) $latencies
+    }
+} else {
+    "Burning I/O with PowerShell for $input_duration seconds, diskspd is not installed"
 
-$job = Start-Job -ScriptBlock $code -ArgumentList $input_path,$file_size
+    # Lay out the file, so reads are served by the disk rather than from unwritten extents
+    $blocks = [long]($input_size * 1MB / $block_size)
+    $chunk = New-Object byte[] 1MB
+    (New-Object System.Random).NextBytes($chunk)
+    $stream = [System.IO.File]::Create($input_path)
+    for ($i = 0; $i -lt $input_size; $i++) {
+        $stream.Write($chunk, 0, $chunk.Length)
+    }
+    $stream.Flush($true)
+    $stream.Close()
 
-# Clean job
-if (Wait-Job $job -Timeout $input_duration) { Receive-Job $job }
-Remove-Job -force $job
+    # Every job is one queued request, the writes go through the cache to the disk
+    $code = {
+        param ($path, $duration, $block_size, $blocks, $read_percentage, $interval)
+        $stream = New-Object System.IO.FileStream($path, 'Open', 'ReadWrite', 'ReadWrite', 4096, [System.IO.FileOptions]::WriteThrough)
+        $buffer = New-Object byte[] $block_size
+        $random = New-Object System.Random
+        $reads = New-Object System.Collections.Generic.List[double]
+        $writes = New-Object System.Collections.Generic.List[double]
+        $stopwatch = [system.diagnostics.stopwatch]::StartNew()
+        $scheduled = 0.0
+        while ($stopwatch.Elapsed.TotalSeconds -lt $duration) {
+            if ($interval -gt 0) {
+                $scheduled += $interval
+                $ahead = $scheduled - $stopwatch.Elapsed.TotalSeconds
+                if ($ahead -gt 0) {
+                    Start-Sleep -Milliseconds ($ahead * 1000)
+                }
+            }
+
+            $started = $stopwatch.Elapsed.TotalMilliseconds
+            $stream.Position = [long]$random.Next($blocks) * $block_size
+            if ($random.Next(100) -lt $read_percentage) {
+                [void]$stream.Read($buffer, 0, $block_size)
+                $reads.Add($stopwatch.Elapsed.TotalMilliseconds - $started)
+            } else {
+                $stream.Write($buffer, 0, $block_size)
+                $stream.Flush($true)
+                $writes.Add($stopwatch.Elapsed.TotalMilliseconds - $started)
+            }
+        }
+        $stream.Close()
+        [pscustomobject]@{ Read = $reads.ToArray(); Write = $writes.ToArray() }
+    }
+
+    $interval = 0
+    if ($target_iops -gt 0) {
+        $interval = $input_queue_depth / $target_iops
+    }
+    $stopwatch = [system.diagnostics.stopwatch]::StartNew()
+    $jobs = foreach ($i in 1..$input_queue_depth) {
+        Start-Job -ScriptBlock $code -Arg $input_path, $input_duration, $block_size, $blocks, $input_read_percentage, $interval
+    }
+    $results = $jobs | Wait-Job | Receive-Job
+    $jobs | Remove-Job -Force
+    $seconds = $stopwatch.Elapsed.TotalSeconds
+
+    foreach ($direction in 'Read', 'Write') {
+        $values = @($results | ForEach-Object { $_.$direction } | Sort-Object)
+        $latencies = @{}
+        foreach ($p in $percentiles) {
+            if ($values.Count) {
+                $latencies[$p] = $values[[int]($p / 100 * ($values.Count - 1))]
+            }
+        }
+        Write-Metrics $direction.ToLower() ($values.Count / $seconds) ($values.Count * $block_size / $seconds) $latencies
+    }
+}
 
-# Remove file
-rm $input_path
\ No newline at end of file
+# Clean up actions
+rm $input_path
@@ -1,26 +1,168 @@
 #!/bin/bash
 
-echo Input configuration: duration="$input_duration" seconds, path="$input_path"
+# Take input
+duration=$input_duration
+path=$input_path
+read_percentage=${input_read_percentage:-0}
+block_size=${input_block_size:-4}
+queue_depth=${input_queue_depth:-16}
+iops=${input_iops:-0}
+bandwidth=${input_bandwidth:-0}
+size=${input_size:-1024}
+echo Input configuration: duration="$duration" seconds, path="$path", read_percentage="$read_percentage"%, \
+    block_size="$block_size" kilobytes, queue_depth="$queue_depth", iops="$iops", \
+    bandwidth="$bandwidth" megabytes per second, size="$size" megabytes
 
-touch "$input_path"
-partition=$(df "$input_path" | awk '/^\/dev/ {print $1}')
-echo The partition for "$input_path" is "$partition"
-block_size=$(blockdev --getbsz "$partition")
-echo The partition block size is "$block_size" bytes
+# The Azure Linux agent runs on Python, so an interpreter is usually present to generate the load if fio is
+# missing and to report the achieved throughput and latencies
+python=$(command -v python3)
 
-# File template for /tmp/loop.sh
-cat << EOF > /tmp/loop.sh
-#!/bin/bash
-while [ true ];
-do
-    sudo dd if=/dev/urandom of="$input_path" bs="$block_size" count=10000 iflag=fullblock
-done
+# Measure the I/O of fio from its report or generate the I/O with direct, synchronous reads and writes of
+# one thread per queued request, and print the metrics of both
+measure() {
+    if [ -z "$python" ]; then
+        echo No metrics are reported, python3 is not installed
+        return
+    fi
+    "$python" - "$@" << 'EOF'
+import json
+import mmap
+import os
+import random
+import sys
+import threading
+import time
+
+PERCENTILES = (50, 95, 99)
+
+
+def report(direction, iops, bytes_per_second, percentiles):
+    if not iops:
+        return
+    print("##metric {}_iops={:.1f}".format(direction, iops))
+    print("##metric {}_mbps={:.2f}".format(direction, bytes_per_second / 1024 / 1024))
+    for p in PERCENTILES:
+        print("##metric {}_latency_p{}_ms={:.3f}".format(direction, p, percentiles[p]))
+
+
+def report_fio(path):
+    with open(path) as file:
+        job = json.load(file)['jobs'][0]
+    for direction in ('read', 'write'):
+        stats = job[direction]
+        # fio reports the completion latencies in nanoseconds since version 3, in microseconds before
+        clat, unit = (stats['clat_ns'], 1e6) if 'clat_ns' in stats else (stats['clat'], 1e3)
+        values = {float(p): v for p, v in (clat.get('percentile') or {}).items()}
+        percentiles = {p: values.get(float(p), 0) / unit for p in PERCENTILES}
+        report(direction, stats['iops'], stats.get('bw_bytes', stats['bw'] * 1024), percentiles)
+
+
+def generate(duration, path, read_percentage, block_size, queue_depth, iops, bandwidth, size):
+    duration, read_percentage, queue_depth = int(duration), int(read_percentage), max(1, int(queue_depth))
+    block_size = int(block_size) * 1024
+    blocks = int(size) * 1024 * 1024 // block_size
+
+    # the target IOPS is the lower one of the IOPS and bandwidth
+    targets = [int(iops), int(bandwidth) * 1024 * 1024 // block_size]
+    targets = [t for t in targets if t > 0]
+    interval = queue_depth / min(targets) if targets else 0
+
+    # lay out the file, so reads are served by the disk rather than from unwritten extents
+    chunk = os.urandom(1024 * 1024)
+    with open(path, 'wb') as file:
+        for _ in range(blocks * block_size // len(chunk) + 1):
+            file.write(chunk)
+        file.flush()
+        os.fsync(file.fileno())
+
+    latencies = {'read': [], 'write': []}
+    deadline = time.monotonic() + duration
+
+    def work():
+        # every thread has a file descriptor of its own to seek on
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_DIRECT)
+        except (AttributeError, OSError):
+            fd = os.open(path, os.O_RDWR | os.O_DSYNC)
+
+        # direct I/O needs a buffer that is aligned to the page size
+        buffer = mmap.mmap(-1, block_size)
+        buffer.write(os.urandom(block_size))
+        scheduled = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                os.close(fd)
+                return
+            if interval:
+                scheduled += interval
+                if scheduled > now:
+                    time.sleep(scheduled - now)
+
+            started = time.monotonic()
+            os.lseek(fd, random.randrange(blocks) * block_size, os.SEEK_SET)
+            if random.randrange(100) < read_percentage:
+                os.readv(fd, [buffer])
+                latencies['read'].append(time.monotonic() - started)
+            else:
+                os.write(fd, buffer)
+                latencies['write'].append(time.monotonic() - started)
+
+    started = time.monotonic()
+    workers = [threading.Thread(target=work) for _ in range(queue_depth)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.monotonic() - started
+
+    for direction, values in latencies.items():
+        values.sort()
+        percentiles = {p: values[int(p / 100 * (len(values) - 1))] * 1000 for p in PERCENTILES} if values else {}
+        report(direction, len(values) / seconds, len(values) * block_size / seconds, percentiles)
+
+
+if sys.argv[1] == 'fio':
+    report_fio(sys.argv[2])
+else:
+    generate(*sys.argv[2:])
 EOF
+}
 
-# Execute the /tmp/loop.sh as long as the timeout holds
-chmod +x /tmp/loop.sh
-timeout --preserve-status "$input_duration" /tmp/loop.sh "$input_path" "$block_size"
+if command -v fio > /dev/null; then
+    echo Burning I/O with fio for "$duration" seconds
+    # fio limits reads and writes separately, a limit of 0 is no limit, so the shares are rounded up
+    read_iops=$(((iops * read_percentage + 99) / 100))
+    write_iops=$(((iops * (100 - read_percentage) + 99) / 100))
+    read_bandwidth=$(((bandwidth * read_percentage + 99) / 100))
+    write_bandwidth=$(((bandwidth * (100 - read_percentage) + 99) / 100))
+    report=$(mktemp)
+    fio --name=burn_io --filename="$path" --size="${size}M" --rw=randrw --rwmixread="$read_percentage" \
+        --bs="${block_size}k" --iodepth="$queue_depth" --ioengine=libaio --direct=1 \
+        --time_based --runtime="$duration" --rate_iops="$read_iops,$write_iops" \
+        --rate="${read_bandwidth}m,${write_bandwidth}m" --output-format=json --output="$report"
+    measure fio "$report"
+    rm "$report"
+elif [ -n "$python" ]; then
+    echo Burning I/O with "$python" for "$duration" seconds, fio is not installed
+    measure generate "$duration" "$path" "$read_percentage" "$block_size" "$queue_depth" "$iops" "$bandwidth" "$size"
+else
+    # dd writes the file over and over again, it can neither read, queue nor limit the I/O
+    echo Burning I/O with dd for "$duration" seconds, neither fio nor python3 is installed, so only writes are made
+    count=$((size * 1024 / block_size))
+    [ "$count" -gt 0 ] || count=1
+    end=$((SECONDS + duration))
+    while [ "$SECONDS" -lt "$end" ]; do
+        timeout $((end - SECONDS)) dd if=/dev/zero of="$path" bs="${block_size}k" count="$count" \
+            oflag=direct conv=notrunc 2> /dev/null
+        status=$?
+        if [ "$status" -ne 0 ] && [ "$status" -ne 124 ]; then
+            echo Burning I/O with dd failed with exit code "$status" >&2
+            rm -f "$path"
+            exit "$status"
+        fi
+    done
+fi
 
 # Clean up actions
-sudo rm "$input_path"
-sudo rm /tmp/loop.sh
\ No newline at end of file
+rm "$path"
@@ -2,18 +2,53 @@ Param
 (
     [parameter(mandatory=$true)] [int]$input_duration,
     [parameter(mandatory=$true)] [int]$input_size,
-    [parameter(mandatory=$true)] [string]$input_path
+    [parameter(mandatory=$true)] [string]$input_path,
+    [int]$input_percentage = 0,
+    [string]$input_space = "free",
+    [string]$input_mode = "preallocate"
 )
 
-$size_in_bytes = $input_size*1024*1024
-"Input configuration: duration='$input_duration' seconds, size='$input_size' megabytes, path='$input_path'"
+"Input configuration: duration='$input_duration' seconds, size='$input_size' megabytes, path='$input_path', percentage='$input_percentage'%, space='$input_space', mode='$input_mode'"
 
-"Filling disk with $input_size megabytes of random data for $input_duration seconds."
-# Check the https://docs.microsoft.com/en-us/windows-server/administration/windows-commands/fsutil-file
-# Creates a file at $path of $size_in_bytes
-fsutil file createnew $input_path $size_in_bytes
+# A percentage of the free space is the size of the file, a percentage of the total space is the usage to
+# reach. Either takes precedence over the size in megabytes.
+$drive = New-Object System.IO.DriveInfo([System.IO.Path]::GetPathRoot($input_path))
+$available = $drive.AvailableFreeSpace
+$size_in_bytes = [long]$input_size * 1MB
+if ($input_percentage -gt 0) {
+    if ($input_space -eq "total") {
+        $size_in_bytes = [long]($drive.TotalSize * $input_percentage / 100) - ($drive.TotalSize - $drive.TotalFreeSpace)
+    } else {
+        $size_in_bytes = [long]($available * $input_percentage / 100)
+    }
+}
+$size_in_bytes = [math]::Max(0, [math]::Min($size_in_bytes, $available))
+
+"Filling disk with $([math]::Round($size_in_bytes / 1MB)) of $([math]::Round($available / 1MB)) free megabytes for $input_duration seconds."
+$stopwatch = [system.diagnostics.stopwatch]::StartNew()
+if ($input_mode -eq "preallocate") {
+    # Check the https://docs.microsoft.com/en-us/windows-server/administration/windows-commands/fsutil-file
+    # Creates a file at $path of $size_in_bytes without writing it
+    fsutil file createnew $input_path $size_in_bytes
+} else {
+    # Write random data in chunks of a megabyte
+    $chunk = New-Object byte[] 1MB
+    (New-Object System.Random).NextBytes($chunk)
+    $stream = [System.IO.File]::Create($input_path)
+    for ($written = 0; $written -lt $size_in_bytes; $written += $chunk.Length) {
+        $stream.Write($chunk, 0, [math]::Min($chunk.Length, $size_in_bytes - $written))
+    }
+    $stream.Flush($true)
+    $stream.Close()
+}
+$stopwatch.Stop()
+
+"##metric bytes_written=$((Get-Item $input_path).Length)"
+"##metric fill_seconds=$([math]::Round($stopwatch.Elapsed.TotalSeconds, 3))"
+$drive = New-Object System.IO.DriveInfo($drive.Name)
+"##metric disk_used_percent=$([math]::Round(100 * ($drive.TotalSize - $drive.TotalFreeSpace) / $drive.TotalSize, 1))"
 Start-Sleep -s $input_duration
 
 "Cleaning up file at '$input_path' ..."
 rm $input_path
-"Cleaned up."
\ No newline at end of file
+"Cleaned up."
@@ -1,13 +1,54 @@
 #!/bin/bash
 
-echo Input configuration: duration="$input_duration" seconds, size="$input_size" megabytes, path="$input_path"
-echo Filling disk with "$input_size" megabytes of random data for "$input_duration" seconds.
+# Take input
+duration=$input_duration
+size=$input_size
+path=$input_path
+percentage=${input_percentage:-0}
+space=${input_space:-free}
+mode=${input_mode:-write}
+echo Input configuration: duration="$duration" seconds, size="$size" megabytes, path="$path", \
+    percentage="$percentage"%, space="$space", mode="$mode"
 
-# 'nohup' stands for "no hangup" allows the process to continue running even if a user has logged off (or "hung up")
-# 'dd' is convert and copy file command - see the manpage to see how it works: https://linux.die.net/man/1/dd
-nohup dd if=/dev/urandom of=$input_path bs=1M count=$input_size iflag=fullblock
-sleep $input_duration
+# Used and available kilobytes of the file system of the path, their sum is the space usable without the
+# blocks reserved for root
+read -r used available <<< "$(df -Pk "$(dirname "$path")" | awk 'NR == 2 {print $3, $4}')"
 
-echo Cleaning up file at "$input_path" ...
-rm "$input_path"
-echo Cleaned up.
\ No newline at end of file
+# A percentage of the free space is the size of the file, a percentage of the total space is the usage to
+# reach. Either takes precedence over the size in megabytes.
+if [ "$percentage" -gt 0 ]; then
+    if [ "$space" = "total" ]; then
+        size=$((((used + available) * percentage / 100 - used) / 1024))
+    else
+        size=$((available * percentage / 100 / 1024))
+    fi
+fi
+if [ "$size" -gt $((available / 1024)) ]; then
+    size=$((available / 1024))
+fi
+if [ "$size" -lt 0 ]; then
+    size=0
+fi
+
+echo Filling disk with "$size" of "$((available / 1024))" free megabytes for "$duration" seconds.
+started=$(date +%s.%N)
+if [ "$size" -eq 0 ]; then
+    touch "$path"
+elif [ "$mode" = "preallocate" ]; then
+    # 'fallocate' reserves the blocks without writing them, a file system without support for it is written
+    # with zeros instead
+    fallocate -l "${size}M" "$path" || dd if=/dev/zero of="$path" bs=1M count="$size" conv=fsync
+else
+    # 'dd' is convert and copy file command - see the manpage to see how it works: https://linux.die.net/man/1/dd
+    dd if=/dev/urandom of="$path" bs=1M count="$size" iflag=fullblock conv=fsync
+fi
+finished=$(date +%s.%N)
+
+echo "##metric bytes_written=$(stat -c %s "$path")"
+echo "$started $finished" | awk '{printf "##metric fill_seconds=%.3f\n", $2 - $1}'
+df -Pk "$(dirname "$path")" | awk 'NR == 2 {printf "##metric disk_used_percent=%.1f\n", 100 * $3 / ($3 + $4)}'
+sleep "$duration"
+
+echo Cleaning up file at "$path" ...
+rm "$path"
+echo Cleaned up.
@@ -1,25 +1,70 @@
 Param
 (
-    [parameter(mandatory=$true)] [int]$input_duration
+    [parameter(mandatory=$true)] [int]$input_duration,
+    [int]$input_load = 100,
+    [int]$input_cores = 0,
+    [string]$input_affinity = "",
+    [int]$input_ramp = 0
 )
 
-"Input configuration: duration='$input_duration' seconds"
+"Input configuration: duration='$input_duration' seconds, load='$input_load'%, cores='$input_cores', affinity='$input_affinity', ramp='$input_ramp' seconds"
 
-$number_of_parallel_procs=(Get-WMIObject win32_processor | Measure-Object NumberofLogicalProcessors -sum).sum
-"Configuring number of parallel processes to '$max_number_of_cores'"
+# Expand an affinity such as '0,2-3' to the list of CPUs 0, 2, 3. A CPU of -1 is not pinned.
+$cpus = @()
+if ($input_affinity) {
+    foreach ($part in $input_affinity.Split(',')) {
+        $range = $part.Split('-')
+        $cpus += [int]$range[0]..[int]$range[-1]
+    }
+} else {
+    $number_of_parallel_procs = $input_cores
+    if ($number_of_parallel_procs -le 0) {
+        $number_of_parallel_procs = (Get-WMIObject win32_processor | Measure-Object NumberofLogicalProcessors -sum).sum
+    }
+    $cpus = @(-1) * $number_of_parallel_procs
+}
 
+# Duty cycle: calculate for load% of every 100 milliseconds and sleep for the rest.
+# The load rises linearly from 0 to load% within the first ramp seconds.
 $code = {
-    param ($duration)
-    $stopwatch =  [system.diagnostics.stopwatch]::StartNew()
-    $result = 1;
+    param ($duration, $load, $ramp, $cpu)
+    if ($cpu -ge 0) {
+        [System.Diagnostics.Process]::GetCurrentProcess().ProcessorAffinity = [IntPtr](1 -shl $cpu)
+    }
+
+    $stopwatch = [system.diagnostics.stopwatch]::StartNew()
+    $result = 1
     while ($stopwatch.Elapsed.TotalSeconds -lt $duration) {
-        $result = $result * $number
+        $current = $load
+        if ($ramp -gt 0 -and $stopwatch.Elapsed.TotalSeconds -lt $ramp) {
+            $current = $load * $stopwatch.Elapsed.TotalSeconds / $ramp
+        }
+
+        $period = [system.diagnostics.stopwatch]::StartNew()
+        while ($period.Elapsed.TotalMilliseconds -lt $current) {
+            $result = $result * 1
+        }
+
+        $rest = 100 - $period.Elapsed.TotalMilliseconds
+        if ($rest -gt 0) {
+            Start-Sleep -Milliseconds $rest
+        }
     }
 }
 
-"Stressing CPU with $number_of_parallel_procs processes for $input_duration seconds"
-ForEach ($Number in 1..$number_of_parallel_procs){
-    Start-Job -ScriptBlock $code -Arg $input_duration
+"Stressing CPU with $($cpus.Count) processes at $input_load% for $input_duration seconds"
+$jobs = foreach ($cpu in $cpus) {
+    Start-Job -ScriptBlock $code -Arg $input_duration, $input_load, $input_ramp, $cpu
 }
 
-Get-Job | Wait-Job
\ No newline at end of file
+# Measure the achieved load while the jobs run
+$samples = Get-Counter '\Processor(_Total)\% Processor Time' -SampleInterval 1 -MaxSamples $input_duration -ErrorAction SilentlyContinue
+
+$jobs | Wait-Job | Out-Null
+$jobs | Remove-Job -Force
+
+if ($samples) {
+    $average = ($samples.CounterSamples | Measure-Object CookedValue -Average).Average
+    "##metric cpu_load=$([math]::Round($average, 1))"
+}
+"##metric cpu_workers=$($cpus.Count)"
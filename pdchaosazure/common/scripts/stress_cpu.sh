@@ -2,12 +2,85 @@
 
 # Take input
 duration=$input_duration
-echo Input configuration: duration="$duration" seconds
+load=${input_load:-100}
+cores=${input_cores:-0}
+affinity=$input_affinity
+ramp=${input_ramp:-0}
+echo Input configuration: duration="$duration" seconds, load="$load"%, cores="$cores", affinity="$affinity", \
+    ramp="$ramp" seconds
 
-number_of_parallel_procs=$(cat /proc/cpuinfo | awk "/^processor/{print $3}" | wc -l)
+# Expand an affinity such as '0,2-3' to the list of CPUs '0 2 3'
+if [ -n "$affinity" ]; then
+    cpus=$(echo "$affinity" | awk -F, '{
+        for (i = 1; i <= NF; i++) { n = split($i, r, "-"); for (c = r[1]; c <= r[n]; c++) print c }
+    }')
+else
+    if [ "$cores" -le 0 ]; then
+        cores=$(grep -c ^processor /proc/cpuinfo)
+    fi
+    cpus=$(seq "$cores")
+fi
 
-# Execute
-echo Stressing CPU with "$number_of_parallel_procs" processes for "$duration" seconds
+# Busy and idle jiffies of all CPUs to measure the achieved load
+read_cpu() {
+    awk '/^cpu /{print $2 + $3 + $4 + $7 + $8 + $9, $5 + $6}' /proc/stat
+}
+start_stat=$(read_cpu)
 
-# Run md5sum calculation $number_of_parallel_procs times. Each md5sum calculation runs parallelized in its own process (P0)
-seq $number_of_parallel_procs | xargs -P0 -n1 timeout $duration md5sum /dev/zero
\ No newline at end of file
+# Resume and stop the calculations however the script ends, e.g. if the run command is cancelled, so that no
+# calculation is left running or paused
+pids=""
+stop_workers() {
+    kill -CONT $pids 2> /dev/null
+    kill $pids 2> /dev/null
+    pids=""
+}
+trap stop_workers EXIT
+trap 'exit 129' HUP
+trap 'exit 130' INT
+trap 'exit 143' TERM
+
+# Execute one md5sum calculation per CPU, pinned to the CPU if an affinity is given
+for cpu in $cpus; do
+    if [ -n "$affinity" ]; then
+        taskset -c "$cpu" md5sum /dev/zero &
+    else
+        md5sum /dev/zero &
+    fi
+    pids="$pids $!"
+done
+echo Stressing CPU with "$(echo "$cpus" | wc -w)" processes at "$load"% for "$duration" seconds
+
+# Duty cycle: let the calculations run for load% of every 100 milliseconds and pause them for the rest.
+# The load rises linearly from 0 to load% within the first ramp seconds.
+started=$SECONDS
+while [ $((SECONDS - started)) -lt "$duration" ]; do
+    elapsed=$((SECONDS - started))
+    current=$load
+    if [ "$ramp" -gt 0 ] && [ "$elapsed" -lt "$ramp" ]; then
+        current=$((load * elapsed / ramp))
+    fi
+
+    if [ "$current" -ge 100 ]; then
+        kill -CONT $pids 2> /dev/null
+        sleep 1
+    elif [ "$current" -le 0 ]; then
+        kill -STOP $pids 2> /dev/null
+        sleep 0.1
+    else
+        kill -CONT $pids 2> /dev/null
+        sleep "$(printf '0.%03d' "$current")"
+        kill -STOP $pids 2> /dev/null
+        sleep "$(printf '0.%03d' $((100 - current)))"
+    fi
+done
+
+# Clean up actions
+stop_workers
+wait 2> /dev/null
+
+echo "$start_stat $(read_cpu)" | awk '{
+    busy = $3 - $1; idle = $4 - $2
+    if (busy + idle > 0) printf "##metric cpu_load=%.1f\n", 100 * busy / (busy + idle)
+}'
+echo "##metric cpu_workers=$(echo "$cpus" | wc -w)"
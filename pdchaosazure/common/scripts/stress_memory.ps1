@@ -0,0 +1,64 @@
+Param
+(
+    [parameter(mandatory=$true)] [int]$input_duration,
+    [int]$input_size = 0,
+    [int]$input_percentage = 80,
+    [int]$input_rate = 0
+)
+
+"Input configuration: duration='$input_duration' seconds, size='$input_size' megabytes, percentage='$input_percentage'%, rate='$input_rate' megabytes per second"
+
+# The size in megabytes takes precedence over the percentage of the total memory
+$total = [int]((Get-WMIObject Win32_ComputerSystem).TotalPhysicalMemory / 1MB)
+$size = $input_size
+if ($size -le 0) {
+    $size = [int]($total * $input_percentage / 100)
+}
+
+function Get-Available {
+    [int]((Get-WMIObject Win32_OperatingSystem).FreePhysicalMemory / 1KB)
+}
+
+# Every chunk is a megabyte of bytes that are written on creation, so its pages are committed and resident.
+# With a rate the memory is allocated in steps of one second.
+"Allocating $size of $total megabytes of memory for $input_duration seconds"
+$pattern = 'x' * 1MB
+$chunks = New-Object System.Collections.ArrayList
+$lowest = Get-Available
+$stopwatch = [system.diagnostics.stopwatch]::StartNew()
+try {
+    while ($chunks.Count -lt $size) {
+        $step = $size - $chunks.Count
+        if ($input_rate -gt 0) {
+            $step = [math]::Min($step, $input_rate)
+        }
+
+        $second = [system.diagnostics.stopwatch]::StartNew()
+        for ($i = 0; $i -lt $step; $i++) {
+            [void]$chunks.Add([System.Text.Encoding]::ASCII.GetBytes($pattern))
+        }
+        $lowest = [math]::Min($lowest, (Get-Available))
+
+        $rest = 1000 - $second.Elapsed.TotalMilliseconds
+        if ($input_rate -gt 0 -and $rest -gt 0) {
+            Start-Sleep -Milliseconds $rest
+        }
+    }
+
+    # Hold the memory for the rest of the duration
+    while ($stopwatch.Elapsed.TotalSeconds -lt $input_duration) {
+        $lowest = [math]::Min($lowest, (Get-Available))
+        Start-Sleep -s 1
+    }
+} catch [System.OutOfMemoryException] {
+    Write-Error "Memory stress ended after $($chunks.Count) megabytes: out of memory."
+}
+
+# Clean up actions
+$allocated = $chunks.Count
+$chunks.Clear()
+[System.GC]::Collect()
+
+"##metric memory_allocated_mb=$allocated"
+"##metric memory_available_mb=$lowest"
+"Released the memory."
@@ -0,0 +1,81 @@
+#!/bin/bash
+
+# Take input
+duration=$input_duration
+size=${input_size:-0}
+percentage=${input_percentage:-80}
+rate=${input_rate:-0}
+echo Input configuration: duration="$duration" seconds, size="$size" megabytes, percentage="$percentage"%, \
+    rate="$rate" megabytes per second
+
+began=$SECONDS
+# BASHPID rather than $$ refers to this script if it runs in a subshell of a fault timeline
+script=$BASHPID
+
+# The size in megabytes takes precedence over the percentage of the total memory
+total=$(awk '/^MemTotal:/{print int($2 / 1024)}' /proc/meminfo)
+if [ "$size" -le 0 ]; then
+    size=$((total * percentage / 100))
+fi
+
+available() {
+    awk '/^MemAvailable:/{print int($2 / 1024)}' /proc/meminfo
+}
+
+# Feed zeros to 'tail', which keeps the last line of its input in memory. As the zeros contain no line break,
+# tail holds all of them until its input is closed at the end of the duration. With a rate the memory is fed
+# in steps of one second.
+feed() {
+    started=$SECONDS
+    if [ "$rate" -le 0 ]; then
+        head -c "${size}M" /dev/zero
+    else
+        fed=0
+        while [ "$fed" -lt "$size" ]; do
+            step=$((size - fed < rate ? size - fed : rate))
+            head -c "${step}M" /dev/zero
+            fed=$((fed + step))
+            sleep 1
+        done
+    fi
+
+    remaining=$((duration - (SECONDS - started)))
+    if [ "$remaining" -gt 0 ]; then
+        sleep "$remaining"
+    fi
+}
+
+echo Allocating "$size" of "$total" megabytes of memory for "$duration" seconds
+feed | tail > /dev/null &
+holder=$!
+
+# Measure the allocated memory of tail and the memory left available while it holds the memory
+allocated=0
+lowest=$(available)
+while kill -0 "$holder" 2> /dev/null; do
+    rss=$(awk '/^VmRSS:/{print int($2 / 1024)}' "/proc/$holder/status" 2> /dev/null)
+    if [ -n "$rss" ] && [ "$rss" -gt "$allocated" ]; then
+        allocated=$rss
+    fi
+    current=$(available)
+    if [ "$current" -lt "$lowest" ]; then
+        lowest=$current
+    fi
+    sleep 1
+done
+
+# Clean up actions, the feed is left over if tail was killed, e.g. by the OOM killer
+for child in $(pgrep -P "$script"); do
+    pkill -P "$child" 2> /dev/null
+done
+pkill -P "$script" 2> /dev/null
+wait 2> /dev/null
+
+echo "##metric memory_allocated_mb=$allocated"
+echo "##metric memory_available_mb=$lowest"
+
+if [ $((SECONDS - began)) -lt "$duration" ]; then
+    echo Memory stress ended before the end of the duration, e.g. by the OOM killer. >&2
+    exit 1
+fi
+echo Released the memory.
@@ -0,0 +1,208 @@
+"""
+Govern the Azure Resource Manager requests of the extension.
+
+Azure Resource Manager throttles the requests per subscription and reports the remaining quota with every
+response. Resource Graph throttles the requests per user. Every client of the extension shares one governor
+per subscription (or per user for Resource Graph). The governor is a token bucket for reads and one for
+writes, which
+
+* paces the requests and slows down when the remaining quota reported by Azure runs low,
+* and pauses all requests of the subscription after a throttled (429) response for the ``Retry-After`` period.
+
+The throttled request itself is retried by the ``RetryPolicy`` of the client, which honours ``Retry-After``
+as well. The governor runs for every attempt of the retry policy, so a retry waits for the pause and takes
+a token like any other request. Resource Graph queries are sent as POST requests, but count as reads.
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+from azure.core.pipeline.policies import HTTPPolicy
+from logzero import logger
+
+# Sustained requests per second and burst capacity of a bucket
+DEFAULT_RATE = 20
+DEFAULT_CAPACITY = 200
+
+# Below this remaining quota the bucket slows down in proportion
+DEFAULT_RESERVE = 500
+MIN_RATE = 0.5
+
+DEFAULT_RETRY_AFTER = 10
+
+HEADER_REMAINING_READS = 'x-ms-ratelimit-remaining-subscription-reads'
+HEADER_REMAINING_WRITES = 'x-ms-ratelimit-remaining-subscription-writes'
+HEADER_QUOTA_REMAINING = 'x-ms-user-quota-remaining'
+HEADER_QUOTA_RESETS_AFTER = 'x-ms-user-quota-resets-after'
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# queries of the Resource Graph are POST requests that read
+READ_PATHS = ('/providers/microsoft.resourcegraph/resources',)
+
+_governors = {}
+_governors_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Hand out request tokens at a rate that adapts to the remaining quota reported by Azure."""
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: float = DEFAULT_CAPACITY,
+                 reserve: int = DEFAULT_RESERVE):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.reserve = reserve
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                if self._paused_until > now:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def observe(self, remaining: int):
+        with self._lock:
+            if remaining >= self.reserve:
+                self.rate = self.base_rate
+            else:
+                self.rate = max(MIN_RATE, self.base_rate * remaining / self.reserve)
+                self._tokens = min(self._tokens, remaining)
+
+    def spread(self, remaining: int, window: float):
+        with self._lock:
+            self.rate = max(MIN_RATE, min(self.base_rate, remaining / window))
+            self._tokens = min(self._tokens, remaining)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+class Governor:
+    """Read and write token buckets shared by all clients of a subscription."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.reads = TokenBucket()
+        self.writes = TokenBucket()
+
+    def bucket(self, method: str, url: str = '') -> TokenBucket:
+        return self.reads if _is_read(method, url) else self.writes
+
+    def observe(self, method: str, headers, url: str = ''):
+        bucket = self.bucket(method, url)
+
+        remaining = _to_int(headers.get(HEADER_REMAINING_READS if bucket is self.reads
+                                        else HEADER_REMAINING_WRITES))
+        if remaining is not None:
+            bucket.observe(remaining)
+
+        # Resource Graph reports a per user quota for a time window
+        quota_remaining = _to_int(headers.get(HEADER_QUOTA_REMAINING))
+        if quota_remaining is not None:
+            resets_after = _to_seconds(headers.get(HEADER_QUOTA_RESETS_AFTER)) or DEFAULT_RETRY_AFTER
+            if quota_remaining == 0:
+                bucket.pause(resets_after)
+            else:
+                bucket.spread(quota_remaining, resets_after)
+
+
+class ThrottlingPolicy(HTTPPolicy):
+    """Pipeline policy that sends every attempt of a request through a governor.
+
+    A throttled response pauses the bucket of the request and is handed back to the ``RetryPolicy``,
+    which alone decides whether to retry it.
+    """
+
+    def __init__(self, governor: Governor):
+        super().__init__()
+        self.governor = governor
+
+    def send(self, request):
+        method, url = request.http_request.method, request.http_request.url
+        bucket = self.governor.bucket(method, url)
+
+        bucket.acquire()
+        response = self.next.send(request)
+        headers = response.http_response.headers
+        self.governor.observe(method, headers, url)
+
+        if response.http_response.status_code == 429:
+            retry_after = _retry_after(headers)
+            logger.warn("Azure throttled the requests of '{}'. Pausing them for {} seconds.".format(
+                self.governor.key, retry_after))
+            bucket.pause(retry_after)
+
+        return response
+
+
+def governor(key: str) -> Governor:
+    """Return the governor shared by all clients of the subscription or user named by the key."""
+    with _governors_lock:
+        if key not in _governors:
+            _governors[key] = Governor(key)
+
+        return _governors[key]
+
+
+def policy(key: str) -> ThrottlingPolicy:
+    """Create the pipeline policy to be handed over to a management client as ``per_retry_policies``."""
+    return ThrottlingPolicy(governor(key))
+
+
+#####################
+# HELPER FUNCTIONS
+####################
+def _is_read(method: str, url: str) -> bool:
+    if method.upper() in READ_METHODS:
+        return True
+
+    path = urlparse(url or '').path.lower()
+    return any(path.endswith(read_path) for read_path in READ_PATHS)
+
+
+def _retry_after(headers) -> float:
+    retry_after_ms = _to_int(headers.get('retry-after-ms') or headers.get('x-ms-retry-after-ms'))
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000.0
+
+    retry_after = _to_int(headers.get('Retry-After'))
+    if retry_after is not None:
+        return retry_after
+
+    return DEFAULT_RETRY_AFTER
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_seconds(value):
+    """Convert a 'hh:mm:ss' duration to seconds."""
+    try:
+        hours, minutes, seconds = value.split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except (AttributeError, ValueError):
+        return None
@@ -1,18 +1,18 @@
 # -*- coding: utf-8 -*-
-import concurrent.futures
+from functools import partial
+from typing import List
 
-from azure.core.exceptions import HttpResponseError
-from azure.core.polling import LROPoller
-from chaoslib.exceptions import FailedActivity
 from chaoslib.types import Configuration, Secrets
 from logzero import logger
 
-from pdchaosazure.common import cleanse, config
+from pdchaosazure.common import cleanse, config, fanout, planner, polling
 from pdchaosazure.common.compute import command, client
-from pdchaosazure.vmss.records import Records
+from pdchaosazure.common.deadline import Deadline
+from pdchaosazure.common.lazy import LazyClient
+from pdchaosazure.common.resources import graph
 
-__all__ = ["burn_io", "delete", "fill_disk", "network_latency",
-           "restart", "stop", "stress_cpu"]
+__all__ = ["burn_io", "delete", "delete_run_commands", "fault_timeline", "fill_disk", "network_latency",
+           "restart", "stop", "stress_cpu", "stress_memory"]
 
 from pdchaosazure.vm.fetcher import fetch_machines
 
@@ -33,27 +33,14 @@ def delete(filter: str = None,
     logger.debug(
         "Starting {}: configuration='{}', filter='{}'".format(delete.__name__, configuration, filter))
 
-    machines = fetch_machines(filter, configuration, secrets)
-    clnt = client.init()
-    machine_records = Records()
+    deadline = Deadline(config.load_timeout(configuration))
+    machines = fetch_machines(filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
 
-    futures = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(machines)) as executor:
-        for machine in machines:
-            logger.debug("Deleting machine: {}".format(machine['name']))
-
-            try:
-                poller = clnt.virtual_machines.begin_delete(machine['resourceGroup'], machine['name'])
-            except HttpResponseError as e:
-                raise FailedActivity(e.message)
-
-            # collect future results
-            futures.append(executor.submit(__long_poll, delete.__name__, machine, poller, configuration))
-
-        # wait for results
-        for future in concurrent.futures.as_completed(futures):
-            affected_machine = future.result()
-            machine_records.add(cleanse.machine(affected_machine))
+    machine_records = fanout.run(
+        delete.__name__, machines,
+        partial(__long_poll, delete.__name__, clnt, 'begin_delete', configuration, deadline),
+        cleanse.machine, configuration, deadline)
 
     return machine_records.output_as_dict('resources')
 
@@ -70,28 +57,14 @@ def stop(filter: str = None,
     """
     logger.debug("Starting {}: configuration='{}', filter='{}'".format(stop.__name__, configuration, filter))
 
-    machines = fetch_machines(filter, configuration, secrets)
-    clnt = client.init()
-
-    machine_records = Records()
-
-    futures = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(machines)) as executor:
-        for machine in machines:
-            logger.debug("Stopping machine '{}'".format(machine['name']))
+    deadline = Deadline(config.load_timeout(configuration))
+    machines = fetch_machines(filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
 
-            try:
-                poller = clnt.virtual_machines.begin_power_off(machine['resourceGroup'], machine['name'])
-            except HttpResponseError as e:
-                raise FailedActivity(e.message)
-
-            # collect future results
-            futures.append(executor.submit(__long_poll, stop.__name__, machine, poller, configuration))
-
-        # wait for results
-        for future in concurrent.futures.as_completed(futures):
-            affected_machine = future.result()
-            machine_records.add(cleanse.machine(affected_machine))
+    machine_records = fanout.run(
+        stop.__name__, machines,
+        partial(__long_poll, stop.__name__, clnt, 'begin_power_off', configuration, deadline),
+        cleanse.machine, configuration, deadline)
 
     return machine_records.output_as_dict('resources')
 
@@ -109,36 +82,27 @@ def restart(filter: str = None,
     logger.debug("Starting {}: configuration='{}', filter='{}'".format(
         restart.__name__, configuration, filter))
 
-    machines = fetch_machines(filter, configuration, secrets)
-    clnt = client.init()
-    machine_records = Records()
-
-    futures = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(machines)) as executor:
-        for machine in machines:
-            logger.debug("Restarting machine: {}".format(machine['name']))
-
-            try:
-                poller = clnt.virtual_machines.begin_restart(machine['resourceGroup'], machine['name'])
-            except HttpResponseError as e:
-                raise FailedActivity(e.message)
-
-            # collect future results
-            futures.append(executor.submit(__long_poll, restart.__name__, machine, poller, configuration))
+    deadline = Deadline(config.load_timeout(configuration))
+    machines = fetch_machines(filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
 
-        # wait for results
-        for future in concurrent.futures.as_completed(futures):
-            affected_machine = future.result()
-            machine_records.add(cleanse.machine(affected_machine))
+    machine_records = fanout.run(
+        restart.__name__, machines,
+        partial(__long_poll, restart.__name__, clnt, 'begin_restart', configuration, deadline),
+        cleanse.machine, configuration, deadline)
 
     return machine_records.output_as_dict('resources')
 
 
 def stress_cpu(filter: str = None,
                duration: int = 120,
+               load: int = 100,
+               cores: int = None,
+               affinity: str = None,
+               ramp: int = 0,
                configuration: Configuration = None,
                secrets: Secrets = None):
-    """Stress CPU up to 100% at virtual machines.
+    """Stress CPU up to the given load at virtual machines.
 
     Parameters
     ----------
@@ -147,32 +111,85 @@ def stress_cpu(filter: str = None,
 
     duration : int, optional
         Duration of the stress test (in seconds) that generates high CPU usage. Defaults to 120 seconds.
+
+    load : int, optional
+        The CPU load in percent to generate on every stressed core. Defaults to 100 percent.
+
+    cores : int, optional
+        The number of cores to stress. Defaults to all cores.
+
+    affinity : str, optional
+        The cores to stress and pin the load to, e.g. ``0,2-3``. Overrides ``cores`` if given.
+
+    ramp : int, optional
+        The seconds in which the load rises linearly from 0 to ``load`` percent. Defaults to 0 seconds.
     """
 
     operation_name = stress_cpu.__name__
 
     logger.debug(
-        "Starting {}: configuration='{}', filter='{}', duration='{}'".format(
-            operation_name, configuration, filter, duration))
+        "Starting {}: configuration='{}', filter='{}', duration='{}', load='{}', cores='{}', affinity='{}', "
+        "ramp='{}'".format(operation_name, configuration, filter, duration, load, cores, affinity, ramp))
+
+    command.check_fault(stress_cpu.__name__, load=load)
+    deadline = Deadline(config.load_timeout(configuration))
+    machines = fetch_machines(filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
 
-    machines = fetch_machines(filter, configuration, secrets)
-    clnt = client.init()
+    prepare = partial(command.prepare_parameters, script_id=operation_name, duration=duration, load=load, cores=cores,
+                      affinity=affinity, ramp=ramp)
+    machine_records = fanout.run(
+        operation_name, machines,
+        partial(__long_poll_command, operation_name, prepare, clnt, configuration, deadline),
+        cleanse.machine, configuration, deadline, planner.command(duration), prepare)
 
-    machine_records = Records()
-    futures = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(machines)) as executor:
-        for machine in machines:
-            command_id, script_content = command.prepare(machine, operation_name)
-            parameters = command.fill_parameters(command_id, script_content, duration=duration)
+    return machine_records.output_as_dict('resources')
 
-            # collect future results
-            futures.append(
-                executor.submit(__long_poll_command, operation_name, machine, parameters, clnt))
 
-        # wait for results
-        for future in concurrent.futures.as_completed(futures):
-            affected_machine = future.result()
-            machine_records.add(cleanse.machine(affected_machine))
+def stress_memory(filter: str = None,
+                  duration: int = 120,
+                  size: int = None,
+                  percentage: int = 80,
+                  rate: int = 0,
+                  configuration: Configuration = None,
+                  secrets: Secrets = None):
+    """Allocate and hold memory at virtual machines.
+
+    Parameters
+    ----------
+    filter : str, optional
+        Filter the virtual machine instance(s). If omitted a random instance from your subscription is selected.
+
+    duration : int, optional
+        Duration of the stress test (in seconds) that holds the allocated memory. Defaults to 120 seconds.
+
+    size : int, optional
+        The memory to allocate in megabytes. Overrides ``percentage`` if given.
+
+    percentage : int, optional
+        The memory to allocate in percent of the total memory. Defaults to 80 percent.
+
+    rate : int, optional
+        The megabytes to allocate per second. Defaults to 0, i.e. as fast as possible.
+    """
+
+    operation_name = stress_memory.__name__
+
+    logger.debug(
+        "Starting {}: configuration='{}', filter='{}', duration='{}', size='{}', percentage='{}', "
+        "rate='{}'".format(operation_name, configuration, filter, duration, size, percentage, rate))
+
+    command.check_fault(stress_memory.__name__, percentage=percentage)
+    deadline = Deadline(config.load_timeout(configuration))
+    machines = fetch_machines(filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
+
+    prepare = partial(command.prepare_parameters, script_id=operation_name, duration=duration, size=size,
+                      percentage=percentage, rate=rate)
+    machine_records = fanout.run(
+        operation_name, machines,
+        partial(__long_poll_command, operation_name, prepare, clnt, configuration, deadline),
+        cleanse.machine, configuration, deadline, planner.command(duration), prepare)
 
     return machine_records.output_as_dict('resources')
 
@@ -181,9 +198,15 @@ def fill_disk(filter: str = None,
               duration: int = 120,
               size: int = 1000,
               path: str = None,
+              percentage: int = None,
+              space: str = "free",
+              mode: str = None,
               configuration: Configuration = None,
               secrets: Secrets = None):
-    """Fill the disk with random data.
+    """Fill the disk with a file of a size or a percentage of the free or total space.
+
+    The size of the file, the seconds it took to create it and the used space of the disk are reported as
+    metrics of the run command.
 
     Parameters
     ----------
@@ -199,32 +222,37 @@ def fill_disk(filter: str = None,
     path : str, optional
         The absolute path to write the fill file into.
         Defaults to ``C:\\burn`` for Windows clients and ``/root/burn`` for Linux clients.
-    """
 
-    logger.debug("Starting {}: configuration='{}', filter='{}', duration='{}', size='{}', path='{}'".format(
-        fill_disk.__name__, configuration, filter, duration, size, path))
+    percentage : int, optional
+        The percentage of the ``space`` to fill. Overrides ``size`` if given.
 
-    machines = fetch_machines(filter, configuration, secrets)
-    clnt = client.init()
+    space : str, optional
+        Either ``free`` to create a file of the percentage of the free space, or ``total`` to fill the disk
+        until the percentage of its total space is used. Defaults to ``free``.
 
-    machine_records = Records()
+    mode : str, optional
+        Either ``preallocate`` to reserve the space without writing it, which fills the disk in seconds, or
+        ``write`` to write random data. Defaults to ``write`` for Linux clients and ``preallocate`` for
+        Windows clients.
+    """
 
-    futures = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(machines)) as executor:
-        for machine in machines:
-            command_id, script_content = command.prepare(machine, 'fill_disk')
-            fill_path = command.prepare_path(machine, path)
-            parameters = command.fill_parameters(
-                command_id, script_content, duration=duration, size=size, path=fill_path)
+    logger.debug(
+        "Starting {}: configuration='{}', filter='{}', duration='{}', size='{}', path='{}', percentage='{}', "
+        "space='{}', mode='{}'".format(
+            fill_disk.__name__, configuration, filter, duration, size, path, percentage, space, mode))
+
+    command.check_fault(fill_disk.__name__, percentage=percentage, space=space, mode=mode)
 
-            # collect future results
-            futures.append(
-                executor.submit(__long_poll_command, fill_disk.__name__, machine, parameters, clnt))
+    deadline = Deadline(config.load_timeout(configuration))
+    machines = fetch_machines(filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
 
-        # wait for results
-        for future in concurrent.futures.as_completed(futures):
-            affected_machine = future.result()
-            machine_records.add(cleanse.machine(affected_machine))
+    prepare = partial(command.prepare_parameters, script_id=fill_disk.__name__, duration=duration, size=size, path=path,
+                      percentage=percentage, space=space, mode=mode)
+    machine_records = fanout.run(
+        fill_disk.__name__, machines,
+        partial(__long_poll_command, fill_disk.__name__, prepare, clnt, configuration, deadline),
+        cleanse.machine, configuration, deadline, planner.command(duration), prepare)
 
     return machine_records.output_as_dict('resources')
 
@@ -264,28 +292,16 @@ def network_latency(filter: str = None,
         " delay='{}', jitter='{}', network_interface='{}'".format(
             operation_name, configuration, filter, duration, delay, jitter, network_interface))
 
-    machines = fetch_machines(filter, configuration, secrets)
-    clnt = client.init()
-
-    machine_records = Records()
-
-    futures = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(machines)) as executor:
-        for machine in machines:
-            command_id, script_content = command.prepare(machine, operation_name)
-            logger.debug("Script content: {}".format(script_content))
-            parameters = command.fill_parameters(
-                command_id, script_content, duration=duration, delay=delay, jitter=jitter,
-                network_interface=network_interface)
+    deadline = Deadline(config.load_timeout(configuration))
+    machines = fetch_machines(filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
 
-            # collect future results
-            futures.append(
-                executor.submit(__long_poll_command, operation_name, machine, parameters, clnt))
-
-        # wait for results
-        for future in concurrent.futures.as_completed(futures):
-            affected_machine = future.result()
-            machine_records.add(cleanse.machine(affected_machine))
+    prepare = partial(command.prepare_parameters, script_id=operation_name, duration=duration, delay=delay,
+                      jitter=jitter, network_interface=network_interface)
+    machine_records = fanout.run(
+        operation_name, machines,
+        partial(__long_poll_command, operation_name, prepare, clnt, configuration, deadline),
+        cleanse.machine, configuration, deadline, planner.command(duration), prepare)
 
     return machine_records.output_as_dict('resources')
 
@@ -293,9 +309,18 @@ def network_latency(filter: str = None,
 def burn_io(filter: str = None,
             duration: int = 60,
             path: str = None,
+            read_percentage: int = 0,
+            block_size: int = 4,
+            queue_depth: int = 16,
+            iops: int = None,
+            bandwidth: int = None,
+            size: int = 1024,
             configuration: Configuration = None,
             secrets: Secrets = None):
-    """Simulate heavy disk I/O operations.
+    """Simulate heavy disk I/O operations with a mix of reads and writes up to a target IOPS or bandwidth.
+
+    The I/O is generated by fio or diskspd if installed, otherwise by the script itself. The achieved IOPS,
+    bandwidth and latency percentiles per direction are reported as metrics of the run command.
 
     Parameters
     ----------
@@ -308,32 +333,112 @@ def burn_io(filter: str = None,
     path : str, optional
         The absolute path to write the stress file into. Defaults to ``C:\\burn`` for Windows
         clients and ``/root/burn`` for Linux clients.
+
+    read_percentage : int, optional
+        The share of reads in percent, the rest are writes. Defaults to 0 percent, i.e. only writes.
+
+    block_size : int, optional
+        The size of every read and write in kilobytes. Defaults to 4 KB.
+
+    queue_depth : int, optional
+        The number of reads and writes in flight. Defaults to 16.
+
+    iops : int, optional
+        The reads and writes per second to target. Defaults to as many as possible.
+
+    bandwidth : int, optional
+        The megabytes per second to target. Defaults to as many as possible. The lower of the targets applies.
+
+    size : int, optional
+        The size of the stress file in megabytes. Defaults to 1024 MB.
+    """
+
+    logger.debug(
+        "Starting {}: configuration='{}', filter='{}', duration='{}', read_percentage='{}', block_size='{}', "
+        "queue_depth='{}', iops='{}', bandwidth='{}', size='{}'".format(
+            burn_io.__name__, configuration, filter, duration, read_percentage, block_size, queue_depth, iops,
+            bandwidth, size))
+
+    command.check_fault(burn_io.__name__, read_percentage=read_percentage, block_size=block_size,
+                        queue_depth=queue_depth)
+    deadline = Deadline(config.load_timeout(configuration))
+    machines = fetch_machines(filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
+
+    prepare = partial(command.prepare_parameters, script_id=burn_io.__name__, duration=duration, path=path,
+                      read_percentage=read_percentage, block_size=block_size, queue_depth=queue_depth, iops=iops,
+                      bandwidth=bandwidth, size=size)
+    machine_records = fanout.run(
+        burn_io.__name__, machines,
+        partial(__long_poll_command, burn_io.__name__, prepare, clnt, configuration, deadline),
+        cleanse.machine, configuration, deadline, planner.command(duration), prepare)
+
+    return machine_records.output_as_dict('resources')
+
+
+def fault_timeline(filter: str = None,
+                   timeline: List[dict] = None,
+                   configuration: Configuration = None,
+                   secrets: Secrets = None):
+    """Run a timeline of faults at virtual machines with a single run command per machine.
+
+    Parameters
+    ----------
+    filter : str, optional
+        Filter the virtual machine instance(s). If omitted a random instance from your subscription is selected.
+
+    timeline : list
+        The faults to run, e.g. ``[{"fault": "stress_cpu", "duration": 60},
+        {"fault": "network_latency", "start": 30, "duration": 60, "delay": 500}]``. A fault is one of
+        ``burn_io``, ``fill_disk``, ``network_latency``, ``stress_cpu`` and ``stress_memory`` and takes the
+        parameters of its action. It starts at ``start`` seconds or, if omitted, once the previous fault ended.
+        Without a ``path`` the file of a fault is written to a default path of its own, e.g. ``/root/burn_0``.
     """
+    operation_name = fault_timeline.__name__
 
     logger.debug(
-        "Starting {}: configuration='{}', filter='{}', duration='{}',".format(
-            burn_io.__name__, configuration, filter, duration))
+        "Starting {}: configuration='{}', filter='{}', timeline='{}'".format(
+            operation_name, configuration, filter, timeline))
 
-    machines = fetch_machines(filter, configuration, secrets)
-    clnt = client.init()
+    duration = command.timeline_duration(timeline)
+    deadline = Deadline(config.load_timeout(configuration))
+    machines = fetch_machines(filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
 
-    machine_records = Records()
+    prepare = partial(command.prepare_timeline, timeline=timeline)
+    machine_records = fanout.run(
+        operation_name, machines,
+        partial(__long_poll_command, operation_name, prepare, clnt, configuration, deadline),
+        cleanse.machine, configuration, deadline, planner.command(duration), prepare)
 
-    futures = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(machines)) as executor:
-        for machine in machines:
-            command_id, script_content = command.prepare(machine, 'burn_io')
-            fill_path = command.prepare_path(machine, path)
-            parameters = command.fill_parameters(command_id, script_content, duration=duration, path=fill_path)
+    return machine_records.output_as_dict('resources')
 
-            # collect future results
-            futures.append(
-                executor.submit(__long_poll_command, burn_io.__name__, machine, parameters, clnt))
 
-        # wait for results
-        for future in concurrent.futures.as_completed(futures):
-            affected_machine = future.result()
-            machine_records.add(cleanse.machine(affected_machine))
+def delete_run_commands(filter: str = None,
+                        configuration: Configuration = None,
+                        secrets: Secrets = None):
+    """Delete the managed run commands the faults left on virtual machine instance(s).
+
+    Asynchronous managed run commands are kept on the machines while their scripts run. Delete them once
+    the faults ended, e.g. in the rollbacks of the experiment.
+
+    Parameters
+    ----------
+    filter : str, optional
+        Filter the virtual machine instance(s). If omitted a random instance from your subscription is selected.
+    """
+    operation_name = delete_run_commands.__name__
+    logger.debug(
+        "Starting {}: configuration='{}', filter='{}'".format(operation_name, configuration, filter))
+
+    deadline = Deadline(config.load_timeout(configuration))
+    machines = fetch_machines(filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
+
+    machine_records = fanout.run(
+        operation_name, machines,
+        partial(__delete_run_commands, clnt, deadline),
+        cleanse.machine, configuration, deadline)
 
     return machine_records.output_as_dict('resources')
 
@@ -341,19 +446,38 @@ def burn_io(filter: str = None,
 ###########################
 #  PRIVATE HELPER FUNCTIONS
 ###########################
-def __long_poll(activity, machine, poller: LROPoller, configuration):
+def __long_poll(activity, client, begin, configuration, deadline, machine):
+    deadline.check(activity)
+    logger.debug("Starting operation '{}' on machine '{}'.".format(activity, machine['name']))
+    poller = getattr(client.virtual_machines, begin)(
+        machine['resourceGroup'], machine['name'], polling=polling.create(activity, configuration, deadline))
+
     logger.debug("Waiting for operation '{}' on machine '{}' to finish. Giving priority to other operations.".format(
         activity, machine['name']))
-    poller.result(config.load_timeout(configuration))
+    try:
+        deadline.wait(poller, activity)
+    finally:
+        # the machine changed or is changing, cached query results are outdated
+        graph.invalidate()
     logger.debug("Finished operation '{}' on machine '{}'.".format(activity, machine['name']))
 
     return machine
 
 
-def __long_poll_command(activity, machine, parameters, client):
+def __long_poll_command(activity, prepare, client, configuration, deadline, machine):
+    parameters = prepare(machine)
+
     logger.debug("Waiting for operation '{}' on machine '{}' to finish. Giving priority to other operations.".format(
         activity, machine['name']))
-    command.run(machine['resourceGroup'], machine, parameters, client)
+    machine['run_command'] = command.run(machine['resourceGroup'], machine, parameters, client, configuration, deadline)
     logger.debug("Finished operation '{}' on machine '{}'.".format(activity, machine['name']))
 
     return machine
+
+
+def __delete_run_commands(client, deadline, machine):
+    machine['deleted_run_commands'] = command.delete_managed(machine['resourceGroup'], machine, client, deadline)
+    logger.debug("Deleted the run commands '{}' on machine '{}'.".format(
+        "', '".join(machine['deleted_run_commands']), machine['name']))
+
+    return machine
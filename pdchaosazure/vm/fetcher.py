@@ -4,6 +4,6 @@ from pdchaosazure.common.resources.graph import fetch_resources
 from pdchaosazure.vm.constants import RES_TYPE_VM
 
 
-def fetch_machines(filter, configuration, secrets) -> List[dict]:
-    machines = fetch_resources(filter, RES_TYPE_VM, secrets, configuration)
+def fetch_machines(filter, configuration, secrets, deadline=None) -> List[dict]:
+    machines = fetch_resources(filter, RES_TYPE_VM, secrets, configuration, deadline)
     return machines
@@ -1,19 +1,20 @@
-import concurrent.futures
-from typing import Iterable, Mapping
+from functools import partial
+from typing import Iterable, List, Mapping
 
-from azure.core.exceptions import HttpResponseError
 from chaoslib import Configuration, Secrets
-from chaoslib.exceptions import FailedActivity
 from logzero import logger
 
-from pdchaosazure.common import cleanse, config
+from pdchaosazure.common import cleanse, config, fanout, planner, polling
 from pdchaosazure.common.compute import command, client
-from pdchaosazure.vmss.fetcher import fetch_vmss, fetch_instances
+from pdchaosazure.common.deadline import Deadline
+from pdchaosazure.common.lazy import LazyClient
+from pdchaosazure.common.resources import graph
+from pdchaosazure.vmss.fetcher import fetch_vmss, fetch_instances, invalidate_instances
 from pdchaosazure.vmss.records import Records
 
 __all__ = [
-    "burn_io", "deallocate", "delete", "fill_disk", "network_latency",
-    "restart", "stop", "stress_cpu"
+    "burn_io", "deallocate", "delete", "delete_run_commands", "fault_timeline", "fill_disk", "network_latency",
+    "restart", "stop", "stress_cpu", "stress_memory"
 ]
 
 
@@ -38,33 +39,20 @@ def delete(vmss_filter: str = None,
     logger.debug(
         "Starting {}: configuration='{}', filter='{}'".format(delete.__name__, configuration, vmss_filter))
 
-    clnt = client.init()
-    vmss_list = fetch_vmss(vmss_filter, configuration, secrets)
+    clnt = LazyClient(client.init)
+    deadline = Deadline(config.load_timeout(configuration))
+    vmss_list = fetch_vmss(vmss_filter, configuration, secrets, deadline)
     vmss_records = Records()
 
-    for vmss in vmss_list:
-        instances_records = Records()
-        instances = fetch_instances(vmss, instance_filter, clnt)
-
-        futures = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(instances)) as executor:
-            for instance in instances:
-                try:
-                    poller = clnt.virtual_machine_scale_set_vms.begin_delete(
-                        vmss['resourceGroup'], vmss['name'], instance['instance_id'])
-                except HttpResponseError as e:
-                    raise FailedActivity(e.message)
-
-                # collect future results
-                futures.append(
-                    executor.submit(__long_poll, delete.__name__, instance, poller, configuration))
-
-            # wait for results
-            for future in concurrent.futures.as_completed(futures):
-                affected_instance = future.result()
-                instances_records.add(cleanse.vmss_instance(affected_instance))
+    for vmss, instances in __fetch_instances(vmss_list, instance_filter, clnt, deadline, configuration):
+        instances_records = fanout.run(
+            delete.__name__, instances,
+            partial(__long_poll, delete.__name__, clnt, 'begin_delete', vmss,
+                    configuration, deadline),
+            cleanse.vmss_instance, configuration, deadline)
 
         vmss['virtualMachines'] = instances_records.output()
+        vmss_records.include_plan(instances_records)
         vmss_records.add(cleanse.vmss(vmss))
 
     return vmss_records.output_as_dict('resources')
@@ -89,33 +77,20 @@ def restart(vmss_filter: str = None,
         "Starting {}: configuration='{}', vmss_filter='{}', instance_filter='{}'".format(
             restart.__name__, configuration, vmss_filter, instance_filter))
 
-    clnt = client.init()
-    vmss_list = fetch_vmss(vmss_filter, configuration, secrets)
+    clnt = LazyClient(client.init)
+    deadline = Deadline(config.load_timeout(configuration))
+    vmss_list = fetch_vmss(vmss_filter, configuration, secrets, deadline)
     vmss_records = Records()
 
-    for vmss in vmss_list:
-        instances_records = Records()
-        instances = fetch_instances(vmss, instance_filter, clnt)
-
-        futures = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(instances)) as executor:
-            for instance in instances:
-                try:
-                    poller = clnt.virtual_machine_scale_set_vms.begin_restart(
-                        vmss['resourceGroup'], vmss['name'], instance['instance_id'])
-                except HttpResponseError as e:
-                    raise FailedActivity(e.message)
-
-                # collect future results
-                futures.append(
-                    executor.submit(__long_poll, restart.__name__, instance, poller, configuration))
-
-            # wait for results
-            for future in concurrent.futures.as_completed(futures):
-                affected_instance = future.result()
-                instances_records.add(cleanse.vmss_instance(affected_instance))
+    for vmss, instances in __fetch_instances(vmss_list, instance_filter, clnt, deadline, configuration):
+        instances_records = fanout.run(
+            restart.__name__, instances,
+            partial(__long_poll, restart.__name__, clnt, 'begin_restart', vmss,
+                    configuration, deadline),
+            cleanse.vmss_instance, configuration, deadline)
 
         vmss['virtualMachines'] = instances_records.output()
+        vmss_records.include_plan(instances_records)
         vmss_records.add(cleanse.vmss(vmss))
 
     return vmss_records.output_as_dict('resources')
@@ -140,33 +115,20 @@ def stop(vmss_filter: str = None,
         "Starting {}: configuration='{}', vmss_filter='{}', instance_filter='{}'".format(
             stop.__name__, configuration, vmss_filter, instance_filter))
 
-    clnt = client.init()
-    vmss_list = fetch_vmss(vmss_filter, configuration, secrets)
+    clnt = LazyClient(client.init)
+    deadline = Deadline(config.load_timeout(configuration))
+    vmss_list = fetch_vmss(vmss_filter, configuration, secrets, deadline)
     vmss_records = Records()
 
-    for vmss in vmss_list:
-        instances_records = Records()
-        instances = fetch_instances(vmss, instance_filter, clnt)
-
-        futures = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(instances)) as executor:
-            for instance in instances:
-                try:
-                    poller = clnt.virtual_machine_scale_set_vms.begin_power_off(
-                        vmss['resourceGroup'], vmss['name'], instance['instance_id'])
-                except HttpResponseError as e:
-                    raise FailedActivity(e.message)
-
-                # collect future results
-                futures.append(
-                    executor.submit(__long_poll, stop.__name__, instance, poller, configuration))
-
-            # wait for results
-            for future in concurrent.futures.as_completed(futures):
-                affected_instance = future.result()
-                instances_records.add(cleanse.vmss_instance(affected_instance))
+    for vmss, instances in __fetch_instances(vmss_list, instance_filter, clnt, deadline, configuration):
+        instances_records = fanout.run(
+            stop.__name__, instances,
+            partial(__long_poll, stop.__name__, clnt, 'begin_power_off', vmss,
+                    configuration, deadline),
+            cleanse.vmss_instance, configuration, deadline)
 
         vmss['virtualMachines'] = instances_records.output()
+        vmss_records.include_plan(instances_records)
         vmss_records.add(cleanse.vmss(vmss))
 
     return vmss_records.output_as_dict('resources')
@@ -191,36 +153,20 @@ def deallocate(vmss_filter: str = None,
         "Starting {}: configuration='{}', vmss_filter='{}', instance_filter='{}'".format(
             deallocate.__name__, configuration, vmss_filter, instance_filter))
 
-    clnt = client.init()
-    vmss_list = fetch_vmss(vmss_filter, configuration, secrets)
+    clnt = LazyClient(client.init)
+    deadline = Deadline(config.load_timeout(configuration))
+    vmss_list = fetch_vmss(vmss_filter, configuration, secrets, deadline)
     vmss_records = Records()
 
-    for vmss in vmss_list:
-        instances_records = Records()
-        instances = fetch_instances(vmss, instance_filter, clnt)
-
-        futures = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(instances)) as executor:
-            for instance in instances:
-                logger.debug("Deallocating instance: {}".format(instance['name']))
-
-                try:
-                    poller = clnt.virtual_machine_scale_set_vms.begin_deallocate(
-                        vmss['resourceGroup'], vmss['name'], instance['instance_id'])
-                except HttpResponseError as e:
-                    raise FailedActivity(e.message)
-
-                # collect future results
-                futures.append(
-                    executor.submit(
-                        __long_poll, deallocate.__name__, instance, poller, configuration))
-
-            # wait for results
-            for future in concurrent.futures.as_completed(futures):
-                affected_instance = future.result()
-                instances_records.add(cleanse.vmss_instance(affected_instance))
+    for vmss, instances in __fetch_instances(vmss_list, instance_filter, clnt, deadline, configuration):
+        instances_records = fanout.run(
+            deallocate.__name__, instances,
+            partial(__long_poll, deallocate.__name__, clnt, 'begin_deallocate', vmss,
+                    configuration, deadline),
+            cleanse.vmss_instance, configuration, deadline)
 
         vmss['virtualMachines'] = instances_records.output()
+        vmss_records.include_plan(instances_records)
         vmss_records.add(cleanse.vmss(vmss))
 
     return vmss_records.output_as_dict('resources')
@@ -229,9 +175,13 @@ def deallocate(vmss_filter: str = None,
 def stress_cpu(vmss_filter: str = None,
                instance_filter: str = None,
                duration: int = 120,
+               load: int = 100,
+               cores: int = None,
+               affinity: str = None,
+               ramp: int = 0,
                configuration: Configuration = None,
                secrets: Secrets = None):
-    """Stress CPU up to 100% for instances from the VMSS.
+    """Stress CPU up to the given load for instances from the VMSS.
 
     Parameters
     ----------
@@ -244,39 +194,104 @@ def stress_cpu(vmss_filter: str = None,
 
     duration : int, optional
         Duration of the stress test (in seconds) that generates high CPU usage. Defaults to 120 seconds.
+
+    load : int, optional
+        The CPU load in percent to generate on every stressed core. Defaults to 100 percent.
+
+    cores : int, optional
+        The number of cores to stress. Defaults to all cores.
+
+    affinity : str, optional
+        The cores to stress and pin the load to, e.g. ``0,2-3``. Overrides ``cores`` if given.
+
+    ramp : int, optional
+        The seconds in which the load rises linearly from 0 to ``load`` percent. Defaults to 0 seconds.
     """
 
     operation_name = stress_cpu.__name__
 
-    logger.debug("Starting {}: configuration='{}', vmss_filter='{}', instance_filter='{}', duration='{}'".format(
-        operation_name, configuration, vmss_filter, instance_filter, duration))
+    logger.debug("Starting {}: configuration='{}', vmss_filter='{}', instance_filter='{}', duration='{}', "
+                 "load='{}', cores='{}', affinity='{}', ramp='{}'".format(
+                     operation_name, configuration, vmss_filter, instance_filter, duration, load, cores, affinity,
+                     ramp))
 
-    vmss_list = fetch_vmss(vmss_filter, configuration, secrets)
-    clnt = client.init()
+    command.check_fault(stress_cpu.__name__, load=load)
+    deadline = Deadline(config.load_timeout(configuration))
+    vmss_list = fetch_vmss(vmss_filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
 
+    prepare = partial(command.prepare_parameters, script_id=operation_name, duration=duration, load=load, cores=cores,
+                      affinity=affinity, ramp=ramp)
     vmss_records = Records()
 
-    for vmss in vmss_list:
-        instances_records = Records()
-        instances = fetch_instances(vmss, instance_filter, clnt)
+    for vmss, instances in __fetch_instances(vmss_list, instance_filter, clnt, deadline, configuration):
+        instances_records = fanout.run(
+            operation_name, instances,
+            partial(__long_poll_command, operation_name, vmss['resourceGroup'], prepare, clnt, configuration, deadline),
+            cleanse.vmss_instance, configuration, deadline, planner.command(duration), prepare)
+
+        vmss['virtualMachines'] = instances_records.output()
+        vmss_records.include_plan(instances_records)
+        vmss_records.add(cleanse.vmss(vmss))
+
+    return vmss_records.output_as_dict('resources')
 
-        futures = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(instances)) as executor:
-            for instance in instances:
-                command_id, script_content = command.prepare(instance, operation_name)
-                parameters = command.fill_parameters(command_id, script_content, duration=duration)
 
-                # collect future results
-                futures.append(
-                    executor.submit(
-                        __long_poll_command, operation_name, vmss['resourceGroup'], instance, parameters, clnt))
+def stress_memory(vmss_filter: str = None,
+                  instance_filter: str = None,
+                  duration: int = 120,
+                  size: int = None,
+                  percentage: int = 80,
+                  rate: int = 0,
+                  configuration: Configuration = None,
+                  secrets: Secrets = None):
+    """Allocate and hold memory for instances from the VMSS.
 
-            # wait for future results
-            for future in concurrent.futures.as_completed(futures):
-                affected_instance = future.result()
-                instances_records.add(cleanse.vmss_instance(affected_instance))
+    Parameters
+    ----------
+    vmss_filter : str, optional
+        Filter the virtual machine scale set(s). If omitted a random VMSS from your subscription is selected.
+
+    instance_filter : str, optional
+        KQLL: Filter the instances of the selected virtual machine scale set(s). If omitted
+        a random instance from your VMSS is selected.
+
+    duration : int, optional
+        Duration of the stress test (in seconds) that holds the allocated memory. Defaults to 120 seconds.
+
+    size : int, optional
+        The memory to allocate in megabytes. Overrides ``percentage`` if given.
+
+    percentage : int, optional
+        The memory to allocate in percent of the total memory. Defaults to 80 percent.
+
+    rate : int, optional
+        The megabytes to allocate per second. Defaults to 0, i.e. as fast as possible.
+    """
+
+    operation_name = stress_memory.__name__
+
+    logger.debug("Starting {}: configuration='{}', vmss_filter='{}', instance_filter='{}', duration='{}', "
+                 "size='{}', percentage='{}', rate='{}'".format(
+                     operation_name, configuration, vmss_filter, instance_filter, duration, size, percentage, rate))
+
+    command.check_fault(stress_memory.__name__, percentage=percentage)
+    deadline = Deadline(config.load_timeout(configuration))
+    vmss_list = fetch_vmss(vmss_filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
+
+    prepare = partial(command.prepare_parameters, script_id=operation_name, duration=duration, size=size,
+                      percentage=percentage, rate=rate)
+    vmss_records = Records()
+
+    for vmss, instances in __fetch_instances(vmss_list, instance_filter, clnt, deadline, configuration):
+        instances_records = fanout.run(
+            operation_name, instances,
+            partial(__long_poll_command, operation_name, vmss['resourceGroup'], prepare, clnt, configuration, deadline),
+            cleanse.vmss_instance, configuration, deadline, planner.command(duration), prepare)
 
         vmss['virtualMachines'] = instances_records.output()
+        vmss_records.include_plan(instances_records)
         vmss_records.add(cleanse.vmss(vmss))
 
     return vmss_records.output_as_dict('resources')
@@ -286,9 +301,18 @@ def burn_io(vmss_filter: str = None,
             instance_filter: str = None,
             duration: int = 60,
             path: str = None,
+            read_percentage: int = 0,
+            block_size: int = 4,
+            queue_depth: int = 16,
+            iops: int = None,
+            bandwidth: int = None,
+            size: int = 1024,
             configuration: Configuration = None,
             secrets: Secrets = None):
-    """Simulate heavy disk I/O operations.
+    """Simulate heavy disk I/O operations with a mix of reads and writes up to a target IOPS or bandwidth.
+
+    The I/O is generated by fio or diskspd if installed, otherwise by the script itself. The achieved IOPS,
+    bandwidth and latency percentiles per direction are reported as metrics of the run command.
 
     Parameters
     ----------
@@ -305,38 +329,51 @@ def burn_io(vmss_filter: str = None,
     path : str, optional
         The absolute path to write the stress file into. Defaults to ``C:\\burn`` for Windows
         clients and ``/root/burn`` for Linux clients.
-    """
-    operation_name = burn_io.__name__
-    logger.debug(
-        "Starting {}: configuration='{}', vmss_filter='{}', instance_filter='{}', duration='{}',".format(
-            operation_name, configuration, vmss_filter, instance_filter, duration))
 
-    clnt = client.init()
-    vmss_list = fetch_vmss(vmss_filter, configuration, secrets)
-    vmss_records = Records()
+    read_percentage : int, optional
+        The share of reads in percent, the rest are writes. Defaults to 0 percent, i.e. only writes.
+
+    block_size : int, optional
+        The size of every read and write in kilobytes. Defaults to 4 KB.
 
-    for vmss in vmss_list:
-        instances_records = Records()
-        instances = fetch_instances(vmss, instance_filter, clnt)
+    queue_depth : int, optional
+        The number of reads and writes in flight. Defaults to 16.
 
-        futures = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(instances)) as executor:
-            for instance in instances:
-                command_id, script_content = command.prepare(instance, operation_name)
-                fill_path = command.prepare_path(instance, path)
-                parameters = command.fill_parameters(command_id, script_content, duration=duration, path=fill_path)
+    iops : int, optional
+        The reads and writes per second to target. Defaults to as many as possible.
 
-                # collect future results
-                futures.append(
-                    executor.submit(
-                        __long_poll_command, operation_name, vmss['resourceGroup'], instance, parameters, clnt))
+    bandwidth : int, optional
+        The megabytes per second to target. Defaults to as many as possible. The lower of the targets applies.
+
+    size : int, optional
+        The size of the stress file in megabytes. Defaults to 1024 MB.
+    """
+    operation_name = burn_io.__name__
+    logger.debug(
+        "Starting {}: configuration='{}', vmss_filter='{}', instance_filter='{}', duration='{}', "
+        "read_percentage='{}', block_size='{}', queue_depth='{}', iops='{}', bandwidth='{}', size='{}'".format(
+            operation_name, configuration, vmss_filter, instance_filter, duration, read_percentage, block_size,
+            queue_depth, iops, bandwidth, size))
+
+    command.check_fault(burn_io.__name__, read_percentage=read_percentage, block_size=block_size,
+                        queue_depth=queue_depth)
+
+    clnt = LazyClient(client.init)
+    deadline = Deadline(config.load_timeout(configuration))
+    vmss_list = fetch_vmss(vmss_filter, configuration, secrets, deadline)
+    prepare = partial(command.prepare_parameters, script_id=operation_name, duration=duration, path=path,
+                      read_percentage=read_percentage, block_size=block_size, queue_depth=queue_depth, iops=iops,
+                      bandwidth=bandwidth, size=size)
+    vmss_records = Records()
 
-            # wait for the results
-            for future in concurrent.futures.as_completed(futures):
-                affected_instance = future.result()
-                instances_records.add(cleanse.vmss_instance(affected_instance))
+    for vmss, instances in __fetch_instances(vmss_list, instance_filter, clnt, deadline, configuration):
+        instances_records = fanout.run(
+            operation_name, instances,
+            partial(__long_poll_command, operation_name, vmss['resourceGroup'], prepare, clnt, configuration, deadline),
+            cleanse.vmss_instance, configuration, deadline, planner.command(duration), prepare)
 
         vmss['virtualMachines'] = instances_records.output()
+        vmss_records.include_plan(instances_records)
         vmss_records.add(cleanse.vmss(vmss))
 
     return vmss_records.output_as_dict('resources')
@@ -347,9 +384,15 @@ def fill_disk(vmss_filter: str = None,
               duration: int = 120,
               size: int = 1000,
               path: str = None,
+              percentage: int = None,
+              space: str = "free",
+              mode: str = None,
               configuration: Configuration = None,
               secrets: Secrets = None):
-    """Fill the disk with random data.
+    """Fill the disk with a file of a size or a percentage of the free or total space.
+
+    The size of the file, the seconds it took to create it and the used space of the disk are reported as
+    metrics of the run command.
 
     Parameters
     ----------
@@ -369,42 +412,45 @@ def fill_disk(vmss_filter: str = None,
     path : str, optional
         Location of the stressing file where it is generated. Defaults to ``/root/burn`` on Linux systems
         and ``C:\\burn`` on Windows machines.
+
+    percentage : int, optional
+        The percentage of the ``space`` to fill. Overrides ``size`` if given.
+
+    space : str, optional
+        Either ``free`` to create a file of the percentage of the free space, or ``total`` to fill the disk
+        until the percentage of its total space is used. Defaults to ``free``.
+
+    mode : str, optional
+        Either ``preallocate`` to reserve the space without writing it, which fills the disk in seconds, or
+        ``write`` to write random data. Defaults to ``write`` for Linux clients and ``preallocate`` for
+        Windows clients.
     """
     operation_name = fill_disk.__name__
 
     logger.debug(
         "Starting {}: configuration='{}', vmss_filter='{}', instance_filter='{}', "
-        "duration='{}', size='{}', path='{}'".format(
-            operation_name, configuration, vmss_filter, instance_filter, duration, size, path))
+        "duration='{}', size='{}', path='{}', percentage='{}', space='{}', mode='{}'".format(
+            operation_name, configuration, vmss_filter, instance_filter, duration, size, path, percentage, space,
+            mode))
 
-    vmss_list = fetch_vmss(vmss_filter, configuration, secrets)
-    clnt = client.init()
+    command.check_fault(fill_disk.__name__, percentage=percentage, space=space, mode=mode)
 
-    vmss_records = Records()
-
-    for vmss in vmss_list:
-        instances_records = Records()
-        instances = fetch_instances(vmss, instance_filter, clnt)
+    deadline = Deadline(config.load_timeout(configuration))
+    vmss_list = fetch_vmss(vmss_filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
 
-        futures = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(instances)) as executor:
-            for instance in instances:
-                command_id, script_content = command.prepare(instance, operation_name)
-                fill_path = command.prepare_path(instance, path)
-                parameters = command.fill_parameters(
-                    command_id, script_content, duration=duration, size=size, path=fill_path)
-
-                # collect the future results
-                futures.append(
-                    executor.submit(
-                        __long_poll_command, operation_name, vmss['resourceGroup'], instance, parameters, clnt))
+    prepare = partial(command.prepare_parameters, script_id=operation_name, duration=duration, size=size, path=path,
+                      percentage=percentage, space=space, mode=mode)
+    vmss_records = Records()
 
-            # wait for the results
-            for future in concurrent.futures.as_completed(futures):
-                affected_instance = future.result()
-                instances_records.add(cleanse.vmss_instance(affected_instance))
+    for vmss, instances in __fetch_instances(vmss_list, instance_filter, clnt, deadline, configuration):
+        instances_records = fanout.run(
+            operation_name, instances,
+            partial(__long_poll_command, operation_name, vmss['resourceGroup'], prepare, clnt, configuration, deadline),
+            cleanse.vmss_instance, configuration, deadline, planner.command(duration), prepare)
 
         vmss['virtualMachines'] = instances_records.output()
+        vmss_records.include_plan(instances_records)
         vmss_records.add(cleanse.vmss(vmss))
 
     return vmss_records.output_as_dict('resources')
@@ -449,34 +495,113 @@ def network_latency(vmss_filter: str = None,
         " delay='{}', jitter='{}', network_interface='{}'".format(
             operation_name, configuration, filter, duration, delay, jitter, network_interface))
 
-    vmss_list = fetch_vmss(vmss_filter, configuration, secrets)
-    clnt = client.init()
+    deadline = Deadline(config.load_timeout(configuration))
+    vmss_list = fetch_vmss(vmss_filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
 
+    prepare = partial(command.prepare_parameters, script_id=operation_name, duration=duration, delay=delay,
+                      jitter=jitter, network_interface=network_interface)
     vmss_records = Records()
 
-    for vmss in vmss_list:
-        instances_records = Records()
-        instances = fetch_instances(vmss, instance_filter, clnt)
+    for vmss, instances in __fetch_instances(vmss_list, instance_filter, clnt, deadline, configuration):
+        instances_records = fanout.run(
+            operation_name, instances,
+            partial(__long_poll_command, operation_name, vmss['resourceGroup'], prepare, clnt, configuration, deadline),
+            cleanse.vmss_instance, configuration, deadline, planner.command(duration), prepare)
+
+        vmss['virtualMachines'] = instances_records.output()
+        vmss_records.include_plan(instances_records)
+        vmss_records.add(cleanse.vmss(vmss))
+
+    return vmss_records.output_as_dict('resources')
+
+
+def fault_timeline(vmss_filter: str = None,
+                   instance_filter: str = None,
+                   timeline: List[dict] = None,
+                   configuration: Configuration = None,
+                   secrets: Secrets = None):
+    """Run a timeline of faults at instances from the VMSS with a single run command per instance.
+
+    Parameters
+    ----------
+    vmss_filter : str, optional
+        Filter the virtual machine scale set(s). If omitted a random VMSS from your subscription is selected.
+
+    instance_filter : str, optional
+        KQLL: Filter the instances of the selected virtual machine scale set(s). If omitted
+        a random instance from your VMSS is selected.
+
+    timeline : list
+        The faults to run, e.g. ``[{"fault": "stress_cpu", "duration": 60},
+        {"fault": "network_latency", "start": 30, "duration": 60, "delay": 500}]``. A fault is one of
+        ``burn_io``, ``fill_disk``, ``network_latency``, ``stress_cpu`` and ``stress_memory`` and takes the
+        parameters of its action. It starts at ``start`` seconds or, if omitted, once the previous fault ended.
+        Without a ``path`` the file of a fault is written to a default path of its own, e.g. ``/root/burn_0``.
+    """
+    operation_name = fault_timeline.__name__
+    logger.debug(
+        "Starting {}: configuration='{}', vmss_filter='{}', instance_filter='{}', timeline='{}'".format(
+            operation_name, configuration, vmss_filter, instance_filter, timeline))
+
+    duration = command.timeline_duration(timeline)
+    deadline = Deadline(config.load_timeout(configuration))
+    vmss_list = fetch_vmss(vmss_filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
+
+    prepare = partial(command.prepare_timeline, timeline=timeline)
+    vmss_records = Records()
+
+    for vmss, instances in __fetch_instances(vmss_list, instance_filter, clnt, deadline, configuration):
+        instances_records = fanout.run(
+            operation_name, instances,
+            partial(__long_poll_command, operation_name, vmss['resourceGroup'], prepare, clnt, configuration, deadline),
+            cleanse.vmss_instance, configuration, deadline, planner.command(duration), prepare)
+
+        vmss['virtualMachines'] = instances_records.output()
+        vmss_records.include_plan(instances_records)
+        vmss_records.add(cleanse.vmss(vmss))
+
+    return vmss_records.output_as_dict('resources')
+
 
-        futures = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(instances)) as executor:
-            for instance in instances:
-                command_id, script_content = command.prepare(instance, operation_name)
-                parameters = command.fill_parameters(
-                    command_id, script_content, duration=duration, delay=delay, jitter=jitter,
-                    network_interface=network_interface)
+def delete_run_commands(vmss_filter: str = None,
+                        instance_filter: str = None,
+                        configuration: Configuration = None,
+                        secrets: Secrets = None):
+    """Delete the managed run commands the faults left on instances from the VMSS.
 
-                # collect the future results
-                futures.append(
-                    executor.submit(
-                        __long_poll_command, operation_name, vmss['resourceGroup'], instance, parameters, clnt))
+    Asynchronous managed run commands are kept on the instances while their scripts run. Delete them once
+    the faults ended, e.g. in the rollbacks of the experiment.
 
-            # wait for the results
-            for future in concurrent.futures.as_completed(futures):
-                affected_instance = future.result()
-                instances_records.add(cleanse.vmss_instance(affected_instance))
+    Parameters
+    ----------
+    vmss_filter : str, optional
+        Filter the virtual machine scale set(s). If omitted a random VMSS from your subscription is selected.
+
+    instance_filter : str, optional
+        KQLL: Filter the instances of the selected virtual machine scale set(s). If omitted
+        a random instance from your VMSS is selected.
+    """
+    operation_name = delete_run_commands.__name__
+    logger.debug(
+        "Starting {}: configuration='{}', vmss_filter='{}', instance_filter='{}'".format(
+            operation_name, configuration, vmss_filter, instance_filter))
+
+    deadline = Deadline(config.load_timeout(configuration))
+    vmss_list = fetch_vmss(vmss_filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
+
+    vmss_records = Records()
+
+    for vmss, instances in __fetch_instances(vmss_list, instance_filter, clnt, deadline, configuration):
+        instances_records = fanout.run(
+            operation_name, instances,
+            partial(__delete_run_commands, vmss['resourceGroup'], clnt, deadline),
+            cleanse.vmss_instance, configuration, deadline)
 
         vmss['virtualMachines'] = instances_records.output()
+        vmss_records.include_plan(instances_records)
         vmss_records.add(cleanse.vmss(vmss))
 
     return vmss_records.output_as_dict('resources')
@@ -485,19 +610,53 @@ def network_latency(vmss_filter: str = None,
 ###########################
 #  PRIVATE HELPER FUNCTIONS
 ###########################
-def __long_poll(activity, instance, poller, configuration):
+def __fetch_instances(vmss_list, instance_filter, client, deadline, configuration):
+    if len(vmss_list) == 1:
+        # stream the instances of a single scale set right into its operations
+        return [(vmss_list[0], fetch_instances(vmss_list[0], instance_filter, client, deadline, configuration))]
+
+    # list the instances of all scale sets at once, the operations run scale set by scale set
+    instances_list = fanout.gather(
+        lambda vmss: list(fetch_instances(vmss, instance_filter, client, deadline, configuration)),
+        vmss_list, configuration)
+
+    return zip(vmss_list, instances_list)
+
+
+def __long_poll(activity, client, begin, vmss, configuration, deadline, instance):
+    deadline.check(activity)
+    logger.debug("Starting operation '{}' on instance '{}'.".format(activity, instance['name']))
+    poller = getattr(client.virtual_machine_scale_set_vms, begin)(
+        vmss['resourceGroup'], vmss['name'], instance['instance_id'],
+        polling=polling.create(activity, configuration, deadline))
+
     logger.debug("Waiting for operation '{}' on instance '{}' to finish. Giving priority to other operations.".format(
         activity, instance['name']))
-    poller.result(config.load_timeout(configuration))
+    try:
+        deadline.wait(poller, activity)
+    finally:
+        # the instance changed or is changing, cached query results and instances are outdated
+        graph.invalidate()
+        invalidate_instances()
     logger.debug("Finished operation '{}' on instance '{}'.".format(activity, instance['name']))
 
     return instance
 
 
-def __long_poll_command(activity, group, instance, parameters, client):
+def __long_poll_command(activity, group, prepare, client, configuration, deadline, instance):
+    parameters = prepare(instance)
+
     logger.debug("Waiting for operation '{}' on instance '{}' to finish. Giving priority to other operations.".format(
         activity, instance['name']))
-    command.run(group, instance, parameters, client)
+    instance['run_command'] = command.run(group, instance, parameters, client, configuration, deadline)
     logger.debug("Finished operation '{}' on instance '{}'.".format(activity, instance['name']))
 
     return instance
+
+
+def __delete_run_commands(group, client, deadline, instance):
+    instance['deleted_run_commands'] = command.delete_managed(group, instance, client, deadline)
+    logger.debug("Deleted the run commands '{}' on instance '{}'.".format(
+        "', '".join(instance['deleted_run_commands']), instance['name']))
+
+    return instance
@@ -1,21 +1,40 @@
-from typing import Any, Dict, List
+import hashlib
+import json
+from typing import Any, Dict, Iterator, List, Mapping
 
 import jmespath
 from azure.mgmt.compute import ComputeManagementClient
 from chaoslib.exceptions import InterruptExecution
+from chaoslib.types import Configuration
+from logzero import logger
 
-from pdchaosazure.common import kustolight
+from pdchaosazure.common import config, kustolight
+from pdchaosazure.common.compute import raw
+from pdchaosazure.common.deadline import Deadline
+from pdchaosazure.common.modelview import ModelView
+from pdchaosazure.common.resources import snapshot
+from pdchaosazure.common.resources.cache import QueryCache
 from pdchaosazure.common.resources.graph import fetch_resources
 from pdchaosazure.vmss.constants import RES_TYPE_VMSS
 
+DEFAULT_INSTANCE_CACHE_MAX_SIZE = 32
 
-def fetch_instances(vmss, instance_filter: str, client: ComputeManagementClient) -> List[Dict[str, Any]]:
+# SDK models are never changed and raw instances are copied when parsed, so a shallow copy of the list suffices
+_instances_cache = QueryCache(copier=list)
+
+
+def fetch_instances(vmss, instance_filter: str, client: ComputeManagementClient,
+                    deadline: Deadline = None, configuration: Configuration = None) -> Iterator[Mapping[str, Any]]:
+    """Stream the instances of the VMSS that match the instance filter.
+
+    Instances are listed page by page, converted and filtered on the fly. Refer to ``kustolight.filter_iter``.
+    """
     if not instance_filter:
         instance_filter = "sample 1"
 
     try:
-        instances = fetch_all_vmss_instances(vmss, client)
-        result = kustolight.filter_resources(instances, instance_filter)
+        instances = fetch_all_vmss_instances(vmss, client, deadline, configuration)
+        result = kustolight.filter_iter(instances, instance_filter)
     except jmespath.exceptions.ParseError:
         raise InterruptExecution("'{}' is an invalid query. Please have a look at the documentation.".format(
             instance_filter))
@@ -23,29 +42,93 @@ def fetch_instances(vmss, instance_filter: str, client: ComputeManagementClient)
     return result
 
 
-def fetch_vmss(vmss_filter, configuration, secrets) -> List[dict]:
-    vmss = fetch_resources(vmss_filter, RES_TYPE_VMSS, secrets, configuration)
+def fetch_vmss(vmss_filter, configuration, secrets, deadline=None) -> List[dict]:
+    vmss = fetch_resources(vmss_filter, RES_TYPE_VMSS, secrets, configuration, deadline)
     return vmss
 
 
-def fetch_all_vmss_instances(vmss, client: ComputeManagementClient) -> List[Dict]:
-    vmss_instances = []
-    instances_iterator = client.virtual_machine_scale_set_vms.list(vmss['resourceGroup'], vmss['name'])
+def fetch_all_vmss_instances(vmss, client: ComputeManagementClient, deadline: Deadline = None,
+                             configuration: Configuration = None) -> Iterator[Mapping]:
+    """Stream all instances of the VMSS.
+
+    If the instance cache is configured (refer to ``config.load_instance_cache``) the listed instances are
+    kept per scale set and reused as long as the scale set did not change, i.e. its SKU and properties as
+    reported by the Resource Graph are the same. If a snapshot is configured (refer to ``config.load_snapshot``)
+    the instances are read from it and the client is not used, unless the snapshot is being recorded.
+    """
+    snapshot_settings = config.load_snapshot(configuration)
+    if snapshot_settings.get('path') and not snapshot_settings.get('record'):
+        yield from __parse_raw_vmss_instances_result(
+            snapshot.read_vmss_instances(snapshot_settings['path'], vmss), vmss)
+        return
+
+    raw_listing = config.load_raw_listing(configuration)
+    parse = __parse_raw_vmss_instances_result if raw_listing else __parse_vmss_instances_result
+    cache_settings = config.load_instance_cache(configuration)
+
+    if snapshot_settings.get('record'):
+        instances = []
+        for instance in __list_instances(vmss, client, raw_listing, deadline):
+            instances.append(instance)
+            yield from parse([instance], vmss)
+
+        # the consumer may stop early, so only complete listings are recorded
+        snapshot.record(snapshot_settings['path'], (i if isinstance(i, dict) else i.as_dict() for i in instances))
+        return
+
+    if not cache_settings.get('ttl'):
+        yield from parse(__list_instances(vmss, client, raw_listing, deadline), vmss)
+        return
+
+    cache_key = (vmss.get('id'), raw_listing, __fingerprint(vmss))
+    instances = _instances_cache.get(cache_key, cache_settings['ttl'])
+    if instances is not None:
+        logger.debug("Reusing {} cached instances of VMSS '{}'.".format(len(instances), vmss['name']))
+        yield from parse(instances, vmss)
+        return
+
+    instances = []
+    for instance in __list_instances(vmss, client, raw_listing, deadline):
+        instances.append(instance)
+        yield from parse([instance], vmss)
 
-    for instance in instances_iterator:
-        vmss_instances.append(instance)
+    # the consumer may stop early, e.g. with a 'take' filter, so only complete listings are cached
+    _instances_cache.put(cache_key, instances, cache_settings.get('max_size', DEFAULT_INSTANCE_CACHE_MAX_SIZE))
 
-    results = __parse_vmss_instances_result(vmss_instances, vmss)
-    return results
+
+def invalidate_instances():
+    """Drop all cached instances, e.g. after an action changed the instances of a scale set."""
+    _instances_cache.invalidate()
 
 
 #############################################################################
 # Private helper functions
 #############################################################################
-def __parse_vmss_instances_result(instances, vmss: dict) -> List[Dict]:
-    results = []
+def __list_instances(vmss, client, raw_listing, deadline) -> Iterator:
+    if raw_listing:
+        pages = raw.list_vmss_instances(vmss['resourceGroup'], vmss['name'], client)
+    else:
+        pages = client.virtual_machine_scale_set_vms.list(vmss['resourceGroup'], vmss['name']).by_page()
+
+    for page in pages:
+        if deadline:
+            deadline.check('fetch_instances')
+
+        yield from page
+
+
+def __fingerprint(vmss: dict) -> str:
+    state = {'sku': vmss.get('sku'), 'properties': vmss.get('properties')}
+    return hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def __parse_vmss_instances_result(instances, vmss: dict) -> Iterator[Mapping]:
+    for instance in instances:
+        # attributes are serialized only when read, e.g. by the instance filter or an action
+        yield ModelView(instance, scale_set=vmss['name'])
+
+
+def __parse_raw_vmss_instances_result(instances, vmss: dict) -> Iterator[Dict]:
     for instance in instances:
-        instance_as_dict = instance.as_dict()
-        instance_as_dict['scale_set'] = vmss['name']
-        results.append(instance_as_dict)
-    return results
+        # a shallow copy suffices, actions add and remove top level keys only
+        yield dict(instance, scale_set=vmss['name'])
@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
+from functools import partial
+
 from chaoslib.types import Configuration, Secrets
 from logzero import logger
 
 __all__ = ["count_instances"]
 
+from pdchaosazure.common import fanout
 from pdchaosazure.common.compute import client
+from pdchaosazure.common.lazy import LazyClient
 from pdchaosazure.vmss.fetcher import fetch_vmss, fetch_all_vmss_instances
 
 
@@ -22,11 +26,16 @@ def count_instances(filter: str = None,
     logger.debug(
         "Starting {}: configuration='{}', filter='{}'".format(count_instances.__name__, configuration, filter))
 
-    result = []
-    clnt = client.init()
+    clnt = LazyClient(client.init)
     vmss_list = fetch_vmss(filter, configuration, secrets)
-    for vmss in vmss_list:
-        instances = fetch_all_vmss_instances(vmss, clnt)
-        result.extend(instances)
+    counts = fanout.gather(partial(__count_instances, clnt, configuration), vmss_list, configuration)
+
+    return sum(counts)
+
 
-    return len(result)
+###########################
+#  PRIVATE HELPER FUNCTIONS
+###########################
+def __count_instances(client, configuration, vmss):
+    instances = fetch_all_vmss_instances(vmss, client, configuration=configuration)
+    return sum(1 for _ in instances)
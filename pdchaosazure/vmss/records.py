@@ -1,5 +1,8 @@
 from calendar import timegm
 from datetime import datetime
+from typing import Mapping
+
+from pdchaosazure.common import planner
 
 
 class Records:
@@ -7,15 +10,29 @@ class Records:
 
     def __init__(self):
         self.elements = []
+        self.plan = None
 
-    def add(self, element: dict):
+    def add(self, element: Mapping):
+        # materialize lazy views such as a ModelView, serializing only the retained keys
+        if not isinstance(element, dict):
+            element = dict(element)
         element['performed_at'] = timegm(datetime.utcnow().utctimetuple())
         self.elements.append(element)
 
+    def include_plan(self, other: 'Records'):
+        # plans of nested records, e.g. of the instances of a scale set, add up to the plan of the action
+        if other.plan:
+            self.plan = planner.merge(p for p in (self.plan, other.plan) if p)
+
     def output(self):
         return self.elements
 
     def output_as_dict(self, key: str):
-        return {
+        result = {
             key: self.elements
         }
+
+        if self.plan:
+            result['plan'] = self.plan
+
+        return result
@@ -1,10 +1,12 @@
-from azure.core.exceptions import HttpResponseError
+from functools import partial
+
 from chaoslib import Configuration, Secrets
-from chaoslib.exceptions import FailedActivity
 from logzero import logger
 
-from pdchaosazure.common import cleanse
-from pdchaosazure.vmss.records import Records
+from pdchaosazure.common import cleanse, config, fanout, planner
+from pdchaosazure.common.deadline import Deadline
+from pdchaosazure.common.lazy import LazyClient
+from pdchaosazure.common.resources import graph
 
 # sort alphabetically to find 'em quicker
 __all__ = ["delete", "restart", "stop"]
@@ -26,45 +28,48 @@ def stop(filter: str = None,
     """
     logger.debug("Starting {}: configuration='{}', filter='{}'".format(stop.__name__, configuration, filter))
 
-    clnt = client.init()
-    webapps = fetch_webapps(filter, configuration, secrets)
-    webapps_records = Records()
-
-    for webapp in webapps:
-        try:
-            logger.debug("Stopping web app: {}".format(webapp['name']))
-            clnt.web_apps.stop(webapp['resourceGroup'], webapp['name'])
-            webapps_records.add(cleanse.machine(webapp))
+    clnt = LazyClient(client.init)
+    deadline = Deadline(config.load_timeout(configuration))
+    webapps = fetch_webapps(filter, configuration, secrets, deadline)
 
-        except HttpResponseError as e:
-            raise FailedActivity(e.message)
+    webapps_records = fanout.run(
+        stop.__name__, webapps, partial(__operate, stop.__name__, clnt, 'stop'),
+        cleanse.machine, configuration, deadline, planner.WRITE)
 
     return webapps_records.output_as_dict('resources')
 
 
 def restart(filter: str = None,
             configuration: Configuration = None,
-            secrets: Secrets = None):
+            secrets: Secrets = None,
+            soft_restart: bool = False,
+            synchronous: bool = False):
     """Restart web app instances.
 
     Parameters
     ----------
     filter : str, optional
         Filter the web app instance(s). If omitted a random instance from your subscription is selected.
+
+    soft_restart : bool, optional
+        Apply the latest configuration and restart the web app only if necessary. Defaults to ``False``.
+
+    synchronous : bool, optional
+        Block until each web app is restarted. Defaults to ``False``, i.e. a restart is triggered
+        without waiting for the web app to come back.
     """
-    logger.debug("Starting {}: configuration='{}', filter='{}'".format(restart.__name__, configuration, filter))
+    logger.debug("Starting {}: configuration='{}', filter='{}', soft_restart='{}', synchronous='{}'".format(
+        restart.__name__, configuration, filter, soft_restart, synchronous))
 
-    webapps = fetch_webapps(filter, configuration, secrets)
-    clnt = client.init()
-    webapps_records = Records()
+    deadline = Deadline(config.load_timeout(configuration))
+    webapps = fetch_webapps(filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
 
-    for webapp in webapps:
-        try:
-            logger.debug("Restarting web app: {}".format(webapp['name']))
-            clnt.web_apps.restart(webapp['resourceGroup'], webapp['name'])
-            webapps_records.add(cleanse.machine(webapp))
-        except HttpResponseError as e:
-            raise FailedActivity(e.message)
+    webapps_records = fanout.run(
+        restart.__name__, webapps,
+        partial(__operate, restart.__name__, clnt, 'restart', soft_restart=soft_restart,
+                synchronous=synchronous),
+        cleanse.machine, configuration, deadline, planner.WRITE)
 
     return webapps_records.output_as_dict('resources')
 
@@ -84,16 +89,27 @@ def delete(filter: str = None,
     """
     logger.debug("Starting {}: configuration='{}', filter='{}'".format(delete.__name__, configuration, filter))
 
-    webapps = fetch_webapps(filter, configuration, secrets)
-    clnt = client.init()
-    webapps_records = Records()
+    deadline = Deadline(config.load_timeout(configuration))
+    webapps = fetch_webapps(filter, configuration, secrets, deadline)
+    clnt = LazyClient(client.init)
 
-    for webapp in webapps:
-        try:
-            logger.debug("Deleting web app: {}".format(webapp['name']))
-            clnt.web_apps.delete(webapp['resourceGroup'], webapp['name'])
-            webapps_records.add(cleanse.machine(webapp))
-        except HttpResponseError as e:
-            raise FailedActivity(e.message)
+    webapps_records = fanout.run(
+        delete.__name__, webapps, partial(__operate, delete.__name__, clnt, 'delete'),
+        cleanse.machine, configuration, deadline, planner.WRITE)
 
     return webapps_records.output_as_dict('resources')
+
+
+###########################
+#  PRIVATE HELPER FUNCTIONS
+###########################
+def __operate(activity, client, operation, webapp, **kwargs):
+    logger.debug("Starting operation '{}' on web app '{}'.".format(activity, webapp['name']))
+    try:
+        getattr(client.web_apps, operation)(webapp['resourceGroup'], webapp['name'], **kwargs)
+    finally:
+        # the web app changed or is changing, cached query results are outdated
+        graph.invalidate()
+    logger.debug("Finished operation '{}' on web app '{}'.".format(activity, webapp['name']))
+
+    return webapp
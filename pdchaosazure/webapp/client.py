@@ -1,6 +1,7 @@
 from azure.mgmt.web import WebSiteManagementClient
 
 from pdchaosazure import auth, load_secrets, load_subscription_id
+from pdchaosazure.common import throttling
 
 
 def init() -> WebSiteManagementClient:
@@ -10,6 +11,7 @@ def init() -> WebSiteManagementClient:
 
     with auth(secrets) as authentication:
         client = WebSiteManagementClient(
-            credential=authentication, subscription_id=subscription_id, base_url=base_url)
+            credential=authentication, subscription_id=subscription_id, base_url=base_url,
+            per_retry_policies=[throttling.policy(subscription_id)])
 
         return client
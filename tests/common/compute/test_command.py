@@ -1,11 +1,15 @@
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, create_autospec
 
 import pytest
 from azure.mgmt.compute import ComputeManagementClient
-from chaoslib.exceptions import InterruptExecution
+from azure.mgmt.compute.v2020_06_01.models import InstanceViewStatus, RunCommandResult, VirtualMachineRunCommand, \
+    VirtualMachineRunCommandInstanceView
+from azure.mgmt.compute.v2020_06_01.operations import VirtualMachineRunCommandsOperations, \
+    VirtualMachineScaleSetVMRunCommandsOperations
+from chaoslib.exceptions import FailedActivity, InterruptExecution
 
 from pdchaosazure.common.compute import command
-from tests.data import machine_provider
+from tests.data import machine_provider, vmss_provider
 
 
 def test_prepare_path_linux():
@@ -66,3 +70,258 @@ def test_run_for_unknown_type():
         cmd, parameters = command.prepare(machine, "stress_cpu")
         mocked_client = MagicMock(spec=ComputeManagementClient)
         command.run(machine['resourceGroup'], machine, parameters, mocked_client)
+
+
+def test_load_all_bundled_scripts_once():
+    scripts = command._scripts()
+
+    assert scripts is command._scripts()
+    assert ('network_latency', 'linux') in scripts
+    assert ('network_latency', 'windows') not in scripts
+    assert all(content for content in scripts.values())
+
+
+def test_prepare_parameters_once_per_script_os_and_arguments():
+    linux_machine = machine_provider.default()
+    windows_machine = machine_provider.default('Windows')
+
+    first = command.prepare_parameters(linux_machine, "fill_disk", duration=60, size=100, path=None)
+    second = command.prepare_parameters(machine_provider.default(), "fill_disk", duration=60, size=100, path=None)
+    windows = command.prepare_parameters(windows_machine, "fill_disk", duration=60, size=100, path=None)
+
+    assert first is second
+    assert first['command_id'] == 'RunShellScript'
+    assert {'name': 'input_path', 'value': '/root/burn'} in first['parameters']
+    assert windows['command_id'] == 'RunPowerShellScript'
+    assert {'name': 'input_path', 'value': 'C:/burn'} in windows['parameters']
+
+
+def test_prepare_parameters_omit_unset_arguments():
+    parameters = command.prepare_parameters(
+        machine_provider.default(), "stress_cpu", duration=60, load=50, cores=None, affinity=None, ramp=10)
+
+    assert {'name': 'input_load', 'value': 50} in parameters['parameters']
+    assert {'name': 'input_ramp', 'value': 10} in parameters['parameters']
+    assert not [p for p in parameters['parameters'] if p['name'] in ('input_cores', 'input_affinity')]
+
+
+def test_omit_unset_io_targets():
+    parameters = command.prepare_parameters(
+        machine_provider.default(), "burn_io", duration=60, path=None, read_percentage=70, iops=None, bandwidth=50)
+
+    names = [p['name'] for p in parameters['parameters']]
+    assert {'name': 'input_read_percentage', 'value': 70} in parameters['parameters']
+    assert {'name': 'input_bandwidth', 'value': 50} in parameters['parameters']
+    assert 'input_iops' not in names
+
+
+def test_reject_invalid_load():
+    with pytest.raises(InterruptExecution):
+        command.check_percentage('load', 0)
+    with pytest.raises(InterruptExecution):
+        command.check_percentage('load', 120)
+
+    command.check_percentage('load', 100)
+    command.check_percentage('read_percentage', 0, minimum=0)
+
+
+def test_reject_invalid_io_counts():
+    with pytest.raises(InterruptExecution, match="block_size"):
+        command.check_fault('burn_io', block_size=0)
+    with pytest.raises(InterruptExecution, match="queue_depth"):
+        command.check_fault('burn_io', queue_depth=0)
+
+    command.check_fault('burn_io', read_percentage=0, block_size=1, queue_depth=1)
+    command.check_fault('burn_io', block_size=None, queue_depth=None)
+
+
+def test_reject_invalid_choice():
+    with pytest.raises(InterruptExecution):
+        command.check_choice('space', 'used', command.FILL_SPACES)
+
+    command.check_choice('space', 'total', command.FILL_SPACES)
+
+
+def test_fail_legacy_command_with_non_zero_exit_code():
+    machine = machine_provider.default()
+    parameters = command.prepare_parameters(machine, "network_latency", duration=60)
+    mocked_client = MagicMock(spec=ComputeManagementClient)
+    poller = mocked_client.virtual_machines.begin_run_command.return_value
+    poller.done.return_value = True
+    poller.result.return_value = RunCommandResult(value=[InstanceViewStatus(
+        code='ProvisioningState/failed',
+        message="Enable failed: failed to execute command: command terminated with exit status=2\n"
+                "[stdout]\n\n[stderr]\ntc: command not found\n")])
+
+    with pytest.raises(FailedActivity, match="exit code '2'") as error:
+        command.run(machine['resourceGroup'], machine, parameters, mocked_client)
+
+    assert error.value.run_command['stderr'] == "tc: command not found"
+
+
+def test_run_managed_command():
+    machine = dict(machine_provider.default(), location='westeurope')
+    parameters = command.prepare_parameters(machine, "stress_cpu", duration=60)
+    mocked_client = MagicMock(spec=ComputeManagementClient)
+    operations = create_autospec(VirtualMachineRunCommandsOperations, instance=True)
+    mocked_client.virtual_machine_run_commands = operations
+    operations.begin_create_or_update.return_value.result.return_value.provisioning_state = 'Succeeded'
+    operations.get_by_virtual_machine.return_value.instance_view = VirtualMachineRunCommandInstanceView(
+        execution_state='Succeeded', exit_code=0, output="##metric cpu_load=80")
+    configuration = {'run_command': {
+        'managed': True, 'timeout': 300, 'output_blob_uri': 'http://127.0.0.1:10000/out/{name}/{run_command}'}}
+
+    result = command.run(machine['resourceGroup'], machine, parameters, mocked_client, configuration)
+
+    assert result['metrics'] == {'cpu_load': 80}
+    args = operations.begin_create_or_update.call_args[0]
+    assert args[1] == machine['name']
+    assert args[3]['source']['script'] == parameters['script'][0]
+    assert args[3]['timeout_in_seconds'] == 300
+    assert args[3]['output_blob_uri'] == 'http://127.0.0.1:10000/out/{}/{}'.format(machine['name'], args[2])
+    assert not args[3]['async_execution']
+    operations.get_by_virtual_machine.assert_called_once_with(
+        machine['resourceGroup'], machine['name'], args[2], expand='instanceView')
+    operations.begin_delete.assert_called_once_with(machine['resourceGroup'], machine['name'], args[2], polling=False)
+    operations.get.assert_not_called()
+    mocked_client.virtual_machines.begin_run_command.assert_not_called()
+
+
+def test_run_managed_command_on_vmss_instance():
+    instance = dict(vmss_provider.provide_instance(), location='westeurope', scale_set='chaos-pool')
+    parameters = command.prepare_parameters(instance, "stress_cpu", duration=60)
+    mocked_client = MagicMock(spec=ComputeManagementClient)
+    operations = create_autospec(VirtualMachineScaleSetVMRunCommandsOperations, instance=True)
+    mocked_client.virtual_machine_scale_set_vm_run_commands = operations
+    operations.begin_create_or_update.return_value.result.return_value.provisioning_state = 'Succeeded'
+    operations.get.return_value.instance_view = VirtualMachineRunCommandInstanceView(
+        execution_state='Succeeded', exit_code=0, output="##metric cpu_load=80")
+
+    result = command.run('rg', instance, parameters, mocked_client, {'run_command': {'managed': True}})
+
+    assert result['metrics'] == {'cpu_load': 80}
+    name = operations.begin_create_or_update.call_args[0][3]
+    operations.get.assert_called_once_with('rg', 'chaos-pool', '0', name, expand='instanceView')
+    operations.begin_delete.assert_called_once_with('rg', 'chaos-pool', '0', name, polling=False)
+
+
+def test_run_managed_command_asynchronously():
+    machine = dict(machine_provider.default(), location='westeurope')
+    parameters = command.prepare_parameters(machine, "stress_cpu", duration=60)
+    mocked_client = MagicMock(spec=ComputeManagementClient)
+    operations = create_autospec(VirtualMachineRunCommandsOperations, instance=True)
+    mocked_client.virtual_machine_run_commands = operations
+    operations.begin_create_or_update.return_value.result.return_value.provisioning_state = 'Succeeded'
+    operations.begin_create_or_update.return_value.result.return_value.instance_view = None
+
+    result = command.run(machine['resourceGroup'], machine, parameters, mocked_client,
+                         {'run_command': {'managed': True, 'async_execution': True}})
+
+    assert result['execution_state'] == 'Running'
+
+    assert operations.begin_create_or_update.call_args[0][3]['async_execution']
+    operations.get_by_virtual_machine.assert_not_called()
+    operations.begin_delete.assert_not_called()
+
+
+def test_fail_managed_command():
+    machine = dict(machine_provider.default(), location='westeurope')
+    parameters = command.prepare_parameters(machine, "stress_cpu", duration=60)
+    mocked_client = MagicMock(spec=ComputeManagementClient)
+    operations = create_autospec(VirtualMachineRunCommandsOperations, instance=True)
+    mocked_client.virtual_machine_run_commands = operations
+    operations.begin_create_or_update.return_value.result.return_value.provisioning_state = 'Succeeded'
+    operations.get_by_virtual_machine.return_value.instance_view = VirtualMachineRunCommandInstanceView(
+        execution_state='Failed', exit_code=1, error="stress: not found")
+
+    with pytest.raises(FailedActivity, match="exit code '1'") as error:
+        command.run(machine['resourceGroup'], machine, parameters, mocked_client, {'run_command': {'managed': True}})
+
+    assert error.value.run_command['exit_code'] == 1
+    assert error.value.run_command['stderr'] == "stress: not found"
+    name = operations.begin_create_or_update.call_args[0][2]
+    operations.get_by_virtual_machine.assert_called_once_with(
+        machine['resourceGroup'], machine['name'], name, expand='instanceView')
+    operations.begin_delete.assert_called_once_with(machine['resourceGroup'], machine['name'], name, polling=False)
+
+
+def test_delete_managed_commands():
+    machine = machine_provider.default()
+    mocked_client = MagicMock(spec=ComputeManagementClient)
+    operations = create_autospec(VirtualMachineRunCommandsOperations, instance=True)
+    mocked_client.virtual_machine_run_commands = operations
+    operations.list_by_virtual_machine.return_value = [
+        VirtualMachineRunCommand(location='westeurope'), VirtualMachineRunCommand(location='westeurope')]
+    operations.list_by_virtual_machine.return_value[0].name = 'pdchaosazure-0123456789ab'
+    operations.list_by_virtual_machine.return_value[1].name = 'deployment'
+
+    result = command.delete_managed(machine['resourceGroup'], machine, mocked_client)
+
+    assert result == ['pdchaosazure-0123456789ab']
+    operations.list_by_virtual_machine.assert_called_once_with(machine['resourceGroup'], machine['name'])
+    operations.begin_delete.assert_called_once_with(
+        machine['resourceGroup'], machine['name'], 'pdchaosazure-0123456789ab', polling=False)
+
+
+def test_prepare_timeline():
+    timeline = [{'fault': 'stress_cpu', 'duration': 60},
+                {'fault': 'network_latency', 'start': 30, 'duration': 60, 'delay': 500},
+                {'fault': 'fill_disk', 'size': 10}]
+
+    parameters = command.prepare_timeline(machine_provider.default(), timeline)
+
+    script = parameters['script'][0]
+    assert parameters['command_id'] == 'RunShellScript'
+    assert parameters['parameters'] == []
+    assert "sleep 30\ninput_delay=500" in script
+    assert "sleep 90\ninput_duration=120\ninput_path=/root/burn_2\ninput_size=10" in script
+    assert script.endswith("wait\n")
+    assert command.timeline_duration(timeline) == 210
+
+
+def test_prepare_own_default_path_per_fault_in_timeline():
+    timeline = [{'fault': 'burn_io'}, {'fault': 'fill_disk', 'start': 0}]
+
+    script = command.prepare_timeline(machine_provider.default(), timeline)['script'][0]
+
+    assert "input_path=/root/burn_0" in script
+    assert "input_path=/root/burn_1" in script
+
+
+def test_reject_colliding_paths_in_timeline():
+    with pytest.raises(InterruptExecution, match="several faults"):
+        command.timeline_duration([{'fault': 'burn_io', 'path': '/tmp/burn'},
+                                   {'fault': 'fill_disk', 'path': '/tmp/burn'}])
+
+
+def test_prepare_timeline_for_windows_machine():
+    windows_machine = machine_provider.default('Windows')
+
+    parameters = command.prepare_timeline(windows_machine, [{'fault': 'burn_io', 'path': "C:/it's"}])
+
+    assert parameters['command_id'] == 'RunPowerShellScript'
+    assert "input_duration=60; input_path='C:/it''s'; input_queue_depth=16" in parameters['script'][0]
+    with pytest.raises(InterruptExecution):
+        command.prepare_timeline(windows_machine, [{'fault': 'network_latency'}])
+
+
+def test_reject_unknown_fault_in_timeline():
+    with pytest.raises(InterruptExecution):
+        command.timeline_duration([{'fault': 'stress_gpu'}])
+    with pytest.raises(InterruptExecution):
+        command.timeline_duration([])
+
+
+def test_reject_invalid_arguments_of_faults_in_timeline():
+    machine = machine_provider.default()
+
+    with pytest.raises(InterruptExecution):
+        command.prepare_timeline(machine, [{'fault': 'stress_cpu', 'load': 150}])
+    with pytest.raises(InterruptExecution):
+        command.prepare_timeline(machine, [{'fault': 'burn_io', 'read_percentage': -1}])
+    with pytest.raises(InterruptExecution):
+        command.timeline_duration([{'fault': 'stress_memory', 'percentage': 0}])
+    with pytest.raises(InterruptExecution):
+        command.timeline_duration([{'fault': 'fill_disk', 'space': 'used'}])
+    with pytest.raises(InterruptExecution):
+        command.timeline_duration([{'fault': 'fill_disk', 'mode': 'sparse'}])
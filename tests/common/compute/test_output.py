@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from azure.mgmt.compute.v2020_06_01.models import InstanceViewStatus, RunCommandResult, \
+    VirtualMachineRunCommandInstanceView
+
+from pdchaosazure.common.compute import output
+
+SUBMITTED_AT = datetime(2020, 6, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def test_capture_legacy_linux_result():
+    result = RunCommandResult(value=[InstanceViewStatus(
+        code='ProvisioningState/succeeded',
+        message="Enable succeeded: \n[stdout]\nfilled\n##metric bytes_written=1048576\n\n[stderr]\nwarning\n")])
+
+    record = output.from_legacy(result, SUBMITTED_AT, SUBMITTED_AT + timedelta(seconds=42))
+
+    assert record['execution_state'] == output.STATE_SUCCEEDED
+    assert record['exit_code'] == 0
+    assert record['stdout'] == "filled\n##metric bytes_written=1048576"
+    assert record['stderr'] == "warning"
+    assert record['metrics'] == {'bytes_written': 1048576.0}
+    assert record['duration'] == 42
+    assert record['queue_time'] is None
+
+
+def test_capture_failed_legacy_linux_result():
+    result = RunCommandResult(value=[InstanceViewStatus(
+        code='ProvisioningState/failed',
+        message="Enable failed: failed to execute command: command terminated with exit status=2\n"
+                "[stdout]\n\n[stderr]\ntc: command not found\n")])
+
+    record = output.from_legacy(result, SUBMITTED_AT, SUBMITTED_AT)
+
+    assert record['execution_state'] == output.STATE_FAILED
+    assert record['exit_code'] == 2
+    assert record['stderr'] == "tc: command not found"
+
+
+def test_capture_legacy_windows_result():
+    result = RunCommandResult(value=[
+        InstanceViewStatus(code='ComponentStatus/StdOut/succeeded', message="##metric cpu_load=74.5"),
+        InstanceViewStatus(code='ComponentStatus/StdErr/succeeded', message="")])
+
+    record = output.from_legacy(result, SUBMITTED_AT, SUBMITTED_AT)
+
+    assert record['exit_code'] is None
+    assert record['metrics'] == {'cpu_load': 74.5}
+
+
+def test_capture_managed_result():
+    view = VirtualMachineRunCommandInstanceView(
+        execution_state='Succeeded', exit_code=0, output="done", error="",
+        start_time=SUBMITTED_AT + timedelta(seconds=5), end_time=SUBMITTED_AT + timedelta(seconds=65))
+
+    record = output.from_instance_view('pdchaosazure-1', view, SUBMITTED_AT, SUBMITTED_AT + timedelta(seconds=70))
+
+    assert record['name'] == 'pdchaosazure-1'
+    assert record['queue_time'] == 5
+    assert record['execution_time'] == 60
+    assert record['duration'] == 70
+
+
+def test_capture_pending_managed_result():
+    record = output.from_instance_view('pdchaosazure-1', None, SUBMITTED_AT, SUBMITTED_AT)
+
+    assert record['execution_state'] == output.STATE_RUNNING
+    assert record['metrics'] == {}
+
+
+def test_capture_last_value_of_metrics():
+    assert output.metrics("##metric a=1\nno metric\n##metric a=-2.5e3\n##metric b=x") == {'a': -2500.0}
+
+
+def test_ignore_missing_times():
+    view = MagicMock(execution_state='Running', exit_code=None, output=None, error=None, start_time=None,
+                     end_time=None)
+
+    assert output.from_instance_view('n', view, SUBMITTED_AT, SUBMITTED_AT)['execution_time'] is None
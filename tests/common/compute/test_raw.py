@@ -0,0 +1,62 @@
+import json
+from unittest.mock import MagicMock
+
+from azure.mgmt.compute.models import VirtualMachineScaleSetVM
+
+from pdchaosazure.common.compute import raw
+from tests.data import vmss_provider
+
+
+def provide_raw_instance():
+    model = VirtualMachineScaleSetVM.from_dict(vmss_provider.provide_instance_real_sample())
+    return model, json.loads(json.dumps(model.serialize(keep_readonly=True)))
+
+
+def provide_response(page: dict):
+    response = MagicMock()
+    response.http_response.status_code = 200
+    response.http_response.body.return_value = json.dumps(page).encode()
+    return response
+
+
+def test_normalize_like_as_dict():
+    model, raw_instance = provide_raw_instance()
+
+    assert raw.normalize(raw_instance) == model.as_dict()
+
+
+def test_name_colliding_properties_like_as_dict():
+    model, raw_instance = provide_raw_instance()
+    # the listing of an instance may leave out the read-only keys of its extensions
+    for extension in raw_instance['resources']:
+        del extension['type']
+    model.resources[0].type = None
+    model.resources[1].type = None
+
+    result = raw.normalize(raw_instance)
+
+    assert result['resources'] == model.as_dict()['resources']
+    assert 'type_properties_type' in result['resources'][0]
+    assert 'type' not in result['resources'][0]
+
+
+def test_keep_tags_as_is():
+    _, raw_instance = provide_raw_instance()
+
+    result = raw.normalize(raw_instance)
+
+    assert result['tags']['aksEngineVersion'] == raw_instance['tags']['aksEngineVersion']
+
+
+def test_list_vmss_instances_page_by_page():
+    _, raw_instance = provide_raw_instance()
+    client = MagicMock()
+    client._client._pipeline.run.side_effect = [
+        provide_response({'value': [raw_instance], 'nextLink': 'https://next'}),
+        provide_response({'value': [raw_instance]})]
+
+    pages = list(raw.list_vmss_instances('group', 'chaos-pool', client))
+
+    assert len(pages) == 2
+    assert pages[0][0]['instance_id'] == '0'
+    assert client._client.get.call_args_list[1].args[0] == 'https://next'
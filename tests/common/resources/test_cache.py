@@ -0,0 +1,32 @@
+import time
+
+from pdchaosazure.common.resources.cache import QueryCache
+
+
+def test_get_cached_results_within_ttl():
+    cache = QueryCache()
+    cache.put('query', [{'name': 'vmachine1'}], 10)
+
+    assert cache.get('query', 60) == [{'name': 'vmachine1'}]
+    assert cache.get('unknown', 60) is None
+
+
+def test_expire_cached_results_after_ttl():
+    cache = QueryCache()
+    cache.put('query', [{'name': 'vmachine1'}], 10)
+    time.sleep(0.02)
+
+    assert cache.get('query', 0.01) is None
+    assert len(cache) == 0
+
+
+def test_evict_least_recently_used_results():
+    cache = QueryCache()
+    cache.put('first', [], 2)
+    cache.put('second', [], 2)
+    cache.get('first', 60)
+    cache.put('third', [], 2)
+
+    assert cache.get('first', 60) == []
+    assert cache.get('second', 60) is None
+    assert cache.get('third', 60) == []
@@ -1,8 +1,10 @@
 from unittest.mock import patch
 
 import pytest
+from azure.mgmt.resourcegraph.models import QueryResponse
 from chaoslib.exceptions import FailedActivity
 
+from pdchaosazure.common.resources import graph
 from pdchaosazure.common.resources.graph import fetch_resources
 from tests.data import config_provider, secrets_provider, graph_provider
 
@@ -30,3 +32,129 @@ def test_sadly_fetch_empty_resources(mocked_graph_client):
 
     with pytest.raises(FailedActivity):
         fetch_resources("", "Microsoft.Compute/virtualMachines", secrets, config)
+
+
+@patch('pdchaosazure.common.resources.graph.init_client', autospec=True)
+def test_happily_fetch_cached_resources(mocked_graph_client):
+    secrets = secrets_provider.provide_secrets_germany()
+    config = dict(config_provider.provide_default_config(), resource_graph_cache={'ttl': 60})
+    graph.invalidate()
+
+    mocked_graph_client.return_value.resources.return_value.data = graph_provider.default()
+
+    first = fetch_resources("where name=='vmachine1'", "Microsoft.Compute/virtualMachines", secrets, config)
+    del first[0]['properties']
+    second = fetch_resources("where name=='vmachine1'", "Microsoft.Compute/virtualMachines", secrets, config)
+
+    assert mocked_graph_client.return_value.resources.call_count == 1
+    assert 'properties' in second[0]
+
+    graph.invalidate()
+    fetch_resources("where name=='vmachine1'", "Microsoft.Compute/virtualMachines", secrets, config)
+
+    assert mocked_graph_client.return_value.resources.call_count == 2
+
+
+@patch('pdchaosazure.common.resources.graph.init_client', autospec=True)
+def test_happily_skip_cache_for_sampling_queries(mocked_graph_client):
+    secrets = secrets_provider.provide_secrets_germany()
+    config = dict(config_provider.provide_default_config(), resource_graph_cache={'ttl': 60})
+    graph.invalidate()
+
+    mocked_graph_client.return_value.resources.return_value.data = graph_provider.default()
+
+    fetch_resources(None, "Microsoft.Compute/virtualMachines", secrets, config)
+    fetch_resources(None, "Microsoft.Compute/virtualMachines", secrets, config)
+
+    assert mocked_graph_client.return_value.resources.call_count == 2
+
+
+@patch('pdchaosazure.common.resources.graph.init_client', autospec=True)
+def test_happily_fetch_resources_as_object_array(mocked_graph_client):
+    secrets = secrets_provider.provide_secrets_germany()
+    config = config_provider.provide_default_config()
+
+    mocked_graph_client.return_value.resources.return_value.data = [{'name': 'vmachine1', 'resourceGroup': 'group'}]
+
+    resources = fetch_resources("", "Microsoft.Compute/virtualMachines", secrets, config)
+
+    assert resources == [{'name': 'vmachine1', 'resourceGroup': 'group'}]
+    assert mocked_graph_client.return_value.resources.call_args.args[0].options.result_format == 'objectArray'
+
+
+def __page(names, requester, skip_token=None, truncated='false'):
+    rows = [{'name': name, 'type': 'microsoft.compute/virtualmachines', 'pdchaosazure_requester': requester}
+            for name in names]
+    return QueryResponse(total_records=len(rows), count=len(rows), result_truncated=truncated, data=rows,
+                         skip_token=skip_token)
+
+
+@patch('pdchaosazure.common.resources.graph.init_client', autospec=True)
+def test_happily_prefetch_resources_with_one_request(mocked_graph_client):
+    secrets = secrets_provider.provide_secrets_germany()
+    config = dict(config_provider.provide_default_config(), resource_graph_cache={'ttl': 60})
+    graph.invalidate()
+
+    mocked_graph_client.return_value.resources.return_value = __page(['vmachine1'], 1)
+
+    requests = [("Microsoft.Web/sites", "where name=='app'"),
+                ("Microsoft.Compute/virtualMachines", "where name=='vmachine1'")]
+    results = graph.prefetch(requests, secrets, config)
+
+    assert results[0] == []
+    assert results[1][0]['name'] == 'vmachine1'
+    assert 'pdchaosazure_requester' not in results[1][0]
+
+    fetch_resources("where name=='vmachine1'", "Microsoft.Compute/virtualMachines", secrets, config)
+    assert mocked_graph_client.return_value.resources.call_count == 1
+
+
+@patch('pdchaosazure.common.resources.graph.init_client', autospec=True)
+def test_happily_prefetch_all_pages(mocked_graph_client):
+    secrets = secrets_provider.provide_secrets_germany()
+    config = config_provider.provide_default_config()
+
+    mocked_graph_client.return_value.resources.side_effect = [
+        __page(['vmachine1'], 0, skip_token='next'), __page(['vmachine2'], 0)]
+
+    results = graph.prefetch([("Microsoft.Compute/virtualMachines", "where true")], secrets, config)
+
+    assert [r['name'] for r in results[0]] == ['vmachine1', 'vmachine2']
+    assert mocked_graph_client.return_value.resources.call_args[0][0].options.skip_token == 'next'
+
+
+@patch('pdchaosazure.common.resources.graph.init_client', autospec=True)
+def test_happily_skip_cache_for_truncated_prefetch(mocked_graph_client):
+    secrets = secrets_provider.provide_secrets_germany()
+    config = dict(config_provider.provide_default_config(), resource_graph_cache={'ttl': 60})
+    graph.invalidate()
+
+    mocked_graph_client.return_value.resources.side_effect = [
+        __page(['vmachine1'], 0, truncated='true'), __page(['vmachine1', 'vmachine2'], 0)]
+
+    graph.prefetch([("Microsoft.Compute/virtualMachines", "where true")], secrets, config)
+    resources = fetch_resources("where true", "Microsoft.Compute/virtualMachines", secrets, config)
+
+    assert len(resources) == 2
+    assert mocked_graph_client.return_value.resources.call_count == 2
+
+
+@patch('pdchaosazure.common.resources.graph.init_client', autospec=True)
+def test_happily_prefetch_configured_pairs_on_first_fetch(mocked_graph_client):
+    secrets = secrets_provider.provide_secrets_germany()
+    prefetch = [{'type': "Microsoft.Compute/virtualMachines", 'filter': "where name=='vmachine1'"},
+                {'type': "Microsoft.Web/sites", 'filter': "where name=='app'"}]
+    config = dict(config_provider.provide_default_config(), resource_graph_cache={'ttl': 60, 'prefetch': prefetch})
+    graph.invalidate()
+
+    response = __page(['vmachine1'], 0)
+    response.data.append({'name': 'app', 'type': 'microsoft.web/sites', 'pdchaosazure_requester': 1})
+    mocked_graph_client.return_value.resources.return_value = response
+
+    machines = fetch_resources("where name=='vmachine1'", "Microsoft.Compute/virtualMachines", secrets, config)
+    webapps = fetch_resources("where name=='app'", "Microsoft.Web/sites", secrets, config)
+
+    assert machines[0]['name'] == 'vmachine1'
+    assert webapps[0]['name'] == 'app'
+    assert " | union (" in mocked_graph_client.return_value.resources.call_args[0][0].query
+    assert mocked_graph_client.return_value.resources.call_count == 1
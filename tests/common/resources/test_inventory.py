@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+from chaoslib.exceptions import FailedActivity
+
+from pdchaosazure.common.resources import inventory
+from pdchaosazure.common.resources.graph import fetch_resources
+from pdchaosazure.common.resources.inventory import Inventory
+from tests.data import config_provider, secrets_provider
+
+VM_TYPE = "Microsoft.Compute/virtualMachines"
+
+
+def __vm(name, resource_group='rg', zones=None, power_state='PowerState/running', tags=None):
+    return {
+        'id': "/subscriptions/1/resourceGroups/{}/providers/Microsoft.Compute/virtualMachines/{}".format(
+            resource_group, name),
+        'type': 'microsoft.compute/virtualmachines', 'name': name, 'resourceGroup': resource_group,
+        'location': 'westeurope', 'zones': zones, 'tags': tags,
+        'properties': {'extended': {'instanceView': {'powerState': {'code': power_state}}}}}
+
+
+def __responses(*pages):
+    responses = []
+    for page in pages:
+        response = MagicMock()
+        response.data, response.skip_token = page
+        responses.append(response)
+    return responses
+
+
+@patch('pdchaosazure.common.resources.inventory.load_subscription_id', return_value='1')
+@patch('pdchaosazure.common.resources.inventory.init_client', autospec=True)
+def test_happily_bootstrap_and_select(mocked_client, _, tmp_path):
+    mocked_client.return_value.resources.side_effect = __responses(
+        ([__vm('vm1', zones=['1']), __vm('vm2', tags={'env': 'prod'})], 'token'),
+        ([__vm('vm3', resource_group='other', power_state='PowerState/deallocated')], None))
+    store = Inventory(str(tmp_path / 'inventory.sqlite'))
+
+    store.sync(VM_TYPE, {})
+
+    assert len(store) == 3
+    assert mocked_client.return_value.resources.call_count == 2
+    assert [r['name'] for r in store.select(VM_TYPE, "where resourceGroup=='rg'")] == ['vm1', 'vm2']
+    assert [r['name'] for r in store.select(VM_TYPE, "where zone=='1'")] == ['vm1']
+    assert [r['name'] for r in store.select(VM_TYPE, "where powerState=='PowerState/deallocated'")] == ['vm3']
+    assert [r['name'] for r in store.select(VM_TYPE, "where name=='vm1' or name=='vm2' | take 1")] == ['vm1']
+    assert [r['name'] for r in store.select(VM_TYPE, tags={'env': 'prod'})] == ['vm2']
+    assert [r['name'] for r in store.select(VM_TYPE, "where tags.env=='prod' | take 10")] == ['vm2']
+    assert len(store.select(VM_TYPE)) == 1
+
+
+@patch('pdchaosazure.common.resources.inventory.load_subscription_id', return_value='1')
+@patch('pdchaosazure.common.resources.inventory.init_client', autospec=True)
+def test_happily_sync_changes(mocked_client, _, tmp_path):
+    now = datetime(2020, 6, 1, tzinfo=timezone.utc)
+    vm1, vm2, vm3 = __vm('vm1'), __vm('vm2'), __vm('vm3')
+    mocked_client.return_value.resources.side_effect = __responses(
+        ([vm1, vm2], None),
+        ([{'targetResourceId': vm1['id'], 'changeType': 'Delete'},
+          {'targetResourceId': vm2['id'], 'changeType': 'Update'},
+          {'targetResourceId': vm3['id'], 'changeType': 'Create'}], None),
+        ([dict(vm2, location='northeurope'), vm3], None))
+    store = Inventory(str(tmp_path / 'inventory.sqlite'))
+
+    store.sync(VM_TYPE, {}, now)
+    store.sync(VM_TYPE, {}, now + timedelta(minutes=10))
+
+    changes_query = mocked_client.return_value.resources.call_args_list[1][0][0].query
+    assert changes_query.startswith("resourcechanges")
+    assert "datetime(2020-05-31T23:55:00Z)" in changes_query
+    assert store.synced_at(VM_TYPE) == now + timedelta(minutes=10)
+    assert [r['name'] for r in store.select(VM_TYPE, "where location=='northeurope'")] == ['vm2']
+    assert [r['name'] for r in store.select(VM_TYPE, "take 10")] == ['vm2', 'vm3']
+
+
+@patch('pdchaosazure.common.resources.inventory.load_subscription_id', return_value='1')
+@patch('pdchaosazure.common.resources.inventory.init_client', autospec=True)
+def test_happily_apply_last_change_of_recreated_resource(mocked_client, _, tmp_path):
+    now = datetime(2020, 6, 1, tzinfo=timezone.utc)
+    vm1, vm2 = __vm('vm1'), __vm('vm2')
+    mocked_client.return_value.resources.side_effect = __responses(
+        ([vm1, vm2], None),
+        ([{'targetResourceId': vm1['id'], 'changeType': 'Create', 'changeTime': '2020-06-01T00:04:00Z'},
+          {'targetResourceId': vm1['id'], 'changeType': 'Delete', 'changeTime': '2020-06-01T00:02:00Z'},
+          {'targetResourceId': vm2['id'], 'changeType': 'Delete', 'changeTime': '2020-06-01T00:03:00Z'},
+          {'targetResourceId': vm2['id'], 'changeType': 'Update', 'changeTime': '2020-06-01T00:01:00Z'}], None),
+        ([dict(vm1, location='northeurope')], None))
+    store = Inventory(str(tmp_path / 'inventory.sqlite'))
+
+    store.sync(VM_TYPE, {}, now)
+    store.sync(VM_TYPE, {}, now + timedelta(minutes=10))
+
+    assert "'{}'".format(vm1['id']) in mocked_client.return_value.resources.call_args[0][0].query
+    assert [r['name'] for r in store.select(VM_TYPE, "take 10")] == ['vm1']
+    assert store.select(VM_TYPE, "take 10")[0]['location'] == 'northeurope'
+
+
+@patch('pdchaosazure.common.resources.inventory.load_subscription_id', return_value='1')
+@patch('pdchaosazure.common.resources.inventory.init_client', autospec=True)
+def test_happily_fetch_resources_from_inventory(mocked_client, _, tmp_path):
+    secrets = secrets_provider.provide_secrets_germany()
+    config = dict(config_provider.provide_default_config(), inventory={'path': str(tmp_path / 'inventory.sqlite')})
+    mocked_client.return_value.resources.side_effect = __responses(([__vm('vm1')], None))
+
+    resources = fetch_resources("where name=='vm1'", VM_TYPE, secrets, config)
+
+    assert resources[0]['name'] == 'vm1'
+    with pytest.raises(FailedActivity):
+        mocked_client.return_value.resources.side_effect = __responses(([], None))
+        fetch_resources("where name=='vm2'", VM_TYPE, secrets, config)
+
+
+@patch('pdchaosazure.common.resources.graph.init_client', autospec=True)
+@patch('pdchaosazure.common.resources.inventory.load_subscription_id', return_value='1')
+@patch('pdchaosazure.common.resources.inventory.init_client', autospec=True)
+def test_happily_fetch_resources_from_inventory_with_kusto_operators(mocked_client, _, mocked_graph_client, tmp_path):
+    secrets = secrets_provider.provide_secrets_germany()
+    config = dict(config_provider.provide_default_config(), inventory={'path': str(tmp_path / 'inventory.sqlite')})
+    mocked_client.return_value.resources.side_effect = __responses(
+        ([__vm('web1', resource_group='RG', tags={'env': 'prod'}), __vm('db1')], None), ([], None), ([], None))
+
+    assert [r['name'] for r in fetch_resources("where resourceGroup=~'rg'", VM_TYPE, secrets, config)] == \
+        ['web1', 'db1']
+    assert [r['name'] for r in fetch_resources("where name contains 'WEB'", VM_TYPE, secrets, config)] == ['web1']
+    assert [r['name'] for r in fetch_resources("where tags.env=='prod'", VM_TYPE, secrets, config)] == ['web1']
+    mocked_graph_client.assert_not_called()
+
+
+@patch('pdchaosazure.common.resources.graph.init_client', autospec=True)
+@patch('pdchaosazure.common.resources.inventory.init_client', autospec=True)
+def test_happily_fall_back_to_resource_graph_for_unsupported_filter(mocked_client, mocked_graph_client, tmp_path):
+    secrets = secrets_provider.provide_secrets_germany()
+    config = dict(config_provider.provide_default_config(), inventory={'path': str(tmp_path / 'inventory.sqlite')})
+    mocked_graph_client.return_value.resources.return_value.data = [__vm('vm1')]
+
+    resources = fetch_resources("where name startswith 'vm'", VM_TYPE, secrets, config)
+
+    assert resources[0]['name'] == 'vm1'
+    assert "where name startswith 'vm'" in mocked_graph_client.return_value.resources.call_args[0][0].query
+    mocked_client.assert_not_called()
+
+
+def test_split_indexed_where_clause():
+    assert inventory._split_indexed("where name=='a' and zone=='1' | take 2") == (
+        [('name', 'a'), ('zone', '1')], {}, "take 2")
+    assert inventory._split_indexed("where tags.env=='prod' and name=='a'") == ([('name', 'a')], {'env': 'prod'}, "")
+    assert inventory._split_indexed("where name=='a' or name=='b'") == ([], {}, "where name=='a' or name=='b'")
+    assert inventory._split_indexed("where vm_size=='b1'") == ([], {}, "where vm_size=='b1'")
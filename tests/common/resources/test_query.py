@@ -18,3 +18,13 @@ def test_create_query_with_filled_user_query():
     query_request = query.create_request(resource_type, user_query, config)
 
     assert query_request.query == "Resources | where type=~'{}' | sample 2".format(resource_type)
+
+
+def test_create_union_query():
+    config = config_provider.provide_default_config()
+    requests = [("virtualMachine", "where name=='vm'"), ("webApp", None)]
+    query_request = query.create_union_request(requests, config)
+
+    assert query_request.query == \
+        "Resources | where type=~'virtualMachine' | where name=='vm' | extend pdchaosazure_requester=0" \
+        " | union (Resources | where type=~'webApp' | sample 1 | extend pdchaosazure_requester=1)"
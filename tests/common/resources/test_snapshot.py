@@ -0,0 +1,96 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from azure.mgmt.compute.v2020_06_01.models import VirtualMachineScaleSetVM
+from chaoslib.exceptions import FailedActivity
+
+from pdchaosazure.common.resources import snapshot
+from pdchaosazure.common.resources.graph import fetch_resources
+from pdchaosazure.vmss.fetcher import fetch_instances
+from tests.data import config_provider, secrets_provider
+
+VMSS_ID = "/subscriptions/1/resourceGroups/rg/providers/Microsoft.Compute/virtualMachineScaleSets/vmss1"
+
+
+def __record(tmp_path):
+    path = str(tmp_path / 'snapshot.jsonl')
+    snapshot.record(path, [
+        {'id': VMSS_ID, 'type': 'microsoft.compute/virtualmachinescalesets', 'name': 'vmss1', 'resourceGroup': 'rg'},
+        {'id': '/subscriptions/1/resourceGroups/rg/providers/Microsoft.Compute/virtualMachines/vm1',
+         'type': 'microsoft.compute/virtualmachines', 'name': 'vm1', 'resourceGroup': 'rg', 'tags': {'env': 'prod'}},
+    ])
+    snapshot.record(path, [
+        {'id': "{}/virtualMachines/{}".format(VMSS_ID, i), 'instance_id': str(i), 'name': 'vmss1_{}'.format(i),
+         'type': 'Microsoft.Compute/virtualMachineScaleSets/virtualMachines'} for i in range(3)])
+    return path
+
+
+def test_happily_fetch_resources_from_snapshot(tmp_path):
+    secrets = secrets_provider.provide_secrets_germany()
+    config = dict(config_provider.provide_default_config(), snapshot={'path': __record(tmp_path)})
+
+    resources = fetch_resources("where name=='vm1'", "Microsoft.Compute/virtualMachines", secrets, config)
+
+    assert [r['name'] for r in resources] == ['vm1']
+    with pytest.raises(FailedActivity):
+        fetch_resources("where name=='vm2'", "Microsoft.Compute/virtualMachines", secrets, config)
+
+
+def test_happily_fetch_vmss_instances_from_snapshot(tmp_path):
+    config = dict(config_provider.provide_default_config(), snapshot={'path': __record(tmp_path)})
+    vmss = {'id': VMSS_ID, 'name': 'vmss1', 'resourceGroup': 'rg'}
+
+    instances = list(fetch_instances(vmss, "where instance_id=='1' or instance_id=='2'", None, None, config))
+
+    assert [i['name'] for i in instances] == ['vmss1_1', 'vmss1_2']
+    assert instances[0]['scale_set'] == 'vmss1'
+
+
+def test_happily_reindex_a_rerecorded_snapshot(tmp_path):
+    path = __record(tmp_path)
+    assert len(list(snapshot.read(path, "Microsoft.Compute/virtualMachines"))) == 1
+
+    snapshot.record(path, [{'id': 'vm2', 'type': 'Microsoft.Compute/virtualMachines', 'name': 'vm2'}])
+
+    assert [r['name'] for r in snapshot.read(path, "Microsoft.Compute/virtualMachines")] == ['vm1', 'vm2']
+
+
+def test_happily_fetch_resources_from_snapshot_with_kusto_operators(tmp_path):
+    secrets = secrets_provider.provide_secrets_germany()
+    config = dict(config_provider.provide_default_config(), snapshot={'path': __record(tmp_path)})
+
+    for user_query in ("where resourceGroup=~'RG'", "where name contains 'VM'", "where tags.env=='prod'"):
+        resources = fetch_resources(user_query, "Microsoft.Compute/virtualMachines", secrets, config)
+        assert [r['name'] for r in resources] == ['vm1']
+
+
+@patch('pdchaosazure.common.resources.graph.init_client', autospec=True)
+def test_happily_record_fetched_resources_once(mocked_graph_client, tmp_path):
+    secrets = secrets_provider.provide_secrets_germany()
+    path = str(tmp_path / 'snapshot.jsonl')
+    config = dict(config_provider.provide_default_config(), snapshot={'path': path, 'record': True})
+    mocked_graph_client.return_value.resources.return_value.data = [
+        {'id': 'vm1', 'type': 'microsoft.compute/virtualmachines', 'name': 'vm1'}]
+
+    fetch_resources("where name=='vm1'", "Microsoft.Compute/virtualMachines", secrets, config)
+    fetch_resources("where name=='vm1'", "Microsoft.Compute/virtualMachines", secrets, config)
+
+    assert mocked_graph_client.return_value.resources.call_count == 2
+    assert [r['name'] for r in snapshot.read(path, "Microsoft.Compute/virtualMachines")] == ['vm1']
+
+
+def test_happily_record_listed_vmss_instances(tmp_path):
+    path = str(tmp_path / 'snapshot.jsonl')
+    config = dict(config_provider.provide_default_config(), snapshot={'path': path, 'record': True})
+    vmss = {'id': VMSS_ID, 'name': 'vmss1', 'resourceGroup': 'rg'}
+    client = MagicMock()
+    client.virtual_machine_scale_set_vms.list.return_value.by_page.return_value = [[
+        VirtualMachineScaleSetVM.deserialize({
+            'id': "{}/virtualMachines/{}".format(VMSS_ID, i), 'instanceId': str(i), 'name': 'vmss1_{}'.format(i),
+            'type': 'Microsoft.Compute/virtualMachineScaleSets/virtualMachines', 'location': 'westeurope'})
+        for i in range(2)]]
+
+    assert len(list(fetch_instances(vmss, "take 10", client, None, config))) == 2
+
+    replayed = list(fetch_instances(vmss, "where instance_id=='1'", None, None, dict(config, snapshot={'path': path})))
+    assert [i['name'] for i in replayed] == ['vmss1_1']
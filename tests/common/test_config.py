@@ -57,3 +57,24 @@ def test_load_implicit_timeout_from_experiment_dict():
 
     # assert
     assert timeout == 600
+
+
+def test_load_implicit_failure_mode_from_experiment_dict():
+    # act
+    failure_mode = config.load_failure_mode({})
+
+    # assert
+    assert failure_mode == config.FAILURE_MODE_FAIL_FAST
+
+
+def test_load_explicit_failure_mode_from_experiment_dict():
+    # arrange
+    experiment_configuration = {
+        "failure_mode": "collect_all"
+    }
+
+    # act
+    failure_mode = config.load_failure_mode(experiment_configuration)
+
+    # assert
+    assert failure_mode == config.FAILURE_MODE_COLLECT_ALL
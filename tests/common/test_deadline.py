@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+from chaoslib.exceptions import FailedActivity, InterruptExecution
+
+from pdchaosazure.common.deadline import Deadline
+
+
+def test_remaining_time_of_deadline():
+    deadline = Deadline(60)
+
+    assert 59 < deadline.remaining() <= 60
+    assert not deadline.expired()
+    deadline.check('stop')
+
+
+def test_expired_deadline():
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+
+    assert deadline.remaining() == 0
+    assert deadline.expired()
+    with pytest.raises(FailedActivity, match="Operation 'stop' exceeded the timeout of 0.01 seconds"):
+        deadline.check('stop')
+
+
+class PendingPoller:
+    def done(self):
+        return False
+
+    def wait(self, timeout=None):
+        time.sleep(timeout)
+
+    def continuation_token(self):
+        return "token"
+
+
+def test_cancelled_deadline():
+    deadline = Deadline(60)
+    deadline.cancel()
+
+    assert deadline.cancelled()
+    with pytest.raises(InterruptExecution, match="Operation 'stop' was cancelled"):
+        deadline.check('stop')
+
+
+def test_hand_off_continuation_token_on_cancel():
+    deadline = Deadline(60)
+    threading.Timer(0.1, deadline.cancel).start()
+
+    start = time.monotonic()
+    with pytest.raises(InterruptExecution) as e:
+        deadline.wait(PendingPoller(), 'stop')
+
+    assert time.monotonic() - start < 2
+    assert e.value.continuation_token == "token"
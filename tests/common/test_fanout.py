@@ -0,0 +1,214 @@
+import threading
+import time
+
+import pytest
+from azure.core.exceptions import HttpResponseError
+from chaoslib.exceptions import FailedActivity, InterruptExecution
+
+from pdchaosazure.common import cleanse, fanout
+from pdchaosazure.common.deadline import Deadline
+
+COLLECT_ALL = {"failure_mode": "collect_all"}
+
+
+def provide_targets(count: int):
+    return [{'name': 'machine_{}'.format(i), 'properties': {}} for i in range(count)]
+
+
+def operate(target):
+    if target['name'] == 'machine_1':
+        raise HttpResponseError(message="Instance is in a transitional state")
+
+    return target
+
+
+def test_record_all_affected_targets():
+    records = fanout.run('stop', provide_targets(3), lambda t: t, cleanse.machine, None)
+
+    assert len(records.output()) == 3
+    assert all('properties' not in r for r in records.output())
+    assert all('status' not in r for r in records.output())
+
+
+def test_fail_fast_on_first_failure():
+    with pytest.raises(FailedActivity):
+        fanout.run('stop', provide_targets(3), operate, cleanse.machine, None)
+
+
+def test_collect_all_failures():
+    records = fanout.run('stop', provide_targets(3), operate, cleanse.machine, COLLECT_ALL)
+
+    results = {r['name']: r for r in records.output()}
+    assert len(results) == 3
+    assert results['machine_0']['status'] == fanout.STATUS_SUCCEEDED
+    assert results['machine_1']['status'] == fanout.STATUS_FAILED
+    assert 'transitional' in results['machine_1']['error']
+    assert all(r['latency'] >= 0 for r in results.values())
+
+
+def test_collect_interrupt_of_one_target():
+    def reject(target):
+        if target['name'] == 'machine_1':
+            raise InterruptExecution("'network_latency' is not supported for os 'windows'")
+        return target
+
+    records = fanout.run('stop', provide_targets(3), reject, cleanse.machine, COLLECT_ALL, Deadline(60))
+
+    results = {r['name']: r for r in records.output()}
+    assert results['machine_0']['status'] == fanout.STATUS_SUCCEEDED
+    assert results['machine_1']['status'] == fanout.STATUS_FAILED
+    assert 'not supported' in results['machine_1']['error']
+
+
+def test_abort_collect_all_when_deadline_is_cancelled():
+    deadline = Deadline(60)
+    deadline.cancel()
+
+    with pytest.raises(InterruptExecution, match="cancelled"):
+        fanout.run('stop', provide_targets(2), lambda t: deadline.check('stop'), cleanse.machine, COLLECT_ALL,
+                   deadline)
+
+
+def test_collect_run_command_of_failed_target():
+    def fail(target):
+        error = FailedActivity("Run command ended with the state 'Failed'")
+        error.run_command = {'execution_state': 'Failed', 'exit_code': 1}
+        raise error
+
+    records = fanout.run('stress_cpu', provide_targets(1), fail, cleanse.machine, COLLECT_ALL)
+
+    assert records.output()[0]['status'] == fanout.STATUS_FAILED
+    assert records.output()[0]['run_command']['exit_code'] == 1
+
+
+def test_run_without_targets():
+    records = fanout.run('stop', [], operate, cleanse.machine, None)
+
+    assert records.output() == []
+
+
+def test_fail_outstanding_targets_after_deadline():
+    deadline = Deadline(0.1)
+
+    with pytest.raises(FailedActivity, match="exceeded the timeout"):
+        fanout.run('stop', provide_targets(2), lambda t: time.sleep(1) or t, cleanse.machine, None, deadline)
+
+
+def test_collect_outstanding_targets_after_deadline():
+    deadline = Deadline(0.1)
+
+    records = fanout.run('stop', provide_targets(2), lambda t: time.sleep(1) or t, cleanse.machine, COLLECT_ALL,
+                         deadline)
+
+    assert len(records.output()) == 2
+    assert all(r['status'] == fanout.STATUS_FAILED for r in records.output())
+    assert all('exceeded the timeout' in r['error'] for r in records.output())
+
+
+def test_collect_timeout_of_one_group_and_continue_with_the_next():
+    deadline = Deadline(0.1)
+
+    def wait(target):
+        # a worker that notices the expired deadline only after the fan-out gave up waiting for it
+        time.sleep(0.3)
+        deadline.check('stop')
+        return target
+
+    first = fanout.run('stop', provide_targets(2), wait, cleanse.machine, COLLECT_ALL, deadline)
+    second = fanout.run('stop', provide_targets(2), wait, cleanse.machine, COLLECT_ALL, deadline)
+
+    assert not deadline.cancelled()
+    for records in (first, second):
+        assert len(records.output()) == 2
+        assert all(r['status'] == fanout.STATUS_FAILED for r in records.output())
+        assert all('exceeded the timeout' in r['error'] for r in records.output())
+
+
+def test_cancel_outstanding_targets_on_interrupt():
+    deadline = Deadline(60)
+
+    def interrupt(target):
+        if target['name'] == 'machine_0':
+            raise InterruptExecution("Experiment interrupted")
+        while not deadline.cancelled():
+            time.sleep(0.01)
+        return target
+
+    with pytest.raises(InterruptExecution):
+        fanout.run('stop', provide_targets(3), interrupt, cleanse.machine, None, deadline)
+
+    assert deadline.cancelled()
+
+
+def test_start_operations_while_targets_are_streamed():
+    started = threading.Event()
+
+    def stream():
+        yield {'name': 'machine_0'}
+        assert started.wait(1)
+        yield {'name': 'machine_1'}
+
+    def operate_and_signal(target):
+        started.set()
+        return target
+
+    records = fanout.run('stop', stream(), operate_and_signal, cleanse.machine, None)
+
+    assert len(records.output()) == 2
+
+
+def test_abort_when_streamed_targets_fail():
+    deadline = Deadline(60)
+
+    def stream():
+        yield {'name': 'machine_0'}
+        raise HttpResponseError(message="Resource Graph is unavailable")
+
+    def wait(target):
+        while not deadline.cancelled():
+            time.sleep(0.01)
+        return target
+
+    with pytest.raises(FailedActivity, match="Resource Graph is unavailable"):
+        fanout.run('stop', stream(), wait, cleanse.machine, COLLECT_ALL, deadline)
+
+    assert deadline.cancelled()
+
+
+def test_gather_concurrently_in_order():
+    def list_slowly(delay):
+        time.sleep(delay)
+        return delay
+
+    start = time.monotonic()
+    result = fanout.gather(list_slowly, [0.3, 0.2, 0.1], None)
+
+    assert result == [0.3, 0.2, 0.1]
+    assert time.monotonic() - start < 0.5
+
+
+def test_plan_targets_in_dry_run():
+    targets = [dict(t, id='/subscriptions/sub1/resourceGroups/rg/vm/{}'.format(i))
+               for i, t in enumerate(provide_targets(3))]
+
+    records = fanout.run('stop', targets, operate, cleanse.machine, {"dry_run": True, "max_workers": 2})
+
+    assert all(r['status'] == fanout.STATUS_PLANNED for r in records.output())
+    assert records.plan['targets'] == 3
+    assert records.plan['requests']['sub1']['writes'] == 3
+    assert records.output_as_dict('resources')['plan'] == records.plan
+
+
+def test_plan_only_valid_targets_in_dry_run():
+    def validate(target):
+        if target['name'] == 'machine_1':
+            raise InterruptExecution("'network_latency' is not supported for os 'windows'")
+
+    records = fanout.run('network_latency', provide_targets(3), operate, cleanse.machine, {"dry_run": True},
+                         validate=validate)
+
+    assert [r['status'] for r in records.output()] == [
+        fanout.STATUS_PLANNED, fanout.STATUS_FAILED, fanout.STATUS_PLANNED]
+    assert "not supported" in records.output()[1]['error']
+    assert records.plan['targets'] == 2
+    assert records.plan['invalid_targets'] == 1
@@ -67,3 +67,41 @@ def test_filter_violate_with_invalid_filter():
 
     with pytest.raises(jmespath.exceptions.ParseError):
         kustolight.filter_resources(instances, input_filter)
+
+
+def test_filter_with_kusto_operators_and_nested_keys():
+    resources = [{'name': 'Web-1', 'resourceGroup': 'RG', 'tags': {'env': 'prod'}, 'count': 3},
+                 {'name': 'db', 'resourceGroup': 'other', 'tags': None, 'count': 5}]
+
+    def names(kustol_filter):
+        return [r['name'] for r in kustolight.filter_resources(resources, kustol_filter)]
+
+    assert names("where resourceGroup=~'rg'") == ['Web-1']
+    assert names("where resourceGroup!~'rg'") == ['db']
+    assert names("where name contains 'web'") == ['Web-1']
+    assert names("where name !contains 'WEB' and count>4") == ['db']
+    assert names("where tags.env=='prod'") == ['Web-1']
+    assert names("where name=='Web-1' or count==5 | take 1") == ['Web-1']
+
+
+def test_filter_iter_stops_pulling_after_take():
+    pulled = []
+
+    def stream():
+        for i in range(100):
+            pulled.append(i)
+            yield {'instance_id': str(i)}
+
+    result = list(kustolight.filter_iter(stream(), "take 10"))
+
+    assert [r['instance_id'] for r in result] == [str(i) for i in range(10)]
+    assert len(pulled) == 10
+
+
+def test_filter_iter_samples_from_stream():
+    stream = ({'instance_id': str(i)} for i in range(100))
+
+    result = list(kustolight.filter_iter(stream, "sample 3"))
+
+    assert len(result) == 3
+    assert len({r['instance_id'] for r in result}) == 3
@@ -0,0 +1,57 @@
+from unittest.mock import patch
+
+from azure.mgmt.compute.models import VirtualMachineScaleSetVM
+from msrest.serialization import Serializer
+
+from pdchaosazure.common import cleanse, kustolight
+from pdchaosazure.common.modelview import ModelView
+from pdchaosazure.vmss.records import Records
+from tests.data import vmss_provider
+
+
+def provide_model():
+    return VirtualMachineScaleSetVM.from_dict(vmss_provider.provide_instance_real_sample())
+
+
+def test_view_equals_as_dict():
+    model = provide_model()
+
+    view = ModelView(model)
+
+    assert dict(view) == model.as_dict()
+    assert view['storage_profile']['os_disk']['os_type'] == 'Linux'
+
+
+def test_view_add_and_delete_keys():
+    view = ModelView(provide_model(), scale_set='chaos-pool')
+
+    view['status'] = 'succeeded'
+    del view['tags']
+
+    assert view['scale_set'] == 'chaos-pool'
+    assert view['status'] == 'succeeded'
+    assert 'tags' not in view
+    assert 'plan' not in view
+    assert 'tags' not in dict(view)
+
+
+def test_serialize_retained_keys_only():
+    view = ModelView(provide_model())
+
+    with patch.object(Serializer, 'serialize_data', wraps=Serializer.serialize_data, autospec=True) as serialize:
+        records = Records()
+        records.add(cleanse.vmss_instance(view))
+
+    serialized = {c.args[2] for c in serialize.call_args_list if isinstance(c.args[2], str)}
+    assert 'storage_profile' not in records.output()[0]
+    assert not serialized & {'HardwareProfile', 'StorageProfile', 'NetworkProfile', 'OSProfile'}
+    assert isinstance(records.output()[0], dict)
+
+
+def test_filter_views():
+    first, second = ModelView(provide_model()), ModelView(provide_model())
+    second['instance_id'] = '1'
+
+    result = kustolight.filter_resources([first, second], "where instance_id=='1'")
+
+    assert result == [second]
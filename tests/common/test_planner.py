@@ -0,0 +1,45 @@
+from pdchaosazure.common import fanout, planner
+
+TARGETS = [{'id': '/subscriptions/sub1/resourceGroups/rg/providers/vm/{}'.format(i)} for i in range(4)] + \
+          [{'id': '/subscriptions/sub2/resourceGroups/rg/providers/vm/4'}]
+
+
+def test_plan_long_running_operations():
+    plan = planner.plan('stop', TARGETS, planner.LRO, {"max_workers": 2})
+
+    assert plan['targets'] == 5
+    assert plan['run_commands'] == 0
+    assert plan['requests']['sub1']['writes'] == 4
+    assert plan['requests']['sub1']['reads'] > 4
+    assert plan['budget']['sub2']['writes'] == round(1 / planner.HOURLY_WRITES, 4)
+    # three waves of the default duration
+    assert plan['estimated_duration'] == 3 * planner.DEFAULT_DURATIONS[planner.KIND_LRO]
+
+
+def test_plan_run_commands_and_writes():
+    commands = planner.plan('stress_cpu', TARGETS, planner.command(120), None)
+    writes = planner.plan('stop', TARGETS, planner.WRITE, None)
+
+    assert commands['run_commands'] == 5
+    assert commands['estimated_duration'] == 120 + planner.DEFAULT_DURATIONS[planner.KIND_COMMAND]
+    assert writes['requests']['sub1'] == {'reads': 0, 'writes': 4}
+
+
+def test_merge_plans():
+    plan = planner.merge([planner.plan('stop', TARGETS[:2], planner.LRO, None),
+                          planner.plan('stop', TARGETS[2:], planner.LRO, None, invalid_targets=1)])
+
+    assert plan['targets'] == 5
+    assert plan['invalid_targets'] == 1
+    assert plan['requests']['sub1']['writes'] == 4
+    assert plan['estimated_duration'] == 2 * planner.DEFAULT_DURATIONS[planner.KIND_LRO]
+
+
+def test_estimate_from_recorded_timings(tmp_path):
+    configuration = {"timings": {"path": str(tmp_path / 'timings.json')}}
+
+    fanout.run('stop', [{'name': 'a'}, {'name': 'b'}], lambda t: t, lambda t: t, configuration)
+
+    assert planner.load_timings(configuration)['long_running_operation/stop']
+    assert planner.estimate('stop', planner.LRO, configuration) < 1
+    assert planner.estimate('stop', planner.WRITE, configuration) == planner.DEFAULT_DURATIONS[planner.KIND_WRITE]
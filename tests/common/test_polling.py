@@ -0,0 +1,65 @@
+import time
+from unittest.mock import MagicMock
+
+from pdchaosazure.common import polling
+
+
+def provide_polling(policy: dict, retry_after: str = None) -> polling.AdaptivePolling:
+    result = polling.AdaptivePolling(policy, polling.PollScheduler(0))
+    result._pipeline_response = MagicMock()
+    result._pipeline_response.http_response.headers = {'Retry-After': retry_after} if retry_after else {}
+
+    return result
+
+
+def test_load_default_policy():
+    policy = polling.load_policy('stop', None)
+
+    assert policy == polling.DEFAULT_POLICY
+
+
+def test_load_operation_policy_from_configuration():
+    configuration = {
+        "polling": {
+            "interval": 2,
+            "operations": {
+                "delete": {"initial_delay": 90}
+            }
+        }
+    }
+
+    policy = polling.load_policy('delete', configuration)
+
+    assert policy['initial_delay'] == 90
+    assert policy['interval'] == 2
+    assert 'operations' not in policy
+
+
+def test_backoff_until_max_interval():
+    policy = dict(polling.DEFAULT_POLICY, interval=10, backoff=2, max_interval=30, jitter=0)
+    poll = provide_polling(policy)
+
+    delays = [poll._extract_delay() for _ in range(4)]
+
+    assert delays == [10, 20, 30, 30]
+
+
+def test_retry_after_is_lower_bound():
+    policy = dict(polling.DEFAULT_POLICY, interval=1, jitter=0)
+    poll = provide_polling(policy, retry_after='15')
+
+    assert poll._extract_delay() == 15
+
+
+def test_scheduler_spreads_polls():
+    scheduler = polling.PollScheduler(50)
+
+    start = time.monotonic()
+    for _ in range(6):
+        scheduler.acquire()
+
+    assert time.monotonic() - start >= 0.09
+
+
+def test_scheduler_is_shared():
+    assert polling.scheduler(3) is polling.scheduler(3)
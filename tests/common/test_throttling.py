@@ -0,0 +1,99 @@
+import time
+from unittest.mock import MagicMock
+
+from pdchaosazure.common import throttling
+
+
+def provide_response(status_code: int = 200, headers: dict = None):
+    response = MagicMock()
+    response.http_response.status_code = status_code
+    response.http_response.headers = headers or {}
+
+    return response
+
+
+def provide_policy(*responses) -> throttling.ThrottlingPolicy:
+    policy = throttling.ThrottlingPolicy(throttling.Governor('subscription'))
+    policy.next = MagicMock()
+    policy.next.send.side_effect = list(responses)
+
+    return policy
+
+
+def provide_request(method: str = 'GET', url: str = 'https://management.azure.com/subscriptions/x'):
+    request = MagicMock()
+    request.http_request.method = method
+    request.http_request.url = url
+
+    return request
+
+
+def test_pass_through_response():
+    policy = provide_policy(provide_response())
+
+    response = policy.send(provide_request())
+
+    assert response.http_response.status_code == 200
+    assert policy.next.send.call_count == 1
+
+
+def test_leave_retry_of_throttled_request_to_retry_policy():
+    policy = provide_policy(provide_response(429, {'retry-after-ms': '100'}), provide_response())
+
+    response = policy.send(provide_request('POST'))
+
+    assert response.http_response.status_code == 429
+    assert policy.next.send.call_count == 1
+
+
+def test_pause_requests_after_throttled_request():
+    policy = provide_policy(provide_response(429, {'retry-after-ms': '100'}), provide_response())
+    policy.send(provide_request('POST'))
+
+    start = time.monotonic()
+    response = policy.send(provide_request('POST'))
+
+    assert response.http_response.status_code == 200
+    assert time.monotonic() - start >= 0.1
+
+
+def test_slow_down_on_low_remaining_reads():
+    governor = throttling.Governor('subscription')
+
+    governor.observe('GET', {throttling.HEADER_REMAINING_READS: '50'})
+
+    assert governor.reads.rate < throttling.DEFAULT_RATE
+    assert governor.writes.rate == throttling.DEFAULT_RATE
+
+
+def test_recover_on_high_remaining_writes():
+    governor = throttling.Governor('subscription')
+    governor.observe('PUT', {throttling.HEADER_REMAINING_WRITES: '10'})
+
+    governor.observe('PUT', {throttling.HEADER_REMAINING_WRITES: '1199'})
+
+    assert governor.writes.rate == throttling.DEFAULT_RATE
+
+
+def test_spread_resource_graph_quota():
+    governor = throttling.Governor('resourcegraph')
+    url = 'https://management.azure.com/providers/Microsoft.ResourceGraph/resources?api-version=2019-04-01'
+
+    governor.observe('POST', {throttling.HEADER_QUOTA_REMAINING: '5',
+                              throttling.HEADER_QUOTA_RESETS_AFTER: '00:00:05'}, url)
+
+    assert governor.reads.rate == 1
+    assert governor.writes.rate == throttling.DEFAULT_RATE
+
+
+def test_count_resource_graph_queries_as_reads():
+    governor = throttling.Governor('resourcegraph')
+    url = 'https://management.azure.com/providers/Microsoft.ResourceGraph/resources?api-version=2019-04-01'
+
+    assert governor.bucket('POST', url) is governor.reads
+    assert governor.bucket('POST', 'https://management.azure.com/subscriptions/x/restart') is governor.writes
+
+
+def test_share_governor_per_subscription():
+    assert throttling.governor('a') is throttling.governor('a')
+    assert throttling.governor('a') is not throttling.governor('b')
@@ -1,11 +1,15 @@
 from unittest.mock import ANY, MagicMock, patch
 
+import pytest
 from azure.mgmt.compute import ComputeManagementClient
+from chaoslib.exceptions import InterruptExecution
 
 import pdchaosazure
-from pdchaosazure.vm.actions import (burn_io, delete, fill_disk,
+from pdchaosazure.common.lazy import LazyClient
+from pdchaosazure.common.resources import snapshot
+from pdchaosazure.vm.actions import (burn_io, delete, delete_run_commands, fault_timeline, fill_disk,
                                      network_latency, restart, stop,
-                                     stress_cpu)
+                                     stress_cpu, stress_memory)
 from tests.data import config_provider, machine_provider, secrets_provider
 
 MACHINE_ALPHA = {
@@ -17,6 +21,15 @@ MACHINE_BETA = {
     'resourceGroup': 'group'}
 
 
+class ClientOf:
+    """Matches the lazily created stand-in of the client."""
+    def __init__(self, client):
+        self.client = client
+
+    def __eq__(self, other):
+        return isinstance(other, LazyClient) and other.get() is self.client
+
+
 class AnyStringWith(str):
     def __eq__(self, other):
         return self in other
@@ -36,10 +49,29 @@ def test_delete_one_machine(init, fetch):
     f = "where resourceGroup=='myresourcegroup'"
     delete(f, configuration, secrets)
 
-    fetch.assert_called_with(f, configuration, secrets)
+    fetch.assert_called_with(f, configuration, secrets, ANY)
     assert client.virtual_machines.begin_delete.call_count == 1
 
 
+@patch('pdchaosazure.vm.actions.fetch_machines', autospec=True)
+@patch('pdchaosazure.vm.actions.client.init', autospec=True)
+@patch.object(pdchaosazure.common.compute.command, 'delete_managed', autospec=True)
+def test_delete_run_commands_of_one_machine(mocked_delete_managed, init, fetch):
+    client = MagicMock()
+    init.return_value = client
+    mocked_delete_managed.return_value = ['pdchaosazure-0123456789ab']
+
+    fetch.return_value = [dict(MACHINE_ALPHA)]
+
+    configuration = config_provider.provide_default_config()
+    secrets = secrets_provider.provide_secrets_via_service_principal()
+
+    result = delete_run_commands("where name=='VirtualMachineAlpha'", configuration, secrets)
+
+    mocked_delete_managed.assert_called_once_with('group', ANY, ClientOf(client), ANY)
+    assert result['resources'][0]['deleted_run_commands'] == ['pdchaosazure-0123456789ab']
+
+
 @patch('pdchaosazure.vm.actions.fetch_machines', autospec=True)
 @patch('pdchaosazure.vm.actions.client.init', autospec=True)
 def test_delete_two_machines(init, fetch):
@@ -54,7 +86,7 @@ def test_delete_two_machines(init, fetch):
     f = "where resourceGroup=='myresourcegroup' | sample 2"
     delete(f, configuration, secrets)
 
-    fetch.assert_called_with(f, configuration, secrets)
+    fetch.assert_called_with(f, configuration, secrets, ANY)
     assert client.virtual_machines.begin_delete.call_count == 2
 
 
@@ -73,7 +105,7 @@ def test_stop_one_machine(init, fetch):
     f = "where resourceGroup=='myresourcegroup'"
     stop(f, configuration, secrets)
 
-    fetch.assert_called_with(f, configuration, secrets)
+    fetch.assert_called_with(f, configuration, secrets, ANY)
     assert client.virtual_machines.begin_power_off.call_count == 1
 
 
@@ -91,7 +123,7 @@ def test_stop_two_machines(init, fetch):
     f = "where resourceGroup=='myresourcegroup' | sample 2"
     stop(f, configuration, secrets)
 
-    fetch.assert_called_with(f, configuration, secrets)
+    fetch.assert_called_with(f, configuration, secrets, ANY)
     assert client.virtual_machines.begin_power_off.call_count == 2
 
 
@@ -109,7 +141,7 @@ def test_restart_one_machine(init, fetch):
     f = "where resourceGroup=='myresourcegroup'"
     restart(f, configuration, secrets)
 
-    fetch.assert_called_with(f, configuration, secrets)
+    fetch.assert_called_with(f, configuration, secrets, ANY)
     assert client.virtual_machines.begin_restart.call_count == 1
 
 
@@ -127,7 +159,7 @@ def test_restart_two_machines(init, fetch):
     f = "where resourceGroup=='myresourcegroup' | sample 2"
     restart(f, configuration, secrets)
 
-    fetch.assert_called_with(f, configuration, secrets)
+    fetch.assert_called_with(f, configuration, secrets, ANY)
     assert client.virtual_machines.begin_restart.call_count == 2
 
 
@@ -152,8 +184,41 @@ def test_stress_cpu(mocked_command_run, mocked_init_client, fetch):
         filter="where name=='some_linux_machine'", duration=duration, configuration=configuration, secrets=secrets)
 
     # assert
-    fetch.assert_called_with("where name=='some_linux_machine'", configuration, secrets)
-    mocked_command_run.assert_called_with(machine['resourceGroup'], machine, parameters=ANY, client=mocked_client)
+    fetch.assert_called_with("where name=='some_linux_machine'", configuration, secrets, ANY)
+    mocked_command_run.assert_called_with(
+        machine['resourceGroup'], machine, parameters=ANY, client=ClientOf(mocked_client),
+        configuration=configuration, deadline=ANY)
+
+
+@patch('pdchaosazure.vm.actions.fetch_machines', autospec=True)
+@patch('pdchaosazure.vm.actions.client.init', autospec=True)
+@patch.object(pdchaosazure.common.compute.command, 'run', autospec=True)
+def test_stress_memory(mocked_command_run, mocked_init_client, fetch):
+    # arrange mocks
+    machine = machine_provider.default()
+    fetch.return_value = [machine]
+
+    mocked_client = MagicMock(spec=ComputeManagementClient)
+    mocked_init_client.return_value = mocked_client
+
+    configuration = config_provider.provide_default_config()
+    secrets = secrets_provider.provide_secrets_via_service_principal()
+
+    # act
+    stress_memory(
+        filter="where name=='some_linux_machine'", duration=60, percentage=50, rate=100,
+        configuration=configuration, secrets=secrets)
+
+    # assert
+    fetch.assert_called_with("where name=='some_linux_machine'", configuration, secrets, ANY)
+    mocked_command_run.assert_called_with(
+        machine['resourceGroup'], machine, parameters=ANY, client=ClientOf(mocked_client),
+        configuration=configuration, deadline=ANY)
+
+    parameters = mocked_command_run.call_args[0][2]['parameters']
+    assert {'name': 'input_percentage', 'value': 50} in parameters
+    assert {'name': 'input_rate', 'value': 100} in parameters
+    assert not [p for p in parameters if p['name'] == 'input_size']
 
 
 @patch('pdchaosazure.vm.actions.fetch_machines', autospec=True)
@@ -180,8 +245,44 @@ def test_fill_disk(mocked_command_run, mocked_command_prepare_path, mocked_init_
               configuration=configuration, secrets=secrets)
 
     # assert
-    fetch.assert_called_with("where name=='some_linux_machine'", configuration, secrets)
-    mocked_command_run.assert_called_with(machine['resourceGroup'], machine, parameters=ANY, client=mocked_client)
+    fetch.assert_called_with("where name=='some_linux_machine'", configuration, secrets, ANY)
+    mocked_command_run.assert_called_with(
+        machine['resourceGroup'], machine, parameters=ANY, client=ClientOf(mocked_client),
+        configuration=configuration, deadline=ANY)
+
+
+@patch('pdchaosazure.vm.actions.fetch_machines', autospec=True)
+@patch('pdchaosazure.vm.actions.client.init', autospec=True)
+@patch.object(pdchaosazure.common.compute.command, 'run', autospec=True)
+def test_fill_disk_by_percentage(mocked_command_run, mocked_init_client, fetch):
+    # arrange mocks
+    machine = machine_provider.default()
+    fetch.return_value = [machine]
+    mocked_init_client.return_value = MagicMock(spec=ComputeManagementClient)
+
+    configuration = config_provider.provide_default_config()
+    secrets = secrets_provider.provide_secrets_via_service_principal()
+
+    # act
+    fill_disk(filter="where name=='some_linux_machine'", percentage=95, space='total', configuration=configuration,
+              secrets=secrets)
+
+    # assert
+    parameters = mocked_command_run.call_args[0][2]['parameters']
+    assert {'name': 'input_percentage', 'value': 95} in parameters
+    assert {'name': 'input_space', 'value': 'total'} in parameters
+    assert 'input_mode' not in [parameter['name'] for parameter in parameters]
+
+
+@patch('pdchaosazure.vm.actions.fetch_machines', autospec=True)
+@patch('pdchaosazure.vm.actions.client.init', autospec=True)
+def test_fill_disk_with_invalid_mode(mocked_init_client, fetch):
+    with pytest.raises(InterruptExecution):
+        fill_disk(filter="where name=='some_linux_machine'", mode='sparse',
+                  configuration=config_provider.provide_default_config(),
+                  secrets=secrets_provider.provide_secrets_via_service_principal())
+
+    fetch.assert_not_called()
 
 
 @patch('pdchaosazure.vm.actions.fetch_machines', autospec=True)
@@ -207,8 +308,10 @@ def test_network_latency(mocked_command_run, mocked_init_client, fetch):
         configuration=configuration, secrets=secrets)
 
     # assert
-    fetch.assert_called_with("where name=='some_linux_machine'", configuration, secrets)
-    mocked_command_run.assert_called_with(machine['resourceGroup'], machine, parameters=ANY, client=mocked_client)
+    fetch.assert_called_with("where name=='some_linux_machine'", configuration, secrets, ANY)
+    mocked_command_run.assert_called_with(
+        machine['resourceGroup'], machine, parameters=ANY, client=ClientOf(mocked_client),
+        configuration=configuration, deadline=ANY)
 
 
 @patch('pdchaosazure.vm.actions.fetch_machines', autospec=True)
@@ -232,5 +335,46 @@ def test_burn_io(mocked_command_run, mocked_init_client, fetch):
     burn_io(filter="where name=='some_linux_machine'", duration=duration, configuration=configuration, secrets=secrets)
 
     # assert
-    fetch.assert_called_with("where name=='some_linux_machine'", configuration, secrets)
-    mocked_command_run.assert_called_with(machine['resourceGroup'], machine, parameters=ANY, client=mocked_client)
+    fetch.assert_called_with("where name=='some_linux_machine'", configuration, secrets, ANY)
+    mocked_command_run.assert_called_with(
+        machine['resourceGroup'], machine, parameters=ANY, client=ClientOf(mocked_client),
+        configuration=configuration, deadline=ANY)
+
+
+@patch('pdchaosazure.vm.actions.fetch_machines', autospec=True)
+@patch('pdchaosazure.vm.actions.client.init', autospec=True)
+@patch.object(pdchaosazure.common.compute.command, 'run', autospec=True)
+def test_fault_timeline(mocked_command_run, mocked_init_client, fetch):
+    machine = machine_provider.default()
+    fetch.return_value = [machine]
+    mocked_client = MagicMock(spec=ComputeManagementClient)
+    mocked_init_client.return_value = mocked_client
+    configuration = config_provider.provide_default_config()
+
+    mocked_command_run.return_value = {'exit_code': 0, 'metrics': {}}
+
+    result = fault_timeline(filter="where name=='some_linux_machine'",
+                            timeline=[{'fault': 'stress_cpu', 'duration': 60}, {'fault': 'fill_disk', 'size': 100}],
+                            configuration=configuration)
+
+    mocked_command_run.assert_called_once_with(
+        machine['resourceGroup'], machine, parameters=ANY, client=ClientOf(mocked_client),
+        configuration=configuration, deadline=ANY)
+    script = mocked_command_run.call_args[0][2]['script'][0]
+    assert 'md5sum' in script and 'input_size=100' in script
+    assert result['resources'][0]['run_command'] == {'exit_code': 0, 'metrics': {}}
+
+
+def test_plan_network_latency_from_snapshot_without_credentials(tmp_path):
+    path = str(tmp_path / 'snapshot.jsonl')
+    snapshot.record(path, [
+        dict(machine_provider.default(os_type), id="/subscriptions/1/resourceGroups/rg/providers"
+             "/Microsoft.Compute/virtualMachines/{}".format(name), name=name)
+        for name, os_type in (('vm1', 'Linux'), ('vm2', 'Windows'))])
+    configuration = dict(config_provider.provide_default_config(), snapshot={'path': path}, dry_run=True)
+
+    result = network_latency("where name=='vm1' or name=='vm2'", configuration=configuration, secrets=None)
+
+    assert [m['status'] for m in result['resources']] == ['planned', 'failed']
+    assert result['plan']['run_commands'] == 1
+    assert result['plan']['invalid_targets'] == 1
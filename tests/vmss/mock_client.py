@@ -1,19 +1,22 @@
 class MockLROPoller(object):
-    def result(self, timeout: None):
+    def result(self, timeout=None):
         pass
 
+    def done(self):
+        return True
+
 
 class MockVirtualMachineScaleSetVMsOperations(object):
-    def begin_power_off(self, resource_group_name, scale_set_name, instance_id):
+    def begin_power_off(self, resource_group_name, scale_set_name, instance_id, **kwargs):
         return MockLROPoller()
 
-    def begin_delete(self, resource_group_name, scale_set_name, instance_id):
+    def begin_delete(self, resource_group_name, scale_set_name, instance_id, **kwargs):
         return MockLROPoller()
 
-    def begin_restart(self, resource_group_name, scale_set_name, instance_id):
+    def begin_restart(self, resource_group_name, scale_set_name, instance_id, **kwargs):
         return MockLROPoller()
 
-    def begin_deallocate(self, resource_group_name, scale_set_name, instance_id):
+    def begin_deallocate(self, resource_group_name, scale_set_name, instance_id, **kwargs):
         return MockLROPoller()
 
 
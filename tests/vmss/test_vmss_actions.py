@@ -4,12 +4,23 @@ import pytest
 from chaoslib.exceptions import FailedActivity
 
 import pdchaosazure
+from pdchaosazure.common.lazy import LazyClient
 from pdchaosazure.vmss.actions import delete, restart, stop, \
-    deallocate, network_latency, burn_io, fill_disk, stress_cpu
+    deallocate, network_latency, burn_io, fill_disk, stress_cpu, stress_memory, fault_timeline
+from pdchaosazure.common.resources import snapshot
 from tests.data import config_provider, secrets_provider, vmss_provider
 from tests.vmss.mock_client import MockComputeManagementClient
 
 
+class ClientOf:
+    """Matches the lazily created stand-in of the client."""
+    def __init__(self, client):
+        self.client = client
+
+    def __eq__(self, other):
+        return isinstance(other, LazyClient) and other.get() is self.client
+
+
 @patch('pdchaosazure.vmss.actions.fetch_vmss', autospec=True)
 @patch('pdchaosazure.vmss.actions.fetch_instances', autospec=True)
 @patch('pdchaosazure.vmss.actions.client.init', autospec=True)
@@ -43,6 +54,24 @@ def test_stop_vmss(client, fetch_instances, fetch_vmss):
     stop(None, None, None, None)
 
 
+@patch('pdchaosazure.vmss.actions.fetch_vmss', autospec=True)
+@patch('pdchaosazure.vmss.actions.fetch_instances', autospec=True)
+@patch('pdchaosazure.vmss.actions.client.init', autospec=True)
+def test_stop_two_vmss(client, fetch_instances, fetch_vmss):
+    scale_set_alpha = vmss_provider.provide_scale_set()
+    scale_set_beta = vmss_provider.provide_scale_set()
+    scale_set_beta['name'] = 'chaos-pool-beta'
+    fetch_vmss.return_value = [scale_set_alpha, scale_set_beta]
+    fetch_instances.side_effect = lambda vmss, *args: [dict(vmss_provider.provide_instance(), scale_set=vmss['name'])]
+
+    client.return_value = MockComputeManagementClient()
+
+    result = stop(None, None, None, None)
+
+    assert [r['name'] for r in result['resources']] == ['chaos-pool', 'chaos-pool-beta']
+    assert result['resources'][1]['virtualMachines'][0]['scale_set'] == 'chaos-pool-beta'
+
+
 @patch('pdchaosazure.vmss.actions.fetch_vmss', autospec=True)
 @patch('pdchaosazure.vmss.actions.fetch_instances', autospec=True)
 @patch('pdchaosazure.vmss.actions.client.init', autospec=True)
@@ -102,9 +131,46 @@ def test_stress_cpu(mocked_command_run, mocked_init_client, mocked_instances, mo
         secrets=secrets)
 
     # assert
-    mocked_vmss.assert_called_with("where name=='some_random_instance'", configuration, secrets)
-    mocked_instances.assert_called_with(scale_set, None, mocked_init_client.return_value)
-    mocked_command_run.assert_called_with(scale_set['resourceGroup'], instance, parameters=ANY, client=client)
+    mocked_vmss.assert_called_with("where name=='some_random_instance'", configuration, secrets, ANY)
+    mocked_instances.assert_called_with(scale_set, None, ClientOf(mocked_init_client.return_value), ANY, configuration)
+    mocked_command_run.assert_called_with(
+        scale_set['resourceGroup'], instance, parameters=ANY, client=ClientOf(client),
+        configuration=configuration, deadline=ANY)
+
+
+@patch('pdchaosazure.vmss.actions.fetch_vmss', autospec=True)
+@patch('pdchaosazure.vmss.actions.fetch_instances', autospec=True)
+@patch('pdchaosazure.vmss.actions.client.init', autospec=True)
+@patch.object(pdchaosazure.common.compute.command, 'run', autospec=True)
+def test_stress_memory(mocked_command_run, mocked_init_client, mocked_instances, mocked_vmss):
+    # arrange mocks
+    scale_set = vmss_provider.provide_scale_set()
+    scale_sets = [scale_set]
+    instance = vmss_provider.provide_instance()
+    instances = [instance]
+    mocked_vmss.return_value = scale_sets
+    mocked_instances.return_value = instances
+
+    configuration = config_provider.provide_default_config()
+    secrets = secrets_provider.provide_secrets_via_service_principal()
+
+    duration = 60
+
+    client = MockComputeManagementClient()
+    mocked_init_client.return_value = client
+
+    # act
+    stress_memory(
+        vmss_filter="where name=='some_random_instance'", duration=duration, size=2048, configuration=configuration,
+        secrets=secrets)
+
+    # assert
+    mocked_vmss.assert_called_with("where name=='some_random_instance'", configuration, secrets, ANY)
+    mocked_instances.assert_called_with(scale_set, None, ClientOf(mocked_init_client.return_value), ANY, configuration)
+    mocked_command_run.assert_called_with(
+        scale_set['resourceGroup'], instance, parameters=ANY, client=ClientOf(client),
+        configuration=configuration, deadline=ANY)
+    assert {'name': 'input_size', 'value': 2048} in mocked_command_run.call_args[0][2]['parameters']
 
 
 @patch('pdchaosazure.vmss.actions.fetch_vmss', autospec=True)
@@ -131,9 +197,12 @@ def test_network_latency(mocked_command_run, mocked_init_client, mocked_fetch_in
                     configuration=configuration, secrets=secrets)
 
     # assert
-    mocked_fetch_vmss.assert_called_with("where name=='some_random_instance'", configuration, secrets)
-    mocked_fetch_instances.assert_called_with(scale_set, None, mocked_init_client.return_value)
-    mocked_command_run.assert_called_with(scale_set['resourceGroup'], instance, parameters=ANY, client=mocked_client)
+    mocked_fetch_vmss.assert_called_with("where name=='some_random_instance'", configuration, secrets, ANY)
+    mocked_fetch_instances.assert_called_with(
+        scale_set, None, ClientOf(mocked_init_client.return_value), ANY, configuration)
+    mocked_command_run.assert_called_with(
+        scale_set['resourceGroup'], instance, parameters=ANY, client=ClientOf(mocked_client),
+        configuration=configuration, deadline=ANY)
 
 
 @patch('pdchaosazure.vmss.actions.fetch_vmss', autospec=True)
@@ -163,9 +232,11 @@ def test_burn_io(mocked_command_run, mocked_init_client, fetch_instances, fetch_
         configuration=configuration, secrets=secrets)
 
     # assert
-    fetch_vmss.assert_called_with("where name=='some_random_instance'", configuration, secrets)
-    fetch_instances.assert_called_with(scale_set, None, mocked_init_client.return_value)
-    mocked_command_run.assert_called_with(scale_set['resourceGroup'], instance, parameters=ANY, client=mocked_client)
+    fetch_vmss.assert_called_with("where name=='some_random_instance'", configuration, secrets, ANY)
+    fetch_instances.assert_called_with(scale_set, None, ClientOf(mocked_init_client.return_value), ANY, configuration)
+    mocked_command_run.assert_called_with(
+        scale_set['resourceGroup'], instance, parameters=ANY, client=ClientOf(mocked_client),
+        configuration=configuration, deadline=ANY)
 
 
 @patch('pdchaosazure.vmss.actions.fetch_vmss', autospec=True)
@@ -196,9 +267,11 @@ def test_fill_disk(mocked_command_run, mocked_command_prepare_path, mocked_init_
         configuration=configuration, secrets=secrets)
 
     # assert
-    fetch_vmss.assert_called_with("where name=='some_random_instance'", configuration, secrets)
-    fetch_instances.assert_called_with(scale_set, None, mocked_init_client.return_value)
-    mocked_command_run.assert_called_with(scale_set['resourceGroup'], instance, parameters=ANY, client=mocked_client)
+    fetch_vmss.assert_called_with("where name=='some_random_instance'", configuration, secrets, ANY)
+    fetch_instances.assert_called_with(scale_set, None, ClientOf(mocked_init_client.return_value), ANY, configuration)
+    mocked_command_run.assert_called_with(
+        scale_set['resourceGroup'], instance, parameters=ANY, client=ClientOf(mocked_client),
+        configuration=configuration, deadline=ANY)
 
 
 @patch('pdchaosazure.vmss.actions.fetch_vmss', autospec=True)
@@ -229,5 +302,42 @@ def test_unhappily_fill_disk(mocked_command_run, mocked_command_prepare_path,
             configuration=configuration, secrets=secrets)
 
     # assert
-    fetch_vmss.assert_called_with("where name=='some_random_instance'", configuration, secrets)
-    fetch_instances.assert_called_with(scale_set, None, mocked_init_client.return_value)
+    fetch_vmss.assert_called_with("where name=='some_random_instance'", configuration, secrets, ANY)
+    fetch_instances.assert_called_with(scale_set, None, ClientOf(mocked_init_client.return_value), ANY, configuration)
+
+
+@patch('pdchaosazure.vmss.actions.fetch_vmss', autospec=True)
+@patch('pdchaosazure.vmss.actions.fetch_instances', autospec=True)
+@patch('pdchaosazure.vmss.actions.client.init', autospec=True)
+@patch.object(pdchaosazure.common.compute.command, 'run', autospec=True)
+def test_fault_timeline(mocked_command_run, mocked_init_client, mocked_instances, mocked_vmss):
+    scale_set = vmss_provider.provide_scale_set()
+    instance = vmss_provider.provide_instance()
+    mocked_vmss.return_value = [scale_set]
+    mocked_instances.return_value = [instance]
+    configuration = config_provider.provide_default_config()
+    client = MockComputeManagementClient()
+    mocked_init_client.return_value = client
+
+    fault_timeline(timeline=[{'fault': 'stress_cpu', 'duration': 60},
+                             {'fault': 'network_latency', 'start': 30, 'duration': 60}],
+                   configuration=configuration)
+
+    mocked_command_run.assert_called_once()
+    parameters = mocked_command_run.call_args[0][2]
+    assert 'md5sum' in parameters['script'][0] and 'netem' in parameters['script'][0]
+
+
+def test_stop_no_instance_from_snapshot_without_credentials(tmp_path):
+    path = str(tmp_path / 'snapshot.jsonl')
+    vmss_id = "/subscriptions/1/resourceGroups/rg/providers/Microsoft.Compute/virtualMachineScaleSets/vmss1"
+    snapshot.record(path, [
+        {'id': vmss_id, 'type': 'microsoft.compute/virtualmachinescalesets', 'name': 'vmss1', 'resourceGroup': 'rg'}])
+    snapshot.record(path, [
+        {'id': "{}/virtualMachines/0".format(vmss_id), 'instance_id': '0', 'name': 'vmss1_0',
+         'type': 'Microsoft.Compute/virtualMachineScaleSets/virtualMachines'}])
+    configuration = dict(config_provider.provide_default_config(), snapshot={'path': path})
+
+    result = stop("where name=='vmss1'", "where instance_id=='1'", configuration, None)
+
+    assert result['resources'][0]['virtualMachines'] == []
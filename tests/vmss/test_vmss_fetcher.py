@@ -28,7 +28,7 @@ def test_succesful_fetch_instances_without_instance_criteria(mocked_fetch_instan
 
     scale_set = vmss_provider.provide_scale_set()
 
-    result = fetch_instances(scale_set, None, None)
+    result = list(fetch_instances(scale_set, None, None))
 
     assert len(result) == 1
     assert result[0].get('name') == 'chaos-pool_0'
@@ -40,7 +40,7 @@ def test_happily_fetch_empty_list_instances_with_empty_instance_filter(mocked_fe
     mocked_fetch_instances.return_value = []
     scale_set = vmss_provider.provide_scale_set()
 
-    result = fetch_instances(scale_set, None, None)
+    result = list(fetch_instances(scale_set, None, None))
     assert len(result) == 0
 
 
@@ -58,7 +58,7 @@ def test_happily_fetch_instances_with_instance_filter_for_instance0(mocked_fetch
     scale_set = vmss_provider.provide_scale_set()
 
     # fire
-    result = fetch_instances(scale_set, "where instance_id=='0'", None)
+    result = list(fetch_instances(scale_set, "where instance_id=='0'", None))
 
     # assert
     assert len(result) == 1
@@ -83,7 +83,7 @@ def test_happily_fetch_instances_with_instance_filter_for_instance0_or_instance_
     scale_set = vmss_provider.provide_scale_set()
 
     # fire
-    result = fetch_instances(scale_set, "where instance_id=='0' or instance_id=='2'", None)
+    result = list(fetch_instances(scale_set, "where instance_id=='0' or instance_id=='2'", None))
 
     # assert
     assert len(result) == 2
@@ -110,7 +110,7 @@ def test_happily_fetch_instances_with_instance_filter_for_all_instances(mocked_f
     scale_set = vmss_provider.provide_scale_set()
 
     # fire
-    result = fetch_instances(scale_set, "top 3", None)
+    result = list(fetch_instances(scale_set, "top 3", None))
 
     # assert
     assert len(result) == 3
@@ -140,3 +140,36 @@ def test_sadly_fetch_instances_with_invalid_instance_criteria(mocked_fetch_insta
         fetch_instances(scale_set, "invalid filter query syntax", None)
 
         assert "invalid query" in x.value
+
+
+@patch('pdchaosazure.vmss.fetcher.raw.list_vmss_instances', autospec=True)
+def test_happily_fetch_raw_instances(mocked_list):
+    mocked_list.return_value = iter([[vmss_provider.provide_instance()]])
+    scale_set = vmss_provider.provide_scale_set()
+
+    result = list(fetch_instances(scale_set, "where instance_id=='0'", None, configuration={'raw_listing': True}))
+
+    assert len(result) == 1
+    assert result[0].get('scale_set') == scale_set['name']
+
+
+def test_happily_reuse_cached_instances():
+    configuration = {'instance_cache': {'ttl': 60}, 'raw_listing': True}
+    scale_set = vmss_provider.provide_scale_set()
+    scale_set['id'] = 'cached-pool'
+    pdchaosazure.vmss.fetcher.invalidate_instances()
+
+    with patch('pdchaosazure.vmss.fetcher.raw.list_vmss_instances', autospec=True) as mocked_list:
+        mocked_list.side_effect = lambda *args: iter([[vmss_provider.provide_instance()]])
+
+        first = list(fetch_instances(scale_set, "where instance_id=='0'", None, configuration=configuration))
+        del first[0]['storage_profile']
+        second = list(fetch_instances(scale_set, "where instance_id=='0'", None, configuration=configuration))
+
+        assert mocked_list.call_count == 1
+        assert 'storage_profile' in second[0]
+
+        scale_set['sku'] = {'capacity': 2}
+        list(fetch_instances(scale_set, "where instance_id=='0'", None, configuration=configuration))
+
+        assert mocked_list.call_count == 2
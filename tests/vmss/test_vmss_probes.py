@@ -1,7 +1,8 @@
 from unittest.mock import patch
 
+from pdchaosazure.common.resources import snapshot
 from pdchaosazure.vmss.probes import count_instances
-from tests.data import vmss_provider
+from tests.data import config_provider, vmss_provider
 from tests.vmss.mock_client import MockComputeManagementClient
 
 
@@ -38,3 +39,18 @@ def test_count_instances_for_two_sets(mocked_client, mocked_fetch_vmss, mocked_a
     count = count_instances(None, None)
 
     assert count == 2
+
+
+def test_count_instances_from_snapshot_without_credentials(tmp_path):
+    path = str(tmp_path / 'snapshot.jsonl')
+    vmss_id = "/subscriptions/1/resourceGroups/rg/providers/Microsoft.Compute/virtualMachineScaleSets/vmss1"
+    snapshot.record(path, [
+        {'id': vmss_id, 'type': 'microsoft.compute/virtualmachinescalesets', 'name': 'vmss1', 'resourceGroup': 'rg'}])
+    snapshot.record(path, [
+        {'id': "{}/virtualMachines/{}".format(vmss_id, i), 'instance_id': str(i), 'name': 'vmss1_{}'.format(i),
+         'type': 'Microsoft.Compute/virtualMachineScaleSets/virtualMachines'} for i in range(3)])
+    configuration = dict(config_provider.provide_default_config(), snapshot={'path': path})
+
+    count = count_instances("where name=='vmss1'", configuration, None)
+
+    assert count == 3
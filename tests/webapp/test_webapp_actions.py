@@ -1,4 +1,4 @@
-from unittest.mock import patch, MagicMock
+from unittest.mock import ANY, patch, MagicMock
 
 from pdchaosazure.webapp.actions import stop, restart, delete
 from tests.data import config_provider, secrets_provider, webapp_provider
@@ -19,7 +19,7 @@ def test_happily_stop_webapp(init, fetch):
     f = "where resourceGroup=~'rg'"
     stop(f, config, secrets)
 
-    fetch.assert_called_with(f, config, secrets)
+    fetch.assert_called_with(f, config, secrets, ANY)
     client.web_apps.stop.assert_called_with(webapp['resourceGroup'], webapp['name'])
 
 
@@ -38,8 +38,32 @@ def test_happily_restart_webapp(init, fetch):
     f = "where resourceGroup=~'rg'"
     restart(f, config, secrets)
 
-    fetch.assert_called_with(f, config, secrets)
-    client.web_apps.restart.assert_called_with(webapp['resourceGroup'], webapp['name'])
+    fetch.assert_called_with(f, config, secrets, ANY)
+    client.web_apps.restart.assert_called_with(
+        webapp['resourceGroup'], webapp['name'], soft_restart=False, synchronous=False)
+
+
+@patch('pdchaosazure.webapp.actions.fetch_webapps', autospec=True)
+@patch('pdchaosazure.webapp.actions.client.init', autospec=True)
+def test_happily_soft_restart_many_webapps(init, fetch):
+    config = config_provider.provide_default_config()
+    secrets = secrets_provider.provide_secrets_public()
+
+    client = MagicMock()
+    init.return_value = client
+    resource_list = []
+    for i in range(5):
+        webapp = webapp_provider.default()
+        webapp['name'] = "webapp_{}".format(i)
+        resource_list.append(webapp)
+    fetch.return_value = resource_list
+
+    f = "where resourceGroup=~'rg'"
+    result = restart(f, soft_restart=True, synchronous=True, configuration=config, secrets=secrets)
+
+    assert client.web_apps.restart.call_count == 5
+    client.web_apps.restart.assert_any_call('rg', 'webapp_3', soft_restart=True, synchronous=True)
+    assert len(result['resources']) == 5
 
 
 @patch('pdchaosazure.webapp.actions.fetch_webapps', autospec=True)
@@ -57,5 +81,5 @@ def test_happily_delete_webapp(init, fetch):
     f = "where resourceGroup=~'rg'"
     delete(f, config, secrets)
 
-    fetch.assert_called_with(f, config, secrets)
+    fetch.assert_called_with(f, config, secrets, ANY)
     client.web_apps.delete.assert_called_with(webapp['resourceGroup'], webapp['name'])